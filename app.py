@@ -1,29 +1,113 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+import hmac
+import inspect
+import logging
+from services.log import configure_logging
+from services.tracing import setup_tracing, shutdown_tracing
+
+# Before anything else is imported: controllers log while they initialise
+configure_logging()
+# Per process (gunicorn workers import the app after forking); no-op unless TRACING_ENABLED
+setup_tracing()
+
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from routes import auth, profile, chat, message
+from routes import auth, profile, chat, message, sync, admin
 from middleware.error_handler import (
     http_exception_handler,
     validation_exception_handler,
     general_exception_handler
 )
-from middleware.auth import get_language_from_request
+from middleware.auth import ADMIN_TOKEN, get_language_from_request
+from middleware.rate_limit import RATE_LIMIT_ENABLED, RateLimitMiddleware, close_rate_limit_backend, get_rate_limit_backend
+from middleware.metrics import MetricsMiddleware
+from middleware.slow_requests import SlowRequestMiddleware
+from middleware.request_logging import RequestLoggingMiddleware
+from middleware.tracing import TracingMiddleware
 from locales import get_message
-import uvicorn
+from services.job_queue import BotWorkerPool, BOT_REPLY_MODE
+from services.container import create_container, close_container
+from services.loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from services.metrics import METRICS_ENABLED, METRICS_TOKEN, CONTENT_TYPE, render_metrics
+from database import messages, init_db
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services"""
+    # Services are created here so the MongoDB and HTTP pools bind to the running event loop
+    container = create_container()
+    try:
+        await init_db()
+    except Exception as error:
+        logger.error("database initialization failed: %s", error)
+    
+    bot_worker_pool = None
+    if BOT_REPLY_MODE == "async":
+        bot_worker_pool = BotWorkerPool(container.bot_job_queue, container.message_controller.process_bot_job)
+        bot_worker_pool.start()
+    container.message_broker.start_change_stream(messages, container.message_controller.format_message)
+    container.message_broker.start_relay()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if RATE_LIMIT_ENABLED:
+        try:
+            get_rate_limit_backend().start()
+        except Exception as error:
+            logger.error("rate limit backend failed to start: %s", error)
+    
+    yield
+    
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.stop()
+    # Stop producers first, then release clients (each worker process owns its own)
+    await container.message_broker.stop_relay()
+    await container.message_broker.stop_change_stream()
+    if bot_worker_pool:
+        await bot_worker_pool.stop()
+    await close_rate_limit_backend()
+    await close_container()
+    shutdown_tracing()
+
+# FastAPI releases with built-in OpenTelemetry would open a second server span per
+# request (named by raw path); TracingMiddleware below owns request spans
+native_telemetry = {"telemetry": {"tracing": False}} if "telemetry" in inspect.signature(FastAPI).parameters else {}
 
 app = FastAPI(
     title="Eko Backend API",
     description="Backend API for Eko application with authentication and profile management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    **native_telemetry
 )
 
-# CORS middleware
+# Per-user/per-IP token buckets on expensive routes (429 before any work is done)
+app.add_middleware(RateLimitMiddleware)
+
+# Timing breakdown and task stack dump for requests over SLOW_REQUEST_THRESHOLD_MS (off by default)
+app.add_middleware(SlowRequestMiddleware)
+
+# Outside rate limiting, so latency and status include 429s (rate-limited requests have no route yet)
+app.add_middleware(MetricsMiddleware)
+
+# Request id for log correlation (set before rate limiting, metrics and routes run) and sampled request logs
+app.add_middleware(RequestLoggingMiddleware)
+
+# Server span per request; outside request logging so its records carry the trace id (passes through when tracing is off)
+app.add_middleware(TracingMiddleware)
+
+# CORS middleware, added last so it is outermost: every response, 429s included, gets CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Configure this properly for production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browser clients read ETag for If-None-Match / If-Match (see services/etag.py)
+    expose_headers=["ETag"],
 )
 
 # Exception handlers for standardized error responses
@@ -36,6 +120,9 @@ app.include_router(auth.router)
 app.include_router(profile.router)
 app.include_router(chat.router)
 app.include_router(message.router)
+app.include_router(sync.router)
+if ADMIN_TOKEN:
+    app.include_router(admin.router)
 
 @app.get("/")
 async def root(request: Request):
@@ -57,5 +144,21 @@ async def health_check(request: Request):
         }
     }
 
+# Mounted only when METRICS_TOKEN is set, like /admin with ADMIN_TOKEN: route
+# templates, latencies and in-flight counts are not public
+if METRICS_ENABLED and METRICS_TOKEN:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request):
+        """Prometheus scrape endpoint"""
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=get_message(get_language_from_request(request), "general.unauthorized")
+            )
+        return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+    # log_config=None keeps the logging set up by configure_logging()
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
@@ -0,0 +1,515 @@
+"""
+Load test of the hot endpoints: send_message, get_conversation_messages,
+get_saved_chats, login and signup, in a weighted mix at a fixed concurrency.
+
+The app runs in-process (lifespan included) and requests go through an ASGI
+transport, so the numbers cover the app and its database calls without network
+or load balancer overhead. External services are replaced by a local stub
+server:
+- Firebase Auth REST (FIREBASE_AUTH_URL) accepts every password.
+- The LLM is an OpenAI-compatible /chat/completions endpoint that answers
+  after --llm-latency seconds.
+Firebase Admin runs without credentials, so signup uses the app's built-in
+offline fallback.
+
+Database:
+- default: in-memory mongomock-motor (pip install mongomock-motor). Good for
+  comparing app-side cost between commits; database latency is ~0.
+- --mongo-uri mongodb://localhost:27017: a real (throwaway) mongod. Data goes
+  to the "eko_benchmark" database, which is dropped afterwards unless
+  --keep-data is given.
+
+Reported per operation: p50/p95/p99 latency, throughput, error count and
+database round-trips per request. Round-trips are measured in a sequential
+calibration pass so concurrent requests do not blur the attribution. With
+mongod they are wire commands from services.db_monitoring.command_monitor;
+with mongomock they are collection operations issued by the app.
+
+Usage:
+    python benchmarks/bench_endpoints.py [--concurrency 20] [--duration 30] [--save baseline.json]
+    python benchmarks/bench_endpoints.py --compare baseline.json [--threshold 10]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_MIX = "send_message=30,get_conversation_messages=35,get_saved_chats=25,login=7,signup=3"
+PASSWORD = "benchmark-password"
+PROMPTS = [
+    "I have been feeling a bit overwhelmed at work lately",
+    "How can I sleep better before an exam?",
+    "My friend stopped answering my messages, what should I do?",
+    "I want to build a habit of going for a run every morning",
+    "Can you help me prepare for a difficult conversation with my manager?",
+    "I feel anxious when I have to speak in meetings",
+    "What are some ways to take a real break on weekends?",
+    "I keep procrastinating on a project that matters to me"
+]
+BENCHMARK_DB_NAME = "eko_benchmark"
+
+# Collection methods that cost one database round-trip (find/aggregate: the first batch)
+ROUND_TRIP_METHODS = {
+    "find", "find_one", "aggregate", "count_documents", "estimated_document_count", "distinct",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "bulk_write"
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# --- Stub server (Firebase Auth REST + OpenAI-compatible LLM) ---
+
+class StubServer:
+    """Serves the external APIs on 127.0.0.1 from a background thread"""
+
+    def __init__(self, port: int, llm_latency: float):
+        self.port = port
+        self.llm_latency = llm_latency
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = None
+        self._thread = None
+
+    def _app(self):
+        from starlette.applications import Starlette
+        from starlette.responses import JSONResponse
+        from starlette.routing import Route
+
+        async def sign_in_with_password(request):
+            payload = await request.json()
+            return JSONResponse({
+                "kind": "identitytoolkit#VerifyPasswordResponse",
+                "localId": "stub-uid",
+                "email": payload.get("email"),
+                "idToken": "stub-id-token",
+                "registered": True,
+                "refreshToken": "stub-refresh-token",
+                "expiresIn": "3600"
+            })
+
+        async def chat_completions(request):
+            payload = await request.json()
+            await asyncio.sleep(self.llm_latency)
+            text = "Thanks for sharing that. Let's take it one step at a time: what feels most pressing right now?"
+            return JSONResponse({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]
+            })
+
+        return Starlette(routes=[
+            Route("/v1/accounts:signInWithPassword", sign_in_with_password, methods=["POST"]),
+            Route("/v1/chat/completions", chat_completions, methods=["POST"])
+        ])
+
+    def start(self):
+        import uvicorn
+        config = uvicorn.Config(self._app(), host="127.0.0.1", port=self.port, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def configure_environment(args, stub: StubServer):
+    """Point the app at the stub server and the benchmark database (before importing it)"""
+    os.environ.update(
+        LLM_PROVIDER="openai",
+        LLM_BASE_URL=f"{stub.url}/v1",
+        LLM_API_KEY="benchmark",
+        FIREBASE_API_KEY="benchmark",
+        FIREBASE_AUTH_URL=f"{stub.url}/v1",
+        RATE_LIMIT_ENABLED="false",
+        BOT_REPLY_MODE="sync",
+        SHARED_STATE_BACKEND="memory"
+    )
+    # Never create real Firebase users: blank credentials select the offline fallback
+    # (set explicitly so a local .env cannot supply them)
+    for name in ("FIREBASE_TYPE", "FIREBASE_PROJECT_ID", "FIREBASE_PRIVATE_KEY_ID", "FIREBASE_PRIVATE_KEY",
+                 "FIREBASE_CLIENT_EMAIL", "FIREBASE_CLIENT_ID"):
+        os.environ[name] = ""
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+    else:
+        # mongomock has no sessions
+        os.environ["MONGO_CAUSAL_CONSISTENCY"] = "false"
+
+
+# --- Database round-trip counting ---
+
+class _CountingCollection:
+    """Wraps a mongomock-motor collection and counts operations that would hit the server"""
+
+    def __init__(self, collection, counter: list):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, attribute):
+        value = getattr(self._collection, attribute)
+        if attribute in ROUND_TRIP_METHODS:
+            def counted(*args, **kwargs):
+                self._counter[0] += 1
+                return value(*args, **kwargs)
+            return counted
+        return value
+
+
+def install_database(args):
+    """Return a callable giving the number of database round-trips so far"""
+    import database
+
+    if args.mongo_uri:
+        from services.db_monitoring import command_monitor
+        database.DB_NAME = BENCHMARK_DB_NAME
+        return lambda: sum(stats["count"] for stats in command_monitor.snapshot().values())
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("mongomock-motor is not installed: pip install mongomock-motor, or pass --mongo-uri")
+    mock_database = AsyncMongoMockClient()[BENCHMARK_DB_NAME]
+    counter = [0]
+    collections = {}
+
+    def get_collection(name: str, routing: str = "primary"):
+        # Tiers and read routing are driver options with no effect on mongomock
+        if name not in collections:
+            collections[name] = _CountingCollection(mock_database[name], counter)
+        return collections[name]
+
+    database.get_collection = get_collection
+    return lambda: counter[0]
+
+
+# --- Operations ---
+
+class BenchmarkUser:
+    def __init__(self, email: str, token: str, chat_ids: list):
+        self.email = email
+        self.token = token
+        self.chat_ids = chat_ids
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+
+_signup_counter = [0]
+
+
+def _new_email() -> str:
+    _signup_counter[0] += 1
+    return f"bench-{os.getpid()}-{_signup_counter[0]}@example.com"
+
+
+async def op_signup(client, user, rng):
+    return await client.post("/auth/signup", json={
+        "email": _new_email(),
+        "password": PASSWORD,
+        "confirm_password": PASSWORD,
+        "agreed": True
+    })
+
+
+async def op_login(client, user, rng):
+    return await client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+
+
+async def op_send_message(client, user, rng):
+    chat_id = rng.choice(user.chat_ids)
+    # Distinct text so replies do not come from the response cache
+    message = f"{rng.choice(PROMPTS)} (#{rng.randrange(10 ** 9)})"
+    return await client.post(f"/chat/{chat_id}/message", json={"message": message}, headers=user.headers)
+
+
+async def op_get_conversation_messages(client, user, rng):
+    chat_id = rng.choice(user.chat_ids)
+    return await client.get(f"/chat/{chat_id}/messages", params={"page": 1, "limit": 20}, headers=user.headers)
+
+
+async def op_get_saved_chats(client, user, rng):
+    return await client.get("/chat/saved", params={"limit": 20}, headers=user.headers)
+
+
+OPERATIONS = {
+    "send_message": op_send_message,
+    "get_conversation_messages": op_get_conversation_messages,
+    "get_saved_chats": op_get_saved_chats,
+    "login": op_login,
+    "signup": op_signup
+}
+
+
+async def create_users(client, count: int, chats_per_user: int, messages_per_chat: int) -> list:
+    users = []
+    for index in range(count):
+        email = _new_email()
+        response = await client.post("/auth/signup", json={
+            "email": email, "password": PASSWORD, "confirm_password": PASSWORD, "agreed": True
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"signup failed during setup: {response.status_code} {response.text}")
+        user = BenchmarkUser(email, response.json()["data"]["token"], [])
+        for chat_index in range(chats_per_user):
+            response = await client.post("/chat/create", json={
+                "title": f"Benchmark chat {chat_index}", "short_description": "load test", "is_temporary": False
+            }, headers=user.headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"chat creation failed during setup: {response.status_code} {response.text}")
+            user.chat_ids.append(response.json()["data"]["chatId"])
+        users.append(user)
+
+    rng = random.Random(0)
+    for user in users:
+        for chat_id in user.chat_ids:
+            for _ in range(messages_per_chat):
+                await client.post(f"/chat/{chat_id}/message", json={
+                    "message": f"{rng.choice(PROMPTS)} (#{rng.randrange(10 ** 9)})"
+                }, headers=user.headers)
+    return users
+
+
+# --- Measurement ---
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3)
+    }
+
+
+async def calibrate_round_trips(client, users: list, mix: dict, round_trips, samples: int) -> dict:
+    """Round-trips per request for each operation, measured one request at a time"""
+    rng = random.Random(1)
+    per_request = {}
+    for name in mix:
+        before = round_trips()
+        for _ in range(samples):
+            await OPERATIONS[name](client, rng.choice(users), rng)
+        per_request[name] = round((round_trips() - before) / samples, 2)
+    return per_request
+
+
+async def run_load(client, users: list, mix: dict, concurrency: int, duration: float, seed: int):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](client, rng.choice(users), rng)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if failed:
+                errors[name] += 1
+            else:
+                samples[name].append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[virtual_user(index) for index in range(concurrency)])
+    return samples, errors, time.perf_counter() - started
+
+
+async def benchmark(args, stub: StubServer, round_trips) -> dict:
+    import httpx
+    import database
+    from app import app
+
+    mix = parse_mix(args.mix)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            # Setup and calibration without LLM latency
+            stub.llm_latency = 0.0
+            print(f"Creating {args.users} users with {args.chats_per_user} chats each ...")
+            users = await create_users(client, args.users, args.chats_per_user, args.messages_per_chat)
+            round_trips_per_request = await calibrate_round_trips(client, users, mix, round_trips, args.calibration)
+
+            stub.llm_latency = args.llm_latency
+            print(f"Running {args.duration:.0f}s at concurrency {args.concurrency} ...")
+            samples, errors, elapsed = await run_load(client, users, mix, args.concurrency, args.duration, args.seed)
+
+        if args.mongo_uri and not args.keep_data:
+            await database.get_client().drop_database(BENCHMARK_DB_NAME)
+
+    all_samples = [value for values in samples.values() for value in values]
+    operations = {}
+    for name in mix:
+        operations[name] = summarize(samples[name], errors[name], elapsed)
+        operations[name]["db_round_trips"] = round_trips_per_request[name]
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "database": "mongod" if args.mongo_uri else "mongomock",
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "llm_latency_seconds": args.llm_latency,
+            "users": args.users,
+            "chats_per_user": args.chats_per_user,
+            "messages_per_chat": args.messages_per_chat,
+            "mix": mix,
+            "seed": args.seed
+        },
+        "summary": summarize(all_samples, sum(errors.values()), elapsed),
+        "operations": operations
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+# --- Reporting ---
+
+def print_report(result: dict):
+    header = f"{'operation':<28}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db rt':>8}"
+    print()
+    print(header)
+    print("-" * len(header))
+    for name, stats in result["operations"].items():
+        print(f"{name:<28}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['db_round_trips']:>8.2f}")
+    summary = result["summary"]
+    print("-" * len(header))
+    print(f"{'total':<28}{summary['requests']:>9}{summary['errors']:>8}{summary['throughput_rps']:>10.1f}"
+          f"{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Print changes against a saved baseline; return the regressions beyond threshold percent"""
+    regressions = []
+
+    def change(new: float, old: float) -> float:
+        return (new - old) / old * 100 if old else 0.0
+
+    print(f"\nCompared with baseline {baseline['meta'].get('git_commit') or ''} ({baseline['meta']['timestamp']}):")
+    settings = ("database", "concurrency", "duration_seconds", "llm_latency_seconds", "users", "mix", "cpu_count")
+    different = [name for name in settings if result["meta"].get(name) != baseline["meta"].get(name)]
+    if different:
+        print(f"  warning: baseline was recorded with different settings ({', '.join(different)})")
+    rows = [("total", result["summary"], baseline["summary"])]
+    rows += [
+        (name, stats, baseline["operations"][name])
+        for name, stats in result["operations"].items() if name in baseline["operations"]
+    ]
+    for name, new, old in rows:
+        p95 = change(new["p95_ms"], old["p95_ms"])
+        throughput = change(new["throughput_rps"], old["throughput_rps"])
+        line = f"  {name:<28} p95 {p95:+7.1f}%   throughput {throughput:+7.1f}%"
+        if "db_round_trips" in new and "db_round_trips" in old:
+            line += f"   db round-trips {old['db_round_trips']:.2f} -> {new['db_round_trips']:.2f}"
+            if new["db_round_trips"] > old["db_round_trips"]:
+                regressions.append(f"{name}: more database round-trips per request")
+        if p95 > threshold:
+            regressions.append(f"{name}: p95 latency up {p95:.1f}%")
+        if -throughput > threshold:
+            regressions.append(f"{name}: throughput down {-throughput:.1f}%")
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=50, help="accounts created before the run")
+    parser.add_argument("--chats-per-user", type=int, default=3)
+    parser.add_argument("--messages-per-chat", type=int, default=10, help="messages sent into each chat before the run")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the stub LLM takes per completion")
+    parser.add_argument("--calibration", type=int, default=20, help="sequential requests per operation for round-trip counts")
+    parser.add_argument("--mongo-uri", default="", help="use this mongod instead of mongomock")
+    parser.add_argument("--keep-data", action="store_true", help=f"keep the {BENCHMARK_DB_NAME} database on mongod")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", default="", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", default="", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    stub = StubServer(free_port(), args.llm_latency)
+    configure_environment(args, stub)
+    round_trips = install_database(args)
+    stub.start()
+    try:
+        result = asyncio.run(benchmark(args, stub, round_trips))
+    finally:
+        stub.stop()
+
+    print_report(result)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(result, json.load(file), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
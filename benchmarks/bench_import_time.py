@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark: how long `import app` takes in a fresh interpreter.
+
+Each run starts a new `python -X importtime -c "import app"` process, which is
+what a new container (or gunicorn worker) pays before it can serve requests.
+Reports the median import time against a budget, and the slowest modules by
+cumulative import time from the median run. It also checks that heavy SDKs
+stay out of the startup path: they are imported on first use instead
+(firebase_admin on the first Firebase call, httpx when the LLM client is created).
+
+Exits with 1 when the median is over --budget-ms or a forbidden module is
+imported at startup, so it can run in CI.
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 7] [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported by `import app`
+DEFAULT_FORBIDDEN = "firebase_admin,google.auth,openai,httpx"
+
+
+def run_once() -> dict:
+    """Import the app in a fresh process; return {module: (self_us, cumulative_us, depth)}"""
+    env = {**os.environ, "METRICS_ENABLED": "true", "TRACING_ENABLED": "false"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # One space after the separator, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Cold-start budget for the median import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN, help="Comma-separated modules that must load lazily")
+    args = parser.parse_args()
+
+    # The first run warms the OS file cache and writes .pyc files; it is not counted
+    run_once()
+    runs = []
+    for _ in range(args.runs):
+        modules = run_once()
+        total_us = modules["app"][1]
+        runs.append((total_us, modules))
+    runs.sort(key=lambda run: run[0])
+    median_us, modules = runs[len(runs) // 2]
+
+    timings = [total_us / 1000 for total_us, _ in runs]
+    print(f"import app: median {median_us / 1000:.0f} ms, min {min(timings):.0f} ms, "
+          f"max {max(timings):.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print(f"  modules imported: {len(modules)}, stdev {statistics.pstdev(timings):.0f} ms")
+
+    print("\nSlowest imports (cumulative, median run; indented by nesting depth):")
+    for name, (self_us, cumulative_us, depth) in sorted(modules.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative_us / 1000:7.1f} ms  {'  ' * depth}{name}")
+
+    failed = False
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    imported = [name for name in forbidden if name in modules]
+    if imported:
+        print(f"\nFAIL: imported at startup (should load on first use): {', '.join(imported)}")
+        failed = True
+    if median_us / 1000 > args.budget_ms:
+        print(f"\nFAIL: median import time {median_us / 1000:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("\nOK: within budget, no forbidden modules at startup")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Microbenchmark: cost of one log line on the calling thread (the event loop).
+
+Compares:
+- print(..., flush=True): the old controller logging; container stdout is unbuffered.
+- a synchronous StreamHandler with the JSON formatter;
+- the queue handler from services/log.py, where formatting and writing happen
+  on a background thread. The writer is paused while timing and drains the
+  queue between repeats, so the number is the caller's share only. The
+  writer still needs the GIL to format, so on a busy single core some of
+  that work comes back as contention.
+- the same queue through log_sampled(), as used for per-request success
+  lines: skipped calls do not build a record at all.
+
+Every variant writes to the same temporary file.
+
+Usage:
+    python benchmarks/bench_logging.py [--iterations 20000]
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log import LOG_SAMPLE_RATE, ContextFilter, JsonFormatter, NonBlockingQueueHandler, log_sampled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    output = tempfile.TemporaryFile("w")
+    response = "Thanks for sharing that. Let's take it one step at a time: what feels most pressing right now?"
+
+    def print_line():
+        print(f"✅ Generated bot response: '{response[:100]}...'", file=output, flush=True)
+
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    sync_logger.setLevel(logging.INFO)
+    # StreamHandler flushes after every record
+    sync_handler = logging.StreamHandler(output)
+    sync_handler.setFormatter(JsonFormatter())
+    sync_handler.addFilter(ContextFilter())
+    sync_logger.addHandler(sync_handler)
+
+    queue_logger = logging.getLogger("bench.queue")
+    queue_logger.propagate = False
+    queue_logger.setLevel(logging.INFO)
+    queue_handler = NonBlockingQueueHandler(queue.Queue(args.iterations * 2))
+    queue_handler.addFilter(ContextFilter())
+    queue_logger.addHandler(queue_handler)
+    writer = logging.StreamHandler(output)
+    writer.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(queue_handler.queue, writer)
+
+    def sync_line():
+        sync_logger.info("generated bot response", extra={"length": len(response)})
+
+    def queued_line():
+        queue_logger.info("generated bot response", extra={"length": len(response)})
+
+    def sampled_line():
+        log_sampled(queue_logger, "generated bot response", length=len(response))
+
+    def drain():
+        listener.start()
+        listener.stop()
+
+    results = {}
+    for name, fn in (("print", print_line), ("sync_json", sync_line), ("queued_json", queued_line),
+                     (f"sampled_{LOG_SAMPLE_RATE:g}", sampled_line)):
+        timings = []
+        for _ in range(5):
+            timings.append(timeit.timeit(fn, number=args.iterations))
+            drain()
+        results[name] = min(timings) / args.iterations * 1e6
+
+    print(f"{args.iterations} log lines per repeat, best of 5 (caller thread)")
+    for name, micros in results.items():
+        print(f"  {name:<14} {micros:7.2f} us/line   vs print: {results['print'] / micros:4.2f}x")
+    print(f"  records dropped: {queue_handler.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Microbenchmark: bot prompt assembly + JSON encoding for 10-turn contexts.
+
+Compares the per-call approach (build the request dict around the system
+prompt and json.dumps all of it) against the pre-encoded request templates in
+services/openai.py.
+
+Usage:
+    python benchmarks/bench_prompt_assembly.py [--turns 10] [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_provider import LLM_REPLY_MODEL
+from services.openai import BOT_REQUEST_TEMPLATES, BOT_SYSTEM_PROMPTS
+
+
+def build_context(turns: int) -> list:
+    context = []
+    for turn in range(turns):
+        role = "user" if turn % 2 == 0 else "assistant"
+        context.append({
+            "role": role,
+            "content": f"Message {turn}: I have been feeling a bit overwhelmed at work lately, "
+                       f"and I'm not sure how to talk about it with my team. Any advice? ({role})"
+        })
+    return context
+
+
+def per_call(context: list, language_code: str) -> bytes:
+    # Equivalent of the original code path: build the body dict and encode all of it every call
+    system_prompt = BOT_SYSTEM_PROMPTS[language_code]
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(context)
+    return json.dumps({
+        "model": LLM_REPLY_MODEL,
+        "messages": messages,
+        "max_tokens": 500,
+        "temperature": 0.7
+    }).encode("utf-8")
+
+
+def templated(context: list, language_code: str) -> bytes:
+    return BOT_REQUEST_TEMPLATES[language_code].render(context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    context = build_context(args.turns)
+
+    # Both encodings must describe the same request
+    for language_code in ("en", "fr"):
+        assert json.loads(per_call(context, language_code)) == json.loads(templated(context, language_code))
+
+    results = {}
+    for name, fn in (("per_call", per_call), ("templated", templated)):
+        for language_code in ("en", "fr"):
+            best = min(timeit.repeat(lambda: fn(context, language_code), number=args.iterations, repeat=5))
+            results[(name, language_code)] = best / args.iterations * 1e6
+
+    print(f"{args.turns}-turn context, {args.iterations} iterations, best of 5")
+    for language_code in ("en", "fr"):
+        baseline = results[("per_call", language_code)]
+        optimized = results[("templated", language_code)]
+        print(f"  [{language_code}] per_call: {baseline:7.2f} us/op   templated: {optimized:7.2f} us/op   speedup: {baseline / optimized:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
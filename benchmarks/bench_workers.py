@@ -0,0 +1,162 @@
+"""
+Throughput benchmark: requests/second of the production server (gunicorn +
+uvicorn workers) as the worker count grows.
+
+For each worker count the script starts `gunicorn -c gunicorn.conf.py app:app`
+on a free port, then drives it with load generator processes. Each process
+holds keep-alive connections and sends requests as fast as the server answers.
+It reports throughput and scaling efficiency relative to one worker.
+
+The load generators use CPU too. For clean numbers, run on a machine with at
+least twice as many cores as the largest worker count, or point --url at a
+server on another host. MongoDB is not needed: the lifespan logs the failed
+index creation and the endpoints below do not touch the database.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--duration 10] [--path /health]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _connection(host: str, port: int, path: str, deadline: float) -> int:
+    """One keep-alive connection issuing sequential GETs; returns the number completed"""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n".encode("ascii")
+    completed = 0
+    try:
+        while time.monotonic() < deadline:
+            writer.write(request)
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            completed += 1
+    finally:
+        writer.close()
+    return completed
+
+
+def _load_process(host: str, port: int, path: str, connections: int, start_at: float, duration: float, results):
+    async def run():
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        deadline = time.monotonic() + duration
+        counts = await asyncio.gather(*[_connection(host, port, path, deadline) for _ in range(connections)])
+        results.put(sum(counts))
+    asyncio.run(run())
+
+
+def measure(host: str, port: int, path: str, clients: int, connections: int, duration: float) -> float:
+    """Requests per second sustained by the server at host:port"""
+    results = multiprocessing.Queue()
+    start_at = time.time() + 0.5
+    processes = [
+        multiprocessing.Process(target=_load_process, args=(host, port, path, connections, start_at, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_LOG_LEVEL="warning",
+        LLM_PROVIDER="mock",
+        RATE_LIMIT_ENABLED="false",
+        MONGO_URI=os.environ.get("MONGO_URI", "mongodb://127.0.0.1:1"),
+        MONGO_SERVER_SELECTION_TIMEOUT_MS=os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "200")
+    )
+    # Access logging would dominate the cost of a tiny endpoint
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_until_ready(host: str, port: int, workers: int, timeout: float = 60.0):
+    """Wait for the port to accept connections, then give every worker time to finish its lifespan"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        raise RuntimeError(f"server with {workers} workers did not start")
+    time.sleep(2.0)
+
+
+def stop_server(server: subprocess.Popen):
+    # SIGTERM is gunicorn's graceful shutdown
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, max(1, cores // 2)})),
+                        help="comma-separated worker counts (default: 1, 2 and half the cores)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--clients", type=int, default=0, help="load generator processes (default: 2 per worker)")
+    parser.add_argument("--connections", type=int, default=32, help="keep-alive connections per load generator")
+    parser.add_argument("--url", default="", help="benchmark an already running server (host:port) instead")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    if args.url:
+        host, port = args.url.rsplit(":", 1)
+        throughput = measure(host, int(port), args.path, args.clients or 2, args.connections, args.duration)
+        print(f"{args.url}{args.path}: {throughput:,.0f} req/s")
+        return
+
+    worker_counts = [int(value) for value in args.workers.split(",")]
+    print(f"{cores} cores, GET {args.path}, {args.duration:.0f}s per run")
+    baseline = None
+    for workers in worker_counts:
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            wait_until_ready(host, port, workers)
+            clients = args.clients or 2 * workers
+            throughput = measure(host, port, args.path, clients, args.connections, args.duration)
+        finally:
+            stop_server(server)
+
+        baseline = baseline or throughput / workers
+        efficiency = throughput / (baseline * workers)
+        print(f"  workers={workers:<3} clients={clients:<3} {throughput:10,.0f} req/s   "
+              f"speedup: {throughput / baseline:5.2f}x   efficiency: {efficiency:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
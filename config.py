@@ -0,0 +1,15 @@
+from dotenv import load_dotenv
+
+_loaded = False
+
+
+def load_env():
+    """
+    Load .env into os.environ once per process. Modules call this before reading
+    their settings with os.getenv, so import order does not matter.
+    """
+    global _loaded
+    if not _loaded:
+        # Found relative to this file: the project root
+        load_dotenv()
+        _loaded = True
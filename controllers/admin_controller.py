@@ -0,0 +1,54 @@
+import logging
+import time
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from locales import get_message
+from services.profiling import profile_running, run_profile, slow_requests
+
+logger = logging.getLogger(__name__)
+
+
+class AdminController:
+    async def profile(self, seconds: float, interval_ms: float, include_idle: bool, language: str = "en"):
+        """Sample this worker's threads and return the stacks in collapsed (flamegraph) format"""
+        try:
+            if profile_running():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=get_message(language, "admin.profile_in_progress")
+                )
+
+            profiler = await run_profile(seconds, interval_ms / 1000, include_idle)
+            logger.info("profile collected", extra={"seconds": seconds, "samples": profiler.samples, "stacks": len(profiler.stacks)})
+            filename = f"eko-profile-{int(time.time())}.folded"
+            return Response(
+                content=profiler.collapsed(),
+                media_type="text/plain; charset=utf-8",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
+
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error collecting profile")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(language, "general.internal_error")
+            )
+
+    async def get_slow_requests(self, limit: int, language: str = "en"):
+        """Most recent slow request reports of this worker, newest first"""
+        try:
+            reports = list(slow_requests)[::-1][:limit]
+            return {
+                "success": True,
+                "message": get_message(language, "admin.slow_requests"),
+                "data": {"requests": reports}
+            }
+
+        except Exception as error:
+            logger.exception("error listing slow requests")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(language, "general.internal_error")
+            )
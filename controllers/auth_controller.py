@@ -1,22 +1,29 @@
+import logging
 from fastapi import HTTPException, status
 from database import users
-from services.firebase import initialize_admin
+from services.firebase import FirebaseAuth, FirebaseRestClient, get_firebase_auth, get_firebase_rest
 import jwt
 import os
-from dotenv import load_dotenv
+from config import load_env
 from bson import ObjectId
 from datetime import datetime, timezone
 from locales import get_message
 from schemas.enums import Language, LanguageRequest
+from services.metrics import firebase_request_duration, track
+from services.tracing import span
+from services.log import log_sampled
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 TOKEN_KEY = os.getenv("TOKEN_KEY", "Test_124")  # Default fallback
 default_photo = "https://sauced-app-bucket.s3.us-east-2.amazonaws.com/sauced_placeholder.webp"
 
 class AuthController:
-    def __init__(self):
-        self.admin = initialize_admin()
+    def __init__(self, firebase: FirebaseAuth = None, firebase_rest: FirebaseRestClient = None):
+        self.firebase = firebase or get_firebase_auth()
+        self.firebase_rest = firebase_rest or get_firebase_rest()
     
     async def email_password_signup(self, email: str, password: str, confirm_password: str, language: str, agreed: bool):
         """Email/password signup using Firebase - uses language from request body"""
@@ -41,7 +48,8 @@ class AuthController:
                 "email_verified": False
             }
             
-            firebase_user = self.admin.auth.create_user(**user_properties)
+            with track(firebase_request_duration, "create_user"), span("firebase.create_user"):
+                firebase_user = await self.firebase.call("create_user", **user_properties)
             uid = firebase_user.uid
             
             # Create user in database
@@ -58,7 +66,8 @@ class AuthController:
                 "isDeleted": False,
                 "language": database_language,  # Store user's language preference (converted to database format)
                 "createdAt": datetime.now(timezone.utc),
-                "updatedAt": datetime.now(timezone.utc)
+                "updatedAt": datetime.now(timezone.utc),
+                "version": 1
             }
             
             result = await users.insert_one(new_user)
@@ -92,7 +101,7 @@ class AuthController:
             # Re-raise HTTPExceptions (like email already exists from MongoDB check)
             raise
         except Exception as error:
-            print(f"ERROR = {error}")
+            logger.warning("signup failed: %s", error)
             if "EMAIL_EXISTS" in str(error):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -150,42 +159,34 @@ class AuthController:
                 )
             
             # Verify password with Firebase using REST API
-            firebase_api_key = os.getenv("FIREBASE_API_KEY")
-            if not firebase_api_key:
-                print("❌ FIREBASE_API_KEY not found - cannot verify password")
+            if not self.firebase_rest.is_configured:
+                logger.error("FIREBASE_API_KEY is not set, cannot verify passwords")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(user_locale, "general.internal_error")
                 )
             
             try:
-                import httpx
-                url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={firebase_api_key}"
-                payload = {
-                    "email": email,
-                    "password": password,
-                    "returnSecureToken": True
-                }
-                
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(url, json=payload)
-                    
+                with track(firebase_request_duration, "sign_in_with_password") as outcome, span("firebase.sign_in_with_password"):
+                    response = await self.firebase_rest.sign_in_with_password(email, password)
                     if response.status_code != 200:
-                        # Firebase says password is wrong - DO NOT create token
-                        print(f"❌ Firebase password verification failed for {email}")
-                        raise HTTPException(
-                            status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail=get_message(user_locale, "auth.login.invalid_credentials")
-                        )
-                    
-                    # Firebase says password is correct - NOW we can create token
-                    firebase_response = response.json()
-                    print(f"✅ Firebase authentication successful for {email}")
+                        outcome["value"] = "rejected"
+                
+                if response.status_code != 200:
+                    # Firebase says password is wrong - DO NOT create token
+                    logger.info("password rejected by Firebase", extra={"user_id": str(existing_user["_id"])})
+                    raise HTTPException(
+                        status_code=status.HTTP_401_UNAUTHORIZED,
+                        detail=get_message(user_locale, "auth.login.invalid_credentials")
+                    )
+                
+                # Firebase says password is correct - NOW we can create token
+                log_sampled(logger, "password verified by Firebase", user_id=str(existing_user["_id"]))
                     
             except HTTPException:
                 raise
             except Exception as e:
-                print(f"❌ Firebase password verification error: {e}")
+                logger.warning("Firebase password verification error: %s", e)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail=get_message(user_locale, "auth.login.invalid_credentials")
@@ -222,7 +223,7 @@ class AuthController:
             # Re-raise HTTPExceptions (like user not found, account deleted, etc.)
             raise
         except Exception as error:
-            print(f"ERROR = {error}")
+            logger.exception("login failed")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=get_message(language, "general.internal_error")
@@ -255,10 +256,12 @@ class AuthController:
             
             # Generate password reset link using Firebase
             try:
-                reset_link = self.admin.auth.generate_password_reset_link(
-                    email,
-                    action_code_settings=None  # Use default settings
-                )
+                with track(firebase_request_duration, "generate_password_reset_link"), span("firebase.generate_password_reset_link"):
+                    reset_link = await self.firebase.call(
+                        "generate_password_reset_link",
+                        email,
+                        action_code_settings=None  # Use default settings
+                    )
                 
                 # In a real application, you would send this link via email
                 # For now, we'll return the link (in production, send via email service)
@@ -273,14 +276,14 @@ class AuthController:
                 }
                 
             except Exception as firebase_error:
-                print(f"Firebase password reset error: {firebase_error}")
+                logger.warning("Firebase password reset link failed: %s", firebase_error)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(language, "auth.forgot_password.reset_failed")
                 )
             
         except Exception as error:
-            print(f"ERROR = {error}")
+            logger.exception("forgot password failed")
             if isinstance(error, HTTPException):
                 raise error
             raise HTTPException(
@@ -328,13 +331,15 @@ class AuthController:
             firebase_uid = current_user.get("uid")
             if firebase_uid:
                 try:
-                    self.admin.auth.update_user(
-                        firebase_uid,
-                        display_name=name
-                    )
-                    print(f"✅ Firebase display name updated for user {firebase_uid}")
+                    with track(firebase_request_duration, "update_user"), span("firebase.update_user"):
+                        await self.firebase.call(
+                            "update_user",
+                            firebase_uid,
+                            display_name=name
+                        )
+                    logger.info("Firebase display name updated", extra={"uid": firebase_uid})
                 except Exception as e:
-                    print(f"❌ Firebase update error: {e}")
+                    logger.warning("Firebase display name update failed: %s", e)
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail=get_message(user_language, "auth.onboarding.firebase_update_failed")
@@ -353,7 +358,7 @@ class AuthController:
             
             result = await users.update_one(
                 {"_id": object_id},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}}
             )
             
             if result.modified_count == 0:
@@ -386,7 +391,7 @@ class AuthController:
             }
             
         except Exception as error:
-            print(f"ERROR = {error}")
+            logger.exception("onboarding failed")
             if isinstance(error, HTTPException):
                 raise error
             raise HTTPException(
@@ -1,15 +1,51 @@
+import logging
+import base64
+import json
 from fastapi import HTTPException, status
-from database import chats, users
-from services.openai import OpenAIService
+from typing import Optional
+from database import chats, chats_listing, messages_listing, users, causal_session
+from services.openai import OpenAIService, get_openai_service
+from services.search import search_language, query_terms, highlight
+from services.etag import ensure_version, if_match_version, precondition_failed, version_filter
 from models.chat import ChatModel, ChatResponse, CreateChatRequest, DeleteChatResponse, DeleteAllChatsResponse
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime, timezone
 from locales import get_message
 from schemas.enums import Language
 
+logger = logging.getLogger(__name__)
+
+# Fields needed to render the chat list
+SAVED_CHAT_PROJECTION = {
+    "title": 1,
+    "short_description": 1,
+    "status": 1,
+    "lastMessage": 1,
+    "lastMessageSender": 1,
+    "lastMessageAt": 1,
+    "version": 1
+}
+
+
+def encode_chat_cursor(chat: dict) -> str:
+    """Opaque keyset cursor pointing after this chat in (lastMessageAt, _id) order"""
+    position = {"t": chat["lastMessageAt"].isoformat(), "id": str(chat["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_chat_cursor(cursor: str):
+    """Return (lastMessageAt, _id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(position["t"]), ObjectId(position["id"])
+    except Exception as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+
+
 class ChatController:
-    def __init__(self):
-        self.openai_service = OpenAIService()
+    def __init__(self, openai_service: OpenAIService = None):
+        self.openai_service = openai_service or get_openai_service()
     
     async def get_chat_suggestions(self, user_id: str, user_language: str = "en"):
         """Get chat suggestion options"""
@@ -49,14 +85,18 @@ class ChatController:
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR getting chat suggestions: {error}")
+            logger.exception("error getting chat suggestions")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
     
-    async def get_saved_chats(self, user_id: str, user_language: str = "en"):
-        """Get user's saved chat conversations"""
+    async def get_saved_chats(self, user_id: str, user_language: str = "en", limit: int = 20, cursor: Optional[str] = None, chat_status: Optional[str] = None):
+        """Get a page of the user's saved chat conversations, most recently active first
+        
+        Pages are keyset paginated on (lastMessageAt, _id): pass the previous
+        page's next_cursor to continue after its last chat.
+        """
         try:
             # Convert string user_id to ObjectId
             try:
@@ -75,11 +115,36 @@ class ChatController:
                     detail=get_message(user_language, "auth.login.user_not_found")
                 )
             
-            # Get user's chats (excluding deleted ones)
-            user_chats = await chats.find({
+            query = {
                 "userId": str(object_id),
                 "isDeleted": False
-            }).sort("lastMessageAt", -1).to_list(length=100)
+            }
+            if chat_status:
+                query["status"] = chat_status
+            
+            # Continue after the last chat of the previous page
+            if cursor:
+                try:
+                    last_message_at, last_id = decode_chat_cursor(cursor)
+                except ValueError:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=get_message(user_language, "chat.saved.invalid_cursor")
+                    )
+                query["$or"] = [
+                    {"lastMessageAt": {"$lt": last_message_at}},
+                    {"lastMessageAt": last_message_at, "_id": {"$lt": last_id}}
+                ]
+            
+            # Get user's chats (excluding deleted ones), read from a secondary when available.
+            # One extra chat is fetched to know whether another page exists.
+            async with causal_session(str(object_id)) as session:
+                user_chats = await chats_listing.find(
+                    query, SAVED_CHAT_PROJECTION, session=session
+                ).sort([("lastMessageAt", -1), ("_id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+            
+            has_next = len(user_chats) > limit
+            user_chats = user_chats[:limit]
             
             # Format response
             saved_chats = []
@@ -87,19 +152,141 @@ class ChatController:
                 saved_chats.append({
                     "chat_id": str(chat["_id"]),
                     "title": chat["title"],
-                    "short_description": chat["short_description"]
+                    "short_description": chat["short_description"],
+                    "status": chat.get("status", "active"),
+                    "last_message": chat.get("lastMessage"),
+                    "last_message_sender": chat.get("lastMessageSender"),
+                    "last_message_at": chat.get("lastMessageAt"),
+                    "version": chat.get("version", 0)
                 })
             
             return {
                 "success": True,
                 "message": get_message(user_language, "chat.saved.success"),
-                "data": saved_chats
+                "data": {
+                    "chats": saved_chats,
+                    "pagination": {
+                        "limit": limit,
+                        "next_cursor": encode_chat_cursor(user_chats[-1]) if has_next else None,
+                        "has_next": has_next
+                    }
+                }
             }
             
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR getting saved chats: {error}")
+            logger.exception("error getting saved chats")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+    
+    async def search(self, user_id: str, query: str, page: int = 1, limit: int = 20, user_language: str = "en"):
+        """Full-text search over the user's chat titles and messages, best matches first"""
+        try:
+            # Convert string user_id to ObjectId
+            try:
+                object_id = ObjectId(user_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_user_id")
+                )
+            
+            query = query.strip()
+            terms = query_terms(query)
+            if not terms:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "chat.search.invalid_query")
+                )
+            
+            # Verify user exists
+            user = await users.find_one({"_id": object_id, "isDeleted": False})
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "auth.login.user_not_found")
+                )
+            
+            # The query is stemmed in the user's language; the text indexes are
+            # prefixed by userId so only this user's entries are scanned
+            text_filter = {"$search": query, "$language": search_language(user.get("language", "english"))}
+            score = {"$meta": "textScore"}
+            skip = (page - 1) * limit
+            
+            async with causal_session(str(object_id)) as session:
+                message_hits = await messages_listing.find(
+                    {"userId": str(object_id), "isDeleted": False, "$text": text_filter},
+                    {"score": score, "chatId": 1, "sender": 1, "message": 1, "timestamp": 1},
+                    session=session
+                ).sort([("score", score), ("_id", -1)]).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+                
+                chat_hits = await chats_listing.find(
+                    {"userId": str(object_id), "isDeleted": False, "$text": text_filter},
+                    {"score": score, "title": 1, "short_description": 1, "lastMessageAt": 1},
+                    session=session
+                ).sort([("score", score), ("_id", -1)]).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+                
+                has_next = len(message_hits) > limit or len(chat_hits) > limit
+                message_hits = message_hits[:limit]
+                chat_hits = chat_hits[:limit]
+                
+                # Titles of the chats the messages belong to; messages of deleted chats are dropped
+                parent_ids = list({ObjectId(hit["chatId"]) for hit in message_hits})
+                parent_chats = {
+                    str(chat["_id"]): chat
+                    for chat in await chats_listing.find(
+                        {"_id": {"$in": parent_ids}, "userId": str(object_id), "isDeleted": False},
+                        {"title": 1},
+                        session=session
+                    ).to_list(length=len(parent_ids))
+                }
+            
+            chat_results = [
+                {
+                    "chat_id": str(chat["_id"]),
+                    "title": chat["title"],
+                    "short_description": chat["short_description"],
+                    "last_message_at": chat.get("lastMessageAt"),
+                    "score": chat["score"],
+                    **highlight(chat["title"], terms)
+                }
+                for chat in chat_hits
+            ]
+            message_results = [
+                {
+                    "message_id": str(hit["_id"]),
+                    "chat_id": hit["chatId"],
+                    "chat_title": parent_chats[hit["chatId"]]["title"],
+                    "sender": hit["sender"],
+                    "timestamp": hit["timestamp"],
+                    "score": hit["score"],
+                    **highlight(hit["message"], terms)
+                }
+                for hit in message_hits
+                if hit["chatId"] in parent_chats
+            ]
+            
+            return {
+                "success": True,
+                "message": get_message(user_language, "chat.search.success"),
+                "data": {
+                    "chats": chat_results,
+                    "messages": message_results,
+                    "pagination": {
+                        "current_page": page,
+                        "limit": limit,
+                        "has_next": has_next
+                    }
+                }
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error searching chats")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
@@ -135,11 +322,18 @@ class ChatController:
                 "createdAt": datetime.now(timezone.utc),
                 "updatedAt": datetime.now(timezone.utc),
                 "lastMessageAt": datetime.now(timezone.utc),
+                "lastMessage": None,
+                "lastMessageSender": None,
+                "lastMessageId": None,
                 "messageCount": 0,
-                "isDeleted": False
+                "isDeleted": False,
+                "version": 1,
+                # Text index language override (stemming for title search)
+                "searchLanguage": search_language(user.get("language", "english"))
             }
             
-            result = await chats.insert_one(new_chat)
+            async with causal_session(str(object_id)) as session:
+                result = await chats.insert_one(new_chat, session=session)
             chat_id = str(result.inserted_id)
             
             # Return response
@@ -156,22 +350,25 @@ class ChatController:
                     "updatedAt": new_chat["updatedAt"],
                     "lastMessageAt": new_chat["lastMessageAt"],
                     "messageCount": new_chat["messageCount"],
-                    "isDeleted": new_chat["isDeleted"]
+                    "isDeleted": new_chat["isDeleted"],
+                    "version": new_chat["version"]
                 }
             }
             
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR creating chat: {error}")
+            logger.exception("error creating chat")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
     
-    async def delete_chat(self, user_id: str, chat_id: str, user_language: str = "en"):
-        """Delete a specific chat (soft delete)"""
+    async def delete_chat(self, user_id: str, chat_id: str, user_language: str = "en", if_match: Optional[str] = None):
+        """Delete a specific chat (soft delete), only at the If-Match version when given"""
         try:
+            expected_version = if_match_version(if_match, user_language)
+            
             # Convert string user_id to ObjectId
             try:
                 user_object_id = ObjectId(user_id)
@@ -210,21 +407,29 @@ class ChatController:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=get_message(user_language, "chat.not_found")
                 )
+            ensure_version(chat, expected_version, user_language)
             
             # Soft delete the chat
             now = datetime.now(timezone.utc)
-            result = await chats.update_one(
-                {"_id": chat_object_id},
-                {
-                    "$set": {
-                        "isDeleted": True,
-                        "status": "deleted",
-                        "updatedAt": now
-                    }
-                }
-            )
+            async with causal_session(str(user_object_id)) as session:
+                deleted = await chats.find_one_and_update(
+                    {"_id": chat_object_id, **version_filter(expected_version)},
+                    {
+                        "$set": {
+                            "isDeleted": True,
+                            "status": "deleted",
+                            "updatedAt": now
+                        },
+                        "$inc": {"version": 1}
+                    },
+                    projection={"version": 1},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
             
-            if result.modified_count == 0:
+            if deleted is None:
+                if expected_version is not None:
+                    raise precondition_failed(user_language)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(user_language, "general.internal_error")
@@ -235,14 +440,15 @@ class ChatController:
                 "message": get_message(user_language, "chat.delete.success"),
                 "data": {
                     "chatId": chat_id,
-                    "deletedAt": now
+                    "deletedAt": now,
+                    "version": deleted["version"]
                 }
             }
             
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR deleting chat: {error}")
+            logger.exception("error deleting chat")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
@@ -270,19 +476,22 @@ class ChatController:
             
             # Soft delete all user's chats
             now = datetime.now(timezone.utc)
-            result = await chats.update_many(
-                {
-                    "userId": str(user_object_id),
-                    "isDeleted": False
-                },
-                {
-                    "$set": {
-                        "isDeleted": True,
-                        "status": "deleted",
-                        "updatedAt": now
-                    }
-                }
-            )
+            async with causal_session(str(user_object_id)) as session:
+                result = await chats.update_many(
+                    {
+                        "userId": str(user_object_id),
+                        "isDeleted": False
+                    },
+                    {
+                        "$set": {
+                            "isDeleted": True,
+                            "status": "deleted",
+                            "updatedAt": now
+                        },
+                        "$inc": {"version": 1}
+                    },
+                    session=session
+                )
             
             return {
                 "success": True,
@@ -296,7 +505,7 @@ class ChatController:
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR deleting all chats: {error}")
+            logger.exception("error deleting all chats")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
@@ -0,0 +1,351 @@
+import logging
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from bson import ObjectId
+from config import load_env
+from database import chats, chats_listing, messages_listing, users, causal_session
+from controllers.message_controller import MessageController
+from models.chat import ChatModel
+from models.message import MessageModel
+from services.search import search_language
+from locales import get_message
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Documents fetched per cursor round trip while exporting
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Messages written per insert_many while importing
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_LINES = int(os.getenv("IMPORT_MAX_LINES", "100000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", "65536"))
+# Per-line errors listed in the import response (the total is always reported)
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+EXPORT_FORMAT_VERSION = 1
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+CHAT_EXPORT_PROJECTION = {
+    "title": 1,
+    "short_description": 1,
+    "is_temporary": 1,
+    "status": 1,
+    "createdAt": 1,
+    "lastMessageAt": 1
+}
+MESSAGE_EXPORT_PROJECTION = {
+    "sender": 1,
+    "message": 1,
+    "pictures": 1,
+    "voices": 1,
+    "timestamp": 1,
+    "updatedAt": 1
+}
+
+
+def _ndjson_line(record: dict) -> bytes:
+    return (json.dumps(jsonable_encoder(record), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class ExportController:
+    """
+    Chat history export/import as NDJSON, one record per line:
+
+        {"type": "export", "version": 1, "exportedAt": ...}
+        {"type": "chat", "chat_id": ..., "title": ..., ...}
+        {"type": "message", "chat_id": ..., "sender": ..., "message": ..., ...}
+
+    Each chat record comes before its messages.
+    """
+
+    def __init__(self, message_controller: MessageController = None):
+        self.message_controller = message_controller or MessageController()
+
+    async def _get_user(self, user_id: str, user_language: str) -> dict:
+        try:
+            object_id = ObjectId(user_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=get_message(user_language, "general.invalid_user_id")
+            )
+
+        user = await users.find_one({"_id": object_id, "isDeleted": False})
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=get_message(user_language, "auth.login.user_not_found")
+            )
+        return user
+
+    async def _get_chat(self, user_id: str, chat_id: str, user_language: str) -> dict:
+        try:
+            chat_object_id = ObjectId(chat_id)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=get_message(user_language, "general.invalid_chat_id")
+            )
+
+        chat = await chats.find_one({"_id": chat_object_id, "userId": user_id, "isDeleted": False})
+        if not chat:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=get_message(user_language, "chat.not_found")
+            )
+        return chat
+
+    async def export_history(self, user_id: str, chat_id: Optional[str] = None, user_language: str = "en"):
+        """Stream one chat, or every chat of the user, as NDJSON"""
+        try:
+            await self._get_user(user_id, user_language)
+            if chat_id is not None:
+                await self._get_chat(user_id, chat_id, user_language)
+
+            filename = f"eko-chat-{chat_id}.ndjson" if chat_id else "eko-history.ndjson"
+            return StreamingResponse(
+                self._export_lines(user_id, chat_id),
+                media_type=NDJSON_MEDIA_TYPE,
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
+
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error exporting chat history")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+
+    async def _export_lines(self, user_id: str, chat_id: Optional[str]) -> AsyncIterator[bytes]:
+        """
+        Yield the export one cursor batch at a time, so memory stays constant
+        however long the history is
+        """
+        chat_query = {"userId": user_id, "isDeleted": False}
+        if chat_id is not None:
+            chat_query["_id"] = ObjectId(chat_id)
+
+        yield _ndjson_line({
+            "type": "export",
+            "version": EXPORT_FORMAT_VERSION,
+            "exportedAt": datetime.now(timezone.utc)
+        })
+
+        try:
+            async with causal_session(user_id) as session:
+                chat_cursor = chats_listing.find(chat_query, CHAT_EXPORT_PROJECTION, session=session).sort("createdAt", 1).batch_size(EXPORT_BATCH_SIZE)
+                async for chat in chat_cursor:
+                    yield _ndjson_line({
+                        "type": "chat",
+                        "chat_id": str(chat["_id"]),
+                        "title": chat["title"],
+                        "short_description": chat["short_description"],
+                        "is_temporary": chat.get("is_temporary", False),
+                        "status": chat.get("status", "active"),
+                        "createdAt": chat.get("createdAt"),
+                        "lastMessageAt": chat.get("lastMessageAt")
+                    })
+
+                    message_cursor = messages_listing.find(
+                        {"chatId": str(chat["_id"]), "isDeleted": False},
+                        MESSAGE_EXPORT_PROJECTION,
+                        session=session
+                    ).sort("timestamp", 1).batch_size(EXPORT_BATCH_SIZE)
+
+                    chunk = []
+                    async for message in message_cursor:
+                        chunk.append(_ndjson_line({
+                            "type": "message",
+                            "chat_id": str(chat["_id"]),
+                            "message_id": str(message["_id"]),
+                            "sender": message["sender"],
+                            "message": message["message"],
+                            "pictures": message.get("pictures", []),
+                            "voices": message.get("voices", []),
+                            "timestamp": message["timestamp"],
+                            "updatedAt": message.get("updatedAt", message["timestamp"])
+                        }))
+                        if len(chunk) >= EXPORT_BATCH_SIZE:
+                            yield b"".join(chunk)
+                            chunk = []
+                    if chunk:
+                        yield b"".join(chunk)
+        except Exception as error:
+            # Headers are already sent; the client sees a truncated file
+            logger.exception("error streaming chat history export")
+            raise
+
+    async def _iter_lines(self, request: Request) -> AsyncIterator[bytes]:
+        """Split the streamed request body into lines without buffering it whole"""
+        pending = b""
+        skipping = False
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if skipping:
+                    # Rest of an over-long line that was already reported
+                    skipping = False
+                    continue
+                yield line
+            if len(pending) > IMPORT_MAX_LINE_BYTES and not skipping:
+                # Hand the start of an over-long line on so it is reported, drop the rest
+                yield pending
+                skipping = True
+            if skipping:
+                pending = b""
+        if pending and not skipping:
+            yield pending
+
+    async def import_history(self, user_id: str, request: Request, chat_id: Optional[str] = None, user_language: str = "en"):
+        """Import an NDJSON export.
+
+        Into an existing chat (chat_id given): every message record is appended to it
+        and chat records are ignored. Account import: each chat record creates a new
+        chat and the messages that follow it are added to that chat.
+        """
+        try:
+            user = await self._get_user(user_id, user_language)
+            target_chat = await self._get_chat(user_id, chat_id, user_language) if chat_id is not None else None
+            language = search_language(user.get("language", "english"))
+
+            # exported chat id -> new chat ObjectId
+            chat_ids = {}
+            pending = defaultdict(list)
+            pending_count = 0
+            imported = 0
+            created_chats = 0
+            errors = []
+            error_count = 0
+            truncated = False
+
+            async def flush():
+                nonlocal pending_count, imported
+                for chat_object_id, message_docs in pending.items():
+                    message_docs.sort(key=lambda doc: doc["timestamp"])
+                    for start in range(0, len(message_docs), IMPORT_BATCH_SIZE):
+                        batch = message_docs[start:start + IMPORT_BATCH_SIZE]
+                        await self.message_controller.persist_messages(user_id, chat_object_id, batch)
+                        imported += len(batch)
+                pending.clear()
+                pending_count = 0
+
+            line_number = 0
+            async for raw_line in self._iter_lines(request):
+                line_number += 1
+                if not raw_line.strip():
+                    continue
+                if line_number > IMPORT_MAX_LINES:
+                    truncated = True
+                    break
+
+                try:
+                    if len(raw_line) > IMPORT_MAX_LINE_BYTES:
+                        raise ValueError(get_message(user_language, "chat.import.line_too_long"))
+                    try:
+                        record = json.loads(raw_line)
+                    except ValueError:
+                        raise ValueError(get_message(user_language, "chat.import.invalid_line"))
+                    if not isinstance(record, dict):
+                        raise ValueError(get_message(user_language, "chat.import.invalid_line"))
+                    record_type = record.get("type")
+
+                    if record_type == "chat":
+                        if target_chat is not None:
+                            continue
+                        chat_doc = await self._create_imported_chat(user_id, record, language)
+                        chat_ids[record.get("chat_id")] = chat_doc["_id"]
+                        created_chats += 1
+
+                    elif record_type == "message":
+                        if target_chat is not None:
+                            chat_object_id = target_chat["_id"]
+                        elif record.get("chat_id") in chat_ids:
+                            chat_object_id = chat_ids[record["chat_id"]]
+                        else:
+                            raise ValueError(get_message(user_language, "chat.import.unknown_chat"))
+
+                        message_doc = MessageModel(
+                            chatId=str(chat_object_id),
+                            userId=user_id,
+                            sender=record.get("sender"),
+                            message=record.get("message"),
+                            pictures=record.get("pictures") or [],
+                            voices=record.get("voices") or [],
+                            timestamp=record.get("timestamp") or datetime.now(timezone.utc)
+                        ).model_dump(exclude={"id"})
+                        # The original time stays in timestamp; persist_messages stamps updatedAt
+                        # with the import time, so delta sync picks the imported messages up
+                        if message_doc["timestamp"].tzinfo is None:
+                            # Exports carry naive UTC timestamps (as stored by MongoDB)
+                            message_doc["timestamp"] = message_doc["timestamp"].replace(tzinfo=timezone.utc)
+                        message_doc["isDeleted"] = False
+                        message_doc["searchLanguage"] = language
+                        pending[chat_object_id].append(message_doc)
+                        pending_count += 1
+                        if pending_count >= IMPORT_BATCH_SIZE:
+                            await flush()
+
+                    elif record_type != "export":
+                        raise ValueError(get_message(user_language, "chat.import.invalid_line"))
+
+                except (ValueError, ValidationError) as error:
+                    error_count += 1
+                    if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                        detail = "; ".join(
+                            f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors()
+                        ) if isinstance(error, ValidationError) else str(error)
+                        errors.append({"line": line_number, "error": detail})
+
+            await flush()
+
+            return {
+                "success": True,
+                "message": get_message(user_language, "chat.import.success"),
+                "data": {
+                    "chats_created": created_chats,
+                    "messages_imported": imported,
+                    "error_count": error_count,
+                    "errors": errors,
+                    "truncated": truncated
+                }
+            }
+
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error importing chat history")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+
+    async def _create_imported_chat(self, user_id: str, record: dict, language: str) -> dict:
+        created_at = record.get("createdAt") or datetime.now(timezone.utc)
+        chat = ChatModel(
+            userId=user_id,
+            title=record.get("title"),
+            short_description=record.get("short_description") or "",
+            is_temporary=record.get("is_temporary", False),
+            status=record.get("status") if record.get("status") in ("active", "archived") else "active",
+            createdAt=created_at,
+            # The imported messages move lastMessageAt and the preview forward
+            lastMessageAt=created_at
+        ).model_dump(exclude={"id"})
+        chat["updatedAt"] = datetime.now(timezone.utc)
+        chat["searchLanguage"] = language
+
+        async with causal_session(user_id) as session:
+            result = await chats.insert_one(chat, session=session)
+        chat["_id"] = result.inserted_id
+        return chat
@@ -1,21 +1,44 @@
-from fastapi import HTTPException, status
-from database import messages, chats, users
-from services.openai import OpenAIService
+import logging
+import asyncio
+from fastapi import HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from typing import Optional
+from database import messages, messages_listing, chats, users, causal_session
+from services.openai import OpenAIService, get_openai_service
+from services.job_queue import bot_job_queue, BOT_REPLY_MODE, JOB_DONE
+from services.pubsub import message_broker
+from services.search import search_language
+from services.etag import ensure_version, if_match_version, precondition_failed, version_filter
 from models.message import (
     MessageModel, MessageResponse, SendMessageRequest, UpdateMessageRequest,
+    BatchDeleteMessagesRequest, BatchUpdateMessagesRequest,
     ConversationResponse, SendMessageResponse, UpdateMessageResponse, DeleteMessageResponse
 )
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timezone
 from locales import get_message
 from schemas.enums import Language
 
+logger = logging.getLogger(__name__)
+
+# Idle WebSocket connections get a ping this often so proxies keep them open
+WEBSOCKET_PING_INTERVAL = 30
+# Characters of the latest message kept on the chat document for the chat list
+LAST_MESSAGE_PREVIEW_LENGTH = 120
+
+
 class MessageController:
-    def __init__(self):
-        self.openai_service = OpenAIService()
+    def __init__(self, openai_service: OpenAIService = None):
+        self.openai_service = openai_service or get_openai_service()
     
-    async def get_conversation_messages(self, user_id: str, chat_id: str, page: int = 1, limit: int = 20, user_language: str = "en"):
-        """Get paginated messages from a chat conversation"""
+    async def get_conversation_messages(self, user_id: str, chat_id: str, page: int = 1, limit: int = 20, user_language: str = "en", since: Optional[datetime] = None):
+        """Get paginated messages from a chat conversation
+        
+        With `since`, returns only messages newer than that timestamp in chronological
+        order (used by clients polling for bot replies) instead of a numbered page.
+        """
         try:
             # Convert string user_id to ObjectId
             try:
@@ -55,38 +78,31 @@ class MessageController:
                     detail=get_message(user_language, "chat.not_found")
                 )
             
+            if since is not None:
+                return await self._get_messages_since(str(user_object_id), chat_object_id, since, limit, user_language)
+            
             # Calculate pagination
             skip = (page - 1) * limit
             
-            # Get messages with pagination
-            messages_cursor = messages.find({
-                "chatId": str(chat_object_id),
-                "isDeleted": False
-            }).sort("timestamp", -1).skip(skip).limit(limit)
-            
-            messages_list = await messages_cursor.to_list(length=limit)
-            
-            # Get total count for pagination
-            total_messages = await messages.count_documents({
-                "chatId": str(chat_object_id),
-                "isDeleted": False
-            })
+            # History reads go to a secondary when available; the causal session
+            # makes sure the user's own latest writes are visible there
+            async with causal_session(str(user_object_id)) as session:
+                # Get messages with pagination
+                messages_cursor = messages_listing.find({
+                    "chatId": str(chat_object_id),
+                    "isDeleted": False
+                }, session=session).sort("timestamp", -1).skip(skip).limit(limit)
+                
+                messages_list = await messages_cursor.to_list(length=limit)
+                
+                # Get total count for pagination
+                total_messages = await messages_listing.count_documents({
+                    "chatId": str(chat_object_id),
+                    "isDeleted": False
+                }, session=session)
             
             # Format messages
-            formatted_messages = []
-            for msg in messages_list:
-                formatted_messages.append({
-                    "messageId": str(msg["_id"]),
-                    "chatId": msg["chatId"],
-                    "userId": msg["userId"],
-                    "sender": msg["sender"],
-                    "message": msg["message"],
-                    "pictures": msg.get("pictures", []),
-                    "voices": msg.get("voices", []),
-                    "timestamp": msg["timestamp"],
-                    "isDeleted": msg.get("isDeleted", False),
-                    "updatedAt": msg.get("updatedAt", msg["timestamp"])
-                })
+            formatted_messages = [self.format_message(msg) for msg in messages_list]
             
             # Calculate pagination info
             total_pages = (total_messages + limit - 1) // limit
@@ -109,12 +125,52 @@ class MessageController:
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR getting conversation messages: {error}")
+            logger.exception("error getting conversation messages")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
     
+    def format_message(self, msg: dict) -> dict:
+        """Format a message document for API responses"""
+        return {
+            "messageId": str(msg["_id"]),
+            "chatId": msg["chatId"],
+            "userId": msg["userId"],
+            "sender": msg["sender"],
+            "message": msg["message"],
+            "pictures": msg.get("pictures", []),
+            "voices": msg.get("voices", []),
+            "timestamp": msg["timestamp"],
+            "isDeleted": msg.get("isDeleted", False),
+            "updatedAt": msg.get("updatedAt", msg["timestamp"]),
+            "version": msg.get("version", 0)
+        }
+    
+    async def _get_messages_since(self, user_id: str, chat_object_id: ObjectId, since: datetime, limit: int, user_language: str):
+        """Get messages newer than `since`, oldest first"""
+        async with causal_session(user_id) as session:
+            messages_list = await messages_listing.find({
+                "chatId": str(chat_object_id),
+                "isDeleted": False,
+                "timestamp": {"$gt": since}
+            }, session=session).sort("timestamp", 1).limit(limit).to_list(length=limit)
+        
+        formatted_messages = [self.format_message(msg) for msg in messages_list]
+        
+        return {
+            "success": True,
+            "message": get_message(user_language, "message.conversation.success"),
+            "data": {
+                "messages": formatted_messages,
+                "pagination": {
+                    "since": since,
+                    "next_since": formatted_messages[-1]["timestamp"] if formatted_messages else since,
+                    "has_next": len(formatted_messages) == limit
+                }
+            }
+        }
+    
     async def send_message(self, user_id: str, chat_id: str, request: SendMessageRequest, user_language: str = "en"):
         """Send a message to the chatbot and get bot response"""
         try:
@@ -168,33 +224,82 @@ class MessageController:
                 "voices": request.voices,
                 "timestamp": now,
                 "isDeleted": False,
-                "updatedAt": now
+                "updatedAt": now,
+                "version": 1,
+                # Text index language override (stemming for search)
+                "searchLanguage": search_language(user.get("language", "english"))
             }
             
-            # Insert user message
-            user_msg_result = await messages.insert_one(user_message)
-            user_message_id = str(user_msg_result.inserted_id)
+            # Store the user message before generating the reply, so it is kept even if generation fails
+            if BOT_REPLY_MODE == "async":
+                user_message_id, = await self.persist_messages(str(user_object_id), chat_object_id, [user_message])
+            else:
+                # Sync mode: the chat update waits for the reply, so one write counts both messages
+                user_message_id, = await self.insert_messages(str(user_object_id), [user_message])
+            message_broker.publish_message(self.format_message(user_message))
             
-            # Generate bot response
-            bot_response = await self._generate_bot_response(
+            # Async mode: let the worker pool generate the reply
+            if BOT_REPLY_MODE == "async":
+                job_id = await bot_job_queue.enqueue(
+                    chat_id=str(chat_object_id),
+                    user_id=str(user_object_id),
+                    user_message_id=user_message_id,
+                    user_message_at=now,
+                    user_language=user.get("language", "english"),
+                    use_cache=request.use_cache
+                )
+                
+                return {
+                    "success": True,
+                    "message": get_message(user_language, "message.send.queued"),
+                    "data": {
+                        "messageId": user_message_id,
+                        "chatId": str(chat_object_id),
+                        "sender": "user",
+                        "message": request.message.strip(),
+                        "pictures": request.pictures,
+                        "voices": request.voices,
+                        "timestamp": now,
+                        "job": {
+                            "jobId": job_id,
+                            "status": "pending"
+                        }
+                    }
+                }
+            
+            bot_message = await self._generate_bot_response(
                 chat_id=str(chat_object_id),
-                user_id=str(user_object_id),
-                user_message=request.message.strip(),
-                user_language=user.get("language", "english")
+                until=now,
+                user_language=user.get("language", "english"),
+                use_cache=request.use_cache
             )
             
-            # Update chat's last message time and message count
-            await chats.update_one(
-                {"_id": chat_object_id},
-                {
-                    "$set": {
-                        "lastMessageAt": now,
-                        "updatedAt": now
-                    },
-                    "$inc": {"messageCount": 1 if not bot_response else 2}  # +1 for user message, +1 for bot response
-                }
+            bot_message_doc = None
+            if bot_message:
+                bot_message_doc = self._build_bot_message(
+                    str(chat_object_id), str(user_object_id), bot_message, user.get("language", "english")
+                )
+            
+            # Bot message insert, then a single chat update counting the user message too
+            bot_message_ids = await self.persist_messages(
+                str(user_object_id), chat_object_id, [bot_message_doc] if bot_message_doc else [],
+                stored_docs=[user_message]
             )
             
+            bot_response = None
+            if bot_message_doc:
+                bot_message_id, = bot_message_ids
+                message_broker.publish_message(self.format_message(bot_message_doc))
+                bot_response = {
+                    "messageId": bot_message_id,
+                    "chatId": str(chat_object_id),
+                    "sender": "bot",
+                    "message": bot_message,
+                    "pictures": [],
+                    "voices": [],
+                    "timestamp": bot_message_doc["timestamp"]
+                }
+            
             # Format response
             response_data = {
                 "messageId": user_message_id,
@@ -218,78 +323,431 @@ class MessageController:
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR sending message: {error}")
+            logger.exception("error sending message")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
     
-    async def _generate_bot_response(self, chat_id: str, user_id: str, user_message: str, user_language: str = "english"):
-        """Generate EKO bot response using OpenAI"""
+    async def _generate_bot_response(self, chat_id: str, until: datetime, user_language: str = "english", use_cache: bool = True) -> Optional[str]:
+        """Generate the EKO bot reply text to the user message stored at `until`"""
         try:
-            # Get recent conversation context (last 10 messages)
-            recent_messages = await messages.find({
-                "chatId": chat_id,
-                "isDeleted": False
-            }).sort("timestamp", -1).limit(10).to_list(length=10)
-            
-            # Build conversation context
-            conversation_context = []
-            for msg in reversed(recent_messages):  # Reverse to get chronological order
-                role = "user" if msg["sender"] == "user" else "assistant"
-                conversation_context.append({
-                    "role": role,
-                    "content": msg["message"]
-                })
-            
-            # Add current user message
-            conversation_context.append({
-                "role": "user",
-                "content": user_message
-            })
+            # Recent conversation context (last 10 messages), ending with the user message
+            conversation_context = await self._load_conversation_context(chat_id, until=until)
             
             # Generate bot response using OpenAI
-            bot_message = await self.openai_service.generate_bot_response(
-                conversation_context, user_language
+            return await self.openai_service.generate_bot_response(
+                conversation_context, user_language, use_cache=use_cache
             )
             
-            if bot_message:
-                # Create bot message
-                now = datetime.now(timezone.utc)
-                bot_message_doc = {
+        except Exception as error:
+            logger.exception("error generating bot response")
+            return None
+    
+    def _build_bot_message(self, chat_id: str, user_id: str, bot_message: str, user_language: str = "english") -> dict:
+        now = datetime.now(timezone.utc)
+        return {
+            "chatId": chat_id,
+            "userId": user_id,
+            "sender": "bot",
+            "message": bot_message,
+            "pictures": [],
+            "voices": [],
+            "timestamp": now,
+            "isDeleted": False,
+            "updatedAt": now,
+            "version": 1,
+            "searchLanguage": search_language(user_language)
+        }
+    
+    def _preview_text(self, text: str) -> str:
+        text = " ".join(text.split())
+        if len(text) > LAST_MESSAGE_PREVIEW_LENGTH:
+            text = text[:LAST_MESSAGE_PREVIEW_LENGTH - 1].rstrip() + "…"
+        return text
+    
+    def _preview_fields(self, message_doc: Optional[dict]) -> dict:
+        """Last-message preview stored on the chat document"""
+        if message_doc is None:
+            return {"lastMessage": None, "lastMessageSender": None, "lastMessageId": None}
+        return {
+            "lastMessage": self._preview_text(message_doc["message"]),
+            "lastMessageSender": message_doc["sender"],
+            "lastMessageId": str(message_doc["_id"])
+        }
+    
+    async def insert_messages(self, user_id: str, message_docs: list, session=None) -> list:
+        """Insert new messages without touching the chat document
+        
+        updatedAt is stamped here, just before the write is sent, so delta
+        sync (ordered by updatedAt) sees changes in about the order they land.
+        
+        Returns:
+            list: Inserted message ids, in the order of message_docs
+        """
+        # Ids are assigned here so the chat preview can reference the latest message
+        written_at = datetime.now(timezone.utc)
+        for message_doc in message_docs:
+            message_doc.setdefault("_id", ObjectId())
+            message_doc["updatedAt"] = written_at
+        
+        if session is None:
+            async with causal_session(user_id) as session:
+                result = await messages.insert_many(message_docs, ordered=False, session=session)
+        else:
+            result = await messages.insert_many(message_docs, ordered=False, session=session)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    
+    async def persist_messages(self, user_id: str, chat_object_id: ObjectId, message_docs: list, stored_docs: list = ()) -> list:
+        """Insert new messages, then update the chat's counters and preview
+        
+        stored_docs are messages already written with insert_messages whose
+        chat update was held back; they are counted in the same chat write.
+        
+        The chat is only updated once the insert succeeded, so a failed insert
+        never leaves the counters or preview pointing at messages that do not
+        exist. The preview only moves forward: a write that lands after a newer
+        message (e.g. a slow worker) keeps the newer preview.
+        
+        Returns:
+            list: Inserted message ids, in the order of message_docs
+        """
+        async with causal_session(user_id) as session:
+            inserted_ids = await self.insert_messages(user_id, message_docs, session=session) if message_docs else []
+            await chats.update_one(
+                {"_id": chat_object_id},
+                self._added_to_chat([*stored_docs, *message_docs], datetime.now(timezone.utc)),
+                session=session
+            )
+        return inserted_ids
+    
+    def _added_to_chat(self, message_docs: list, now: datetime) -> list:
+        """Chat update pipeline counting new messages and moving the preview to the latest one"""
+        latest = message_docs[-1]
+        is_latest = {"$gte": [latest["timestamp"], {"$ifNull": ["$lastMessageAt", latest["timestamp"]]}]}
+        return [{
+            "$set": {
+                "messageCount": {"$add": [{"$ifNull": ["$messageCount", 0]}, len(message_docs)]},
+                "lastMessageAt": {"$max": ["$lastMessageAt", latest["timestamp"]]},
+                "updatedAt": now,
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                **{
+                    field: {"$cond": [is_latest, {"$literal": value}, f"${field}"]}
+                    for field, value in self._preview_fields(latest).items()
+                }
+            }
+        }]
+    
+    async def _remove_from_chat(self, chat_id: str, removed_message_ids: list, now: datetime, session=None):
+        """Update a chat after some of its messages were deleted, in one write
+        
+        Decrements messageCount, and points the preview at the newest remaining
+        message if it showed one of the removed ones.
+        """
+        chat_object_id = ObjectId(chat_id)
+        chat_update = {
+            "messageCount": {"$max": [0, {"$subtract": [{"$ifNull": ["$messageCount", 0]}, len(removed_message_ids)]}]},
+            "updatedAt": now,
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        }
+        
+        chat = await chats.find_one({"_id": chat_object_id, "lastMessageId": {"$in": removed_message_ids}}, {"_id": 1}, session=session)
+        if chat:
+            latest = await messages.find_one(
+                {"chatId": chat_id, "isDeleted": False},
+                sort=[("timestamp", -1)],
+                session=session
+            )
+            # Conditional on the preview still showing a removed message, so a
+            # message written in the meantime is not overwritten
+            shows_removed = {"$in": [{"$ifNull": ["$lastMessageId", None]}, removed_message_ids]}
+            chat_update.update({
+                field: {"$cond": [shows_removed, {"$literal": value}, f"${field}"]}
+                for field, value in self._preview_fields(latest).items()
+            })
+        
+        await chats.update_one({"_id": chat_object_id}, [{"$set": chat_update}], session=session)
+    
+    async def _load_conversation_context(self, chat_id: str, until: Optional[datetime] = None, limit: int = 10) -> list:
+        """Load the last `limit` messages (up to `until`) as chronological OpenAI chat messages"""
+        query = {
+            "chatId": chat_id,
+            "isDeleted": False
+        }
+        if until is not None:
+            query["timestamp"] = {"$lte": until}
+        
+        recent_messages = await messages.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
+        
+        conversation_context = []
+        for msg in reversed(recent_messages):  # Reverse to get chronological order
+            role = "user" if msg["sender"] == "user" else "assistant"
+            conversation_context.append({
+                "role": role,
+                "content": msg["message"]
+            })
+        return conversation_context
+    
+    async def process_bot_job(self, job: dict) -> Optional[str]:
+        """Generate and store the bot reply for a queued job (run by the worker pool)
+        
+        Provider failures raise, so the queue retries the job with backoff
+        instead of storing the fallback text as a reply. The reply is keyed on
+        the job id: a retry after an expired lease or a crash returns the reply
+        already stored rather than adding a second one.
+        
+        Returns:
+            str: Id of the bot message
+        """
+        job_id = str(job["_id"])
+        existing = await messages.find_one({"jobId": job_id}, {"_id": 1})
+        if existing:
+            return str(existing["_id"])
+        
+        # The user message is already stored, so it is the last entry of the context
+        conversation_context = await self._load_conversation_context(job["chatId"], until=job["userMessageAt"])
+        
+        bot_message = await self.openai_service.generate_bot_response(
+            conversation_context, job.get("language", "english"), use_cache=job.get("useCache", True), fallback=False
+        )
+        
+        bot_message_doc = self._build_bot_message(job["chatId"], job["userId"], bot_message, job.get("language", "english"))
+        bot_message_doc.update({"_id": ObjectId(), "jobId": job_id, "updatedAt": datetime.now(timezone.utc)})
+        try:
+            async with causal_session(job["userId"]) as session:
+                result = await messages.update_one(
+                    {"jobId": job_id}, {"$setOnInsert": bot_message_doc}, upsert=True, session=session
+                )
+            inserted = result.upserted_id is not None
+        except DuplicateKeyError:
+            # Another worker holding an expired lease stored it concurrently
+            inserted = False
+        if not inserted:
+            existing = await messages.find_one({"jobId": job_id}, {"_id": 1})
+            return str(existing["_id"])
+        
+        async with causal_session(job["userId"]) as session:
+            await chats.update_one(
+                {"_id": ObjectId(job["chatId"])},
+                self._added_to_chat([bot_message_doc], datetime.now(timezone.utc)),
+                session=session
+            )
+        message_broker.publish_message(self.format_message(bot_message_doc))
+        
+        return str(bot_message_doc["_id"])
+    
+    async def get_bot_job(self, user_id: str, chat_id: str, job_id: str, wait: int = 0, user_language: str = "en"):
+        """Get the status of a queued bot reply, optionally long-polling up to `wait` seconds"""
+        try:
+            # Convert string chat_id to ObjectId
+            try:
+                ObjectId(chat_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_chat_id")
+                )
+            
+            # Convert string job_id to ObjectId
+            try:
+                job_object_id = ObjectId(job_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "message.job.not_found")
+                )
+            
+            # Jobs are scoped to the owning user and chat
+            if wait > 0:
+                job = await bot_job_queue.wait_for(job_object_id, str(user_id), chat_id, timeout=wait)
+            else:
+                job = await bot_job_queue.get(job_object_id, str(user_id), chat_id)
+            
+            if not job:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "message.job.not_found")
+                )
+            
+            bot_response = None
+            if job["status"] == JOB_DONE and job.get("botMessageId"):
+                bot_message = await messages.find_one({"_id": ObjectId(job["botMessageId"])})
+                if bot_message:
+                    bot_response = self.format_message(bot_message)
+            
+            return {
+                "success": True,
+                "message": get_message(user_language, "message.job.success"),
+                "data": {
+                    "jobId": job_id,
                     "chatId": chat_id,
-                    "userId": user_id,
-                    "sender": "bot",
-                    "message": bot_message,
-                    "pictures": [],
-                    "voices": [],
-                    "timestamp": now,
-                    "isDeleted": False,
-                    "updatedAt": now
+                    "status": job["status"],
+                    "attempts": job.get("attempts", 0),
+                    "bot_response": bot_response
                 }
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error getting bot job")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+    
+    async def wait_for_messages(self, user_id: str, chat_id: str, since: Optional[datetime] = None, timeout: int = 25, user_language: str = "en"):
+        """Long-poll for messages newer than `since`
+        
+        Returns immediately if newer messages are already stored; otherwise waits up
+        to `timeout` seconds for the message broker to announce new ones, so an idle
+        chat costs one query per timeout instead of one per client poll.
+        """
+        try:
+            # Convert string user_id to ObjectId
+            try:
+                user_object_id = ObjectId(user_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_user_id")
+                )
+            
+            # Convert string chat_id to ObjectId
+            try:
+                chat_object_id = ObjectId(chat_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_chat_id")
+                )
+            
+            # Verify chat exists and belongs to user
+            chat = await chats.find_one({
+                "_id": chat_object_id,
+                "userId": str(user_object_id),
+                "isDeleted": False
+            })
+            if not chat:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "chat.not_found")
+                )
+            
+            if since is None:
+                since = datetime.now(timezone.utc)
+            
+            # Subscribe before querying so a message inserted in between is not missed
+            queue = message_broker.subscribe(str(chat_object_id))
+            try:
+                result = await self._get_messages_since(str(user_object_id), chat_object_id, since, 100, user_language)
+                if result["data"]["messages"] or timeout == 0:
+                    return result
                 
-                # Insert bot message
-                bot_msg_result = await messages.insert_one(bot_message_doc)
+                try:
+                    events = [await asyncio.wait_for(queue.get(), timeout=timeout)]
+                except asyncio.TimeoutError:
+                    return result
+                
+                # Collect everything published meanwhile, without another query
+                while not queue.empty():
+                    events.append(queue.get_nowait())
+                new_messages = [event["data"] for event in events if event["type"] == "message"]
                 
                 return {
-                    "messageId": str(bot_msg_result.inserted_id),
-                    "chatId": chat_id,
-                    "sender": "bot",
-                    "message": bot_message,
-                    "pictures": [],
-                    "voices": [],
-                    "timestamp": now
+                    "success": True,
+                    "message": get_message(user_language, "message.conversation.success"),
+                    "data": {
+                        "messages": new_messages,
+                        "pagination": {
+                            "since": since,
+                            "next_since": new_messages[-1]["timestamp"] if new_messages else since,
+                            "has_next": False
+                        }
+                    }
                 }
+            finally:
+                message_broker.unsubscribe(str(chat_object_id), queue)
             
-            return None
-            
+        except HTTPException:
+            raise
         except Exception as error:
-            print(f"ERROR generating bot response: {error}")
-            return None
+            logger.exception("error waiting for messages")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
     
-    async def update_message(self, user_id: str, message_id: str, request: UpdateMessageRequest, user_language: str = "en"):
-        """Update a specific message"""
+    async def stream_chat_messages(self, websocket: WebSocket, user: Optional[dict], chat_id: str, subprotocol: Optional[str] = None):
+        """Push new messages of a chat to a WebSocket client as they are inserted
+        
+        `subprotocol` is echoed back on accept (browsers drop the connection
+        unless the server selects one of the subprotocols they offered).
+        """
+        # Policy violation close code for unauthenticated or foreign chats
+        if not user or user.get("isDeleted", False):
+            await websocket.close(code=1008)
+            return
+        
         try:
+            chat_object_id = ObjectId(chat_id)
+        except Exception:
+            await websocket.close(code=1008)
+            return
+        
+        chat = await chats.find_one({
+            "_id": chat_object_id,
+            "userId": str(user["_id"]),
+            "isDeleted": False
+        })
+        if not chat:
+            await websocket.close(code=1008)
+            return
+        
+        await websocket.accept(subprotocol=subprotocol)
+        queue = message_broker.subscribe(chat_id)
+        # Reading from the socket is how a client disconnect is detected
+        receiver = asyncio.create_task(self._receive_until_disconnect(websocket))
+        try:
+            while True:
+                getter = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, receiver},
+                    timeout=WEBSOCKET_PING_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter not in done:
+                    getter.cancel()
+                if receiver in done:
+                    break
+                if getter in done:
+                    await websocket.send_json(jsonable_encoder(getter.result()))
+                else:
+                    await websocket.send_json({"type": "ping"})
+        except WebSocketDisconnect:
+            pass
+        except Exception as error:
+            logger.exception("error streaming chat messages")
+        finally:
+            message_broker.unsubscribe(chat_id, queue)
+            receiver.cancel()
+    
+    async def _receive_until_disconnect(self, websocket: WebSocket):
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+    
+    async def update_message(self, user_id: str, message_id: str, request: UpdateMessageRequest, user_language: str = "en", if_match: Optional[str] = None):
+        """Update a specific message
+        
+        With If-Match, the update only applies if the message is still at that
+        version; otherwise 412 is returned and nothing is written.
+        """
+        try:
+            expected_version = if_match_version(if_match, user_language)
+            
             # Convert string user_id to ObjectId
             try:
                 user_object_id = ObjectId(user_id)
@@ -328,22 +786,38 @@ class MessageController:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=get_message(user_language, "message.not_found")
                 )
+            ensure_version(message, expected_version, user_language)
             
-            # Update message
+            # Update message; the version filter closes the race with a concurrent edit
             now = datetime.now(timezone.utc)
-            result = await messages.update_one(
-                {"_id": message_object_id},
-                {
-                    "$set": {
-                        "message": request.message.strip(),
-                        "pictures": request.pictures,
-                        "voices": request.voices,
-                        "updatedAt": now
-                    }
-                }
-            )
+            async with causal_session(str(user_object_id)) as session:
+                updated = await messages.find_one_and_update(
+                    {"_id": message_object_id, **version_filter(expected_version)},
+                    {
+                        "$set": {
+                            "message": request.message.strip(),
+                            "pictures": request.pictures,
+                            "voices": request.voices,
+                            "updatedAt": now
+                        },
+                        "$inc": {"version": 1}
+                    },
+                    projection={"version": 1},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                
+                # Refresh the chat preview if this is the chat's latest message
+                if updated is not None:
+                    await chats.update_one(
+                        {"_id": ObjectId(message["chatId"]), "lastMessageId": message_id},
+                        {"$set": {"lastMessage": self._preview_text(request.message.strip()), "updatedAt": now}, "$inc": {"version": 1}},
+                        session=session
+                    )
             
-            if result.modified_count == 0:
+            if updated is None:
+                if expected_version is not None:
+                    raise precondition_failed(user_language)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(user_language, "general.internal_error")
@@ -357,22 +831,25 @@ class MessageController:
                     "updated_message": request.message.strip(),
                     "pictures": request.pictures,
                     "voices": request.voices,
-                    "updated_at": now
+                    "updated_at": now,
+                    "version": updated["version"]
                 }
             }
             
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR updating message: {error}")
+            logger.exception("error updating message")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
     
-    async def delete_message(self, user_id: str, message_id: str, user_language: str = "en"):
-        """Delete a specific message (soft delete)"""
+    async def delete_message(self, user_id: str, message_id: str, user_language: str = "en", if_match: Optional[str] = None):
+        """Delete a specific message (soft delete), only at the If-Match version when given"""
         try:
+            expected_version = if_match_version(if_match, user_language)
+            
             # Convert string user_id to ObjectId
             try:
                 user_object_id = ObjectId(user_id)
@@ -411,20 +888,31 @@ class MessageController:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=get_message(user_language, "message.not_found")
                 )
+            ensure_version(message, expected_version, user_language)
             
             # Soft delete the message
             now = datetime.now(timezone.utc)
-            result = await messages.update_one(
-                {"_id": message_object_id},
-                {
-                    "$set": {
-                        "isDeleted": True,
-                        "updatedAt": now
-                    }
-                }
-            )
+            async with causal_session(str(user_object_id)) as session:
+                deleted = await messages.find_one_and_update(
+                    {"_id": message_object_id, **version_filter(expected_version)},
+                    {
+                        "$set": {
+                            "isDeleted": True,
+                            "updatedAt": now
+                        },
+                        "$inc": {"version": 1}
+                    },
+                    projection={"version": 1},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                
+                if deleted is not None:
+                    await self._remove_from_chat(message["chatId"], [message_id], now, session)
             
-            if result.modified_count == 0:
+            if deleted is None:
+                if expected_version is not None:
+                    raise precondition_failed(user_language)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(user_language, "general.internal_error")
@@ -434,15 +922,226 @@ class MessageController:
                 "success": True,
                 "message": get_message(user_language, "message.delete.success"),
                 "data": {
-                    "deleted_message_id": message_id
+                    "deleted_message_id": message_id,
+                    "version": deleted["version"]
+                }
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error deleting message")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+    
+    async def batch_delete_messages(self, user_id: str, request: BatchDeleteMessagesRequest, user_language: str = "en"):
+        """Soft delete several of the user's messages with one update_many
+        
+        Returns a result per id: deleted, not_found (missing, already deleted or
+        not the user's) or invalid_id. Each affected chat's messageCount and
+        preview are updated once.
+        """
+        try:
+            # Convert string user_id to ObjectId
+            try:
+                user_object_id = ObjectId(user_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_user_id")
+                )
+            
+            # Verify user exists
+            user = await users.find_one({"_id": user_object_id, "isDeleted": False})
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "auth.login.user_not_found")
+                )
+            
+            message_ids = list(dict.fromkeys(request.message_ids))
+            object_ids = [ObjectId(message_id) for message_id in message_ids if ObjectId.is_valid(message_id)]
+            owner_filter = {"userId": str(user_object_id), "isDeleted": False}
+            now = datetime.now(timezone.utc)
+            # Tags this request's writes, so they can be told apart from concurrent ones
+            batch_id = ObjectId()
+            removed = {}
+            
+            async with causal_session(str(user_object_id)) as session:
+                # The chat of each message, for the per-chat counters
+                owned = await messages.find(
+                    {"_id": {"$in": object_ids}, **owner_filter}, {"chatId": 1}, session=session
+                ).to_list(length=len(object_ids))
+                
+                if owned:
+                    owned_ids = [message["_id"] for message in owned]
+                    result = await messages.update_many(
+                        {"_id": {"$in": owned_ids}, **owner_filter},
+                        {"$set": {"isDeleted": True, "updatedAt": now, "batchId": batch_id}, "$inc": {"version": 1}},
+                        session=session
+                    )
+                    if result.modified_count != len(owned_ids):
+                        # A concurrent request deleted some of them first
+                        owned = await self._written_by(owned_ids, batch_id, {"chatId": 1}, session)
+                    
+                    for message in owned:
+                        removed.setdefault(message["chatId"], []).append(str(message["_id"]))
+                    for chat_id, chat_message_ids in removed.items():
+                        await self._remove_from_chat(chat_id, chat_message_ids, now, session)
+            
+            deleted_ids = {message_id for chat_message_ids in removed.values() for message_id in chat_message_ids}
+            results = [
+                {
+                    "message_id": message_id,
+                    "status": "deleted" if message_id in deleted_ids
+                    else "not_found" if ObjectId.is_valid(message_id)
+                    else "invalid_id"
+                }
+                for message_id in message_ids
+            ]
+            
+            return {
+                "success": True,
+                "message": get_message(user_language, "message.batch_delete.success"),
+                "data": {
+                    "results": results,
+                    "deleted_count": len(deleted_ids)
+                }
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error batch deleting messages")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+    
+    async def batch_update_messages(self, user_id: str, request: BatchUpdateMessagesRequest, user_language: str = "en"):
+        """Apply several message edits with one bulk_write
+        
+        Every write is filtered by userId and by the version read just before,
+        so a message changed by another request in between is not overwritten.
+        Returns a result per id: updated (with the new version), not_found,
+        version_conflict (the version given, or read, is stale) or invalid_id.
+        """
+        try:
+            # Convert string user_id to ObjectId
+            try:
+                user_object_id = ObjectId(user_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_user_id")
+                )
+            
+            # Verify user exists
+            user = await users.find_one({"_id": user_object_id, "isDeleted": False})
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "auth.login.user_not_found")
+                )
+            
+            patches = {patch.message_id: patch for patch in request.updates}
+            object_ids = {message_id: ObjectId(message_id) for message_id in patches if ObjectId.is_valid(message_id)}
+            owner_filter = {"userId": str(user_object_id), "isDeleted": False}
+            statuses = {message_id: "invalid_id" for message_id in patches if message_id not in object_ids}
+            versions = {}
+            now = datetime.now(timezone.utc)
+            # Tags this request's writes, so they can be told apart from concurrent ones
+            batch_id = ObjectId()
+            
+            async with causal_session(str(user_object_id)) as session:
+                owned = {
+                    str(message["_id"]): message
+                    for message in await messages.find(
+                        {"_id": {"$in": list(object_ids.values())}, **owner_filter},
+                        {"chatId": 1, "version": 1},
+                        session=session
+                    ).to_list(length=len(object_ids))
+                }
+                
+                operations = []
+                for message_id, object_id in object_ids.items():
+                    message = owned.get(message_id)
+                    patch = patches[message_id]
+                    if message is None:
+                        statuses[message_id] = "not_found"
+                        continue
+                    current_version = message.get("version", 0)
+                    if patch.version is not None and patch.version != current_version:
+                        statuses[message_id] = "version_conflict"
+                        continue
+                    
+                    changes = {"updatedAt": now, "batchId": batch_id}
+                    if patch.message is not None:
+                        changes["message"] = patch.message.strip()
+                    if patch.pictures is not None:
+                        changes["pictures"] = patch.pictures
+                    if patch.voices is not None:
+                        changes["voices"] = patch.voices
+                    operations.append(UpdateOne(
+                        {"_id": object_id, **owner_filter, **version_filter(current_version)},
+                        {"$set": changes, "$inc": {"version": 1}}
+                    ))
+                    statuses[message_id] = "updated"
+                    versions[message_id] = current_version + 1
+                
+                if operations:
+                    result = await messages.bulk_write(operations, ordered=False, session=session)
+                    if result.modified_count != len(operations):
+                        # Some messages were changed by a concurrent request after they were read
+                        attempted = [object_ids[message_id] for message_id in versions]
+                        applied = {str(message["_id"]) for message in await self._written_by(attempted, batch_id, {"_id": 1}, session)}
+                        for message_id in list(versions):
+                            if message_id not in applied:
+                                statuses[message_id] = "version_conflict"
+                                del versions[message_id]
+                    
+                    # Refresh the preview of chats whose latest message was edited
+                    preview_updates = [
+                        UpdateOne(
+                            {"_id": ObjectId(owned[message_id]["chatId"]), "lastMessageId": message_id},
+                            {"$set": {"lastMessage": self._preview_text(patches[message_id].message.strip()), "updatedAt": now}, "$inc": {"version": 1}}
+                        )
+                        for message_id in versions
+                        if patches[message_id].message is not None
+                    ]
+                    if preview_updates:
+                        await chats.bulk_write(preview_updates, ordered=False, session=session)
+            
+            results = []
+            for patch in request.updates:
+                entry = {"message_id": patch.message_id, "status": statuses[patch.message_id]}
+                if patch.message_id in versions:
+                    entry["version"] = versions[patch.message_id]
+                results.append(entry)
+            
+            return {
+                "success": True,
+                "message": get_message(user_language, "message.batch_update.success"),
+                "data": {
+                    "results": results,
+                    "updated_count": len(versions),
+                    "updated_at": now
                 }
             }
             
         except HTTPException:
             raise
         except Exception as error:
-            print(f"ERROR deleting message: {error}")
+            logger.exception("error batch updating messages")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=get_message(user_language, "general.internal_error")
             )
+    
+    async def _written_by(self, object_ids: list, batch_id: ObjectId, projection: dict, session=None) -> list:
+        """The messages among object_ids that the batch write tagged `batch_id` changed"""
+        return await messages.find(
+            {"_id": {"$in": object_ids}, "batchId": batch_id}, projection, session=session
+        ).to_list(length=len(object_ids))
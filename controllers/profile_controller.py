@@ -1,17 +1,48 @@
+import logging
+from typing import Optional
 from fastapi import HTTPException, status
 from database import users
-from services.firebase import initialize_admin
+from services.firebase import FirebaseAuth, get_firebase_auth
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
 import uuid
 from locales import get_message
+from services.etag import ensure_version, if_match_version, precondition_failed, version_filter
+from services.metrics import firebase_request_duration, track
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 class ProfileController:
-    def __init__(self):
-        self.admin = initialize_admin()
+    def __init__(self, firebase: FirebaseAuth = None):
+        self.firebase = firebase or get_firebase_auth()
     
-    async def change_name(self, user_id: str, new_name: str, language: str = "en"):
+    async def _update_user(self, object_id: ObjectId, fields: dict, expected_version: Optional[int], language: str):
+        """Set fields and bump the version in one write; returns the updated user
+        
+        With an expected version (If-Match) the write only applies at that
+        version: 412 if the user changed in the meantime, 404 if it does not exist.
+        """
+        updated_user = await users.find_one_and_update(
+            {"_id": object_id, **version_filter(expected_version)},
+            {"$set": {**fields, "updatedAt": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_user is None:
+            if expected_version is not None and await users.find_one({"_id": object_id}, {"_id": 1}):
+                raise precondition_failed(language)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=get_message(language, "general.user_not_found")
+            )
+        updated_user["_id"] = str(updated_user["_id"])
+        return updated_user
+    
+    async def change_name(self, user_id: str, new_name: str, language: str = "en", if_match: Optional[str] = None):
         """Change user's display name in both MongoDB and Firebase"""
+        expected_version = if_match_version(if_match, language)
+        
         if not new_name or new_name.strip() == "":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -42,38 +73,34 @@ class ProfileController:
                 detail=get_message(language, "profile.change_name.same_name")
             )
         
-        # Update name in Firebase first
+        ensure_version(current_user, expected_version, language)
+        
+        # Update name in MongoDB first: the conditional write is what enforces If-Match,
+        # so Firebase is never changed by a request that loses the version check
+        updated_user = await self._update_user(object_id, {"name": new_name}, expected_version, language)
+        
         firebase_uid = current_user.get("uid")
         if firebase_uid:
             try:
-                self.admin.auth.update_user(
-                    firebase_uid,
-                    display_name=new_name
-                )
-                print(f"✅ Firebase display name updated for user {firebase_uid}")
+                with track(firebase_request_duration, "update_user"), span("firebase.update_user"):
+                    await self.firebase.call(
+                        "update_user",
+                        firebase_uid,
+                        display_name=new_name
+                    )
+                logger.info("Firebase display name updated", extra={"uid": firebase_uid})
             except Exception as e:
-                print(f"❌ Firebase update error: {e}")
+                logger.warning("Firebase display name update failed: %s", e)
+                # Put the old name back, unless the user was changed again in the meantime
+                await users.update_one(
+                    {"_id": object_id, "version": updated_user["version"]},
+                    {"$set": {"name": current_user.get("name"), "updatedAt": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+                )
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail=get_message(language, "profile.change_name.firebase_update_failed")
                 )
         
-        # Update name in MongoDB
-        result = await users.update_one(
-            {"_id": object_id},
-            {"$set": {"name": new_name, "updatedAt": datetime.now(timezone.utc)}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=get_message(language, "general.user_not_found")
-            )
-        
-        # Get updated user
-        updated_user = await users.find_one({"_id": object_id})
-        updated_user["_id"] = str(updated_user["_id"])
-        
         return {
             "success": True,
             "message": get_message(language, "profile.change_name.success"),
@@ -81,12 +108,15 @@ class ProfileController:
                 "user_id": updated_user["_id"],
                 "name": updated_user["name"],
                 "email": updated_user["email"],
-                "updatedAt": updated_user["updatedAt"]
+                "updatedAt": updated_user["updatedAt"],
+                "version": updated_user["version"]
             }
         }
     
-    async def change_image(self, user_id: str, image_url: str, language: str = "en"):
+    async def change_image(self, user_id: str, image_url: str, language: str = "en", if_match: Optional[str] = None):
         """Change user's profile image"""
+        expected_version = if_match_version(if_match, language)
+        
         if not image_url or image_url.strip() == "":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -103,20 +133,7 @@ class ProfileController:
             )
         
         # Update image in database
-        result = await users.update_one(
-            {"_id": object_id},
-            {"$set": {"image": image_url, "updatedAt": datetime.now(timezone.utc)}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=get_message(language, "general.user_not_found")
-            )
-        
-        # Get updated user
-        updated_user = await users.find_one({"_id": object_id})
-        updated_user["_id"] = str(updated_user["_id"])
+        updated_user = await self._update_user(object_id, {"image": image_url}, expected_version, language)
         
         return {
             "success": True,
@@ -126,13 +143,16 @@ class ProfileController:
                 "name": updated_user["name"],
                 "email": updated_user["email"],
                 "image": updated_user["image"],
-                "updatedAt": updated_user["updatedAt"]
+                "updatedAt": updated_user["updatedAt"],
+                "version": updated_user["version"]
             }
         }
     
-    async def delete_user(self, user_id: str, language: str = "en"):
+    async def delete_user(self, user_id: str, language: str = "en", if_match: Optional[str] = None):
         """Soft delete user account (Reddit-style deletion)"""
         try:
+            expected_version = if_match_version(if_match, language)
+            
             try:
                 # Convert string user_id to ObjectId
                 object_id = ObjectId(user_id)
@@ -156,6 +176,7 @@ class ProfileController:
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=get_message(language, "profile.delete.already_deleted")
                 )
+            ensure_version(user, expected_version, language)
             
             # Generate a unique deleted username to avoid conflicts
             deleted_username = f"deleted_user_{uuid.uuid4().hex[:8]}"
@@ -175,11 +196,13 @@ class ProfileController:
             
             # Update user in database (soft delete)
             result = await users.update_one(
-                {"_id": object_id},
-                {"$set": update_data}
+                {"_id": object_id, **version_filter(expected_version)},
+                {"$set": update_data, "$inc": {"version": 1}}
             )
             
             if result.modified_count == 0:
+                if expected_version is not None:
+                    raise precondition_failed(language)
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=get_message(language, "general.user_not_found")
@@ -188,10 +211,11 @@ class ProfileController:
             # Delete user from Firebase (hard delete from Firebase)
             if user.get("uid"):
                 try:
-                    self.admin.auth.delete_user(user["uid"])
-                    print(f"✅ Firebase user {user['uid']} deleted successfully")
+                    with track(firebase_request_duration, "delete_user"), span("firebase.delete_user"):
+                        await self.firebase.call("delete_user", user["uid"])
+                    logger.info("Firebase user deleted", extra={"uid": user["uid"]})
                 except Exception as e:
-                    print(f"❌ Firebase deletion error: {e}")
+                    logger.warning("Firebase user deletion failed: %s", e)
                     # Continue even if Firebase deletion fails
                     # The user is already soft-deleted in our database
             
@@ -204,7 +228,7 @@ class ProfileController:
             }
             
         except Exception as e:
-            print(f"ERROR = {e}")
+            logger.exception("error deleting user")
             if isinstance(e, HTTPException):
                 raise e
             raise HTTPException(
@@ -273,7 +297,8 @@ class ProfileController:
                 "language": user.get("language"),
                 "purpose": user.get("purpose"),
                 "createdAt": user["createdAt"],
-                "updatedAt": user["updatedAt"]
+                "updatedAt": user["updatedAt"],
+                "version": user.get("version", 0)
             }
         }
     
@@ -285,8 +310,10 @@ class ProfileController:
             "data": None
         }
     
-    async def welcome2(self, user_id: str, language: str = "en"):
+    async def welcome2(self, user_id: str, language: str = "en", if_match: Optional[str] = None):
         """Update user's welcome status"""
+        expected_version = if_match_version(if_match, language)
+        
         try:
             # Convert string user_id to ObjectId
             object_id = ObjectId(user_id)
@@ -296,20 +323,7 @@ class ProfileController:
                 detail=get_message(language, "general.invalid_user_id")
             )
         
-        result = await users.update_one(
-            {"_id": object_id},
-            {"$set": {"welcome": False, "updatedAt": datetime.now(timezone.utc)}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=get_message(language, "general.user_not_found")
-            )
-        
-        # Get updated user
-        updated_user = await users.find_one({"_id": object_id})
-        updated_user["_id"] = str(updated_user["_id"])
+        updated_user = await self._update_user(object_id, {"welcome": False}, expected_version, language)
         
         return {
             "success": True,
@@ -319,12 +333,15 @@ class ProfileController:
                 "name": updated_user["name"],
                 "email": updated_user["email"],
                 "welcome": updated_user["welcome"],
-                "updatedAt": updated_user["updatedAt"]
+                "updatedAt": updated_user["updatedAt"],
+                "version": updated_user["version"]
             }
         }
     
-    async def update_token(self, user_id: str, notification_token: str, language: str = "en"):
+    async def update_token(self, user_id: str, notification_token: str, language: str = "en", if_match: Optional[str] = None):
         """Update user's notification token"""
+        expected_version = if_match_version(if_match, language)
+        
         try:
             # Convert string user_id to ObjectId
             object_id = ObjectId(user_id)
@@ -334,20 +351,7 @@ class ProfileController:
                 detail=get_message(language, "general.invalid_user_id")
             )
         
-        result = await users.update_one(
-            {"_id": object_id},
-            {"$set": {"notificationToken": notification_token, "updatedAt": datetime.now(timezone.utc)}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=get_message(language, "general.user_not_found")
-            )
-        
-        # Get updated user
-        updated_user = await users.find_one({"_id": object_id})
-        updated_user["_id"] = str(updated_user["_id"])
+        updated_user = await self._update_user(object_id, {"notificationToken": notification_token}, expected_version, language)
         
         return {
             "success": True,
@@ -357,7 +361,8 @@ class ProfileController:
                 "name": updated_user["name"],
                 "email": updated_user["email"],
                 "notificationToken": updated_user["notificationToken"],
-                "updatedAt": updated_user["updatedAt"]
+                "updatedAt": updated_user["updatedAt"],
+                "version": updated_user["version"]
             }
         }
 
@@ -386,7 +391,8 @@ class ProfileController:
         # Fetch displayName from Firebase
         if firebase_uid:
             try:
-                firebase_user = self.admin.auth.get_user(firebase_uid)
+                with track(firebase_request_duration, "get_user"), span("firebase.get_user"):
+                    firebase_user = await self.firebase.call("get_user", firebase_uid)
                 firebase_name = firebase_user.display_name
             except Exception as e:
                 firebase_name = f"❌ Failed to fetch from Firebase: {e}"
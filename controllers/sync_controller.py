@@ -0,0 +1,219 @@
+import logging
+import base64
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException, status
+from bson import ObjectId
+from config import load_env
+from database import chats, messages, users, causal_session, MONGO_SOCKET_TIMEOUT_MS
+from controllers.message_controller import MessageController
+from locales import get_message
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# updatedAt is stamped just before a write is sent, so a change can become visible
+# with a timestamp older than one already synced, by as long as the write is in
+# flight. The final token never moves closer to "now" than this window and the
+# changes inside it are sent again. The default covers a write up to the MongoDB
+# socket timeout, after which the app has given up on it.
+SYNC_SAFETY_WINDOW_SECONDS = float(os.getenv("SYNC_SAFETY_WINDOW_SECONDS", str(MONGO_SOCKET_TIMEOUT_MS / 1000)))
+
+SYNC_CHAT_PROJECTION = {
+    "title": 1,
+    "short_description": 1,
+    "is_temporary": 1,
+    "status": 1,
+    "lastMessage": 1,
+    "lastMessageSender": 1,
+    "lastMessageAt": 1,
+    "messageCount": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "isDeleted": 1,
+    "version": 1
+}
+SYNC_MESSAGE_PROJECTION = {
+    "chatId": 1,
+    "userId": 1,
+    "sender": 1,
+    "message": 1,
+    "pictures": 1,
+    "voices": 1,
+    "timestamp": 1,
+    "updatedAt": 1,
+    "isDeleted": 1,
+    "version": 1
+}
+SYNC_COLLECTIONS = ("chats", "messages")
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """MongoDB returns naive UTC datetimes; positions are compared in that form"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_sync_token(positions: dict) -> str:
+    """Opaque token holding the (updatedAt, _id) position reached in each collection"""
+    data = {
+        name: {"t": position[0].isoformat(), "id": str(position[1])} if position else None
+        for name, position in positions.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+
+
+def decode_sync_token(token: str) -> dict:
+    """Return {collection: (updatedAt, _id) or None}; raises ValueError if the token is malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return {
+            name: (_utc_naive(datetime.fromisoformat(data[name]["t"])), ObjectId(data[name]["id"])) if data[name] else None
+            for name in SYNC_COLLECTIONS
+        }
+    except Exception as error:
+        raise ValueError(f"Invalid sync token: {token}") from error
+
+
+class SyncController:
+    """
+    Delta sync for offline-first clients.
+
+    Chats and messages are both read in (updatedAt, _id) order from the
+    position stored in the token, so creates, edits and soft deletes all show
+    up, and each page is a range scan on the (userId, updatedAt, _id) indexes
+    however much history the user has. Reads go to the primary: a lagging
+    secondary could hide a write older than the position the client moves to.
+    """
+
+    def __init__(self, message_controller: MessageController = None):
+        self.message_controller = message_controller or MessageController()
+
+    async def sync(self, user_id: str, since: Optional[str] = None, limit: int = 100, user_language: str = "en"):
+        """Return chats and messages changed after the `since` token, plus the token to send next time
+
+        Without a token the whole history is returned (deleted items excluded).
+        While has_more is true, call again at once with next_token.
+        """
+        try:
+            # Convert string user_id to ObjectId
+            try:
+                object_id = ObjectId(user_id)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=get_message(user_language, "general.invalid_user_id")
+                )
+
+            positions = dict.fromkeys(SYNC_COLLECTIONS)
+            if since:
+                try:
+                    positions = decode_sync_token(since)
+                except ValueError:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=get_message(user_language, "sync.invalid_token")
+                    )
+
+            # Verify user exists
+            user = await users.find_one({"_id": object_id, "isDeleted": False}, {"_id": 1})
+            if not user:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=get_message(user_language, "auth.login.user_not_found")
+                )
+
+            # One extra document per collection tells whether another page exists
+            async with causal_session(str(object_id)) as session:
+                chat_docs = await self._changes(chats, str(object_id), positions["chats"], SYNC_CHAT_PROJECTION, limit, session)
+                message_docs = await self._changes(messages, str(object_id), positions["messages"], SYNC_MESSAGE_PROJECTION, limit, session)
+
+            server_time = datetime.now(timezone.utc)
+            horizon = _utc_naive(server_time) - timedelta(seconds=SYNC_SAFETY_WINDOW_SECONDS)
+            has_more = False
+            for name, docs in (("chats", chat_docs), ("messages", message_docs)):
+                more = len(docs) > limit
+                del docs[limit:]
+                has_more = has_more or more
+                if docs:
+                    positions[name] = (_utc_naive(docs[-1]["updatedAt"]), docs[-1]["_id"])
+                # Once a collection is caught up, step back to the safety window
+                if not more and positions[name] is not None and positions[name][0] > horizon:
+                    positions[name] = (horizon, ObjectId("0" * 24))
+
+            return {
+                "success": True,
+                "message": get_message(user_language, "sync.success"),
+                "data": {
+                    "chats": [self._format_chat(chat) for chat in chat_docs],
+                    "messages": [self._format_message(message) for message in message_docs],
+                    "next_token": encode_sync_token(positions),
+                    "has_more": has_more,
+                    "server_time": server_time
+                }
+            }
+
+        except HTTPException:
+            raise
+        except Exception as error:
+            logger.exception("error syncing changes")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=get_message(user_language, "general.internal_error")
+            )
+
+    async def _changes(self, collection, user_id: str, position, projection: dict, limit: int, session) -> list:
+        """Documents of the user after `position` in (updatedAt, _id) order"""
+        query = {"userId": user_id}
+        if position is None:
+            # First sync: the client holds nothing that could need deleting
+            query["isDeleted"] = False
+        else:
+            updated_at, last_id = position
+            query["$or"] = [
+                {"updatedAt": {"$gt": updated_at}},
+                {"updatedAt": updated_at, "_id": {"$gt": last_id}}
+            ]
+        return await collection.find(query, projection, session=session).sort(
+            [("updatedAt", 1), ("_id", 1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+
+    def _format_chat(self, chat: dict) -> dict:
+        if chat.get("isDeleted"):
+            # Tombstone: enough for the client to drop the chat and its messages
+            return {
+                "chat_id": str(chat["_id"]),
+                "isDeleted": True,
+                "updatedAt": chat["updatedAt"],
+                "version": chat.get("version", 0)
+            }
+        return {
+            "chat_id": str(chat["_id"]),
+            "title": chat["title"],
+            "short_description": chat["short_description"],
+            "is_temporary": chat.get("is_temporary", False),
+            "status": chat.get("status", "active"),
+            "last_message": chat.get("lastMessage"),
+            "last_message_sender": chat.get("lastMessageSender"),
+            "last_message_at": chat.get("lastMessageAt"),
+            "messageCount": chat.get("messageCount", 0),
+            "createdAt": chat.get("createdAt"),
+            "updatedAt": chat["updatedAt"],
+            "isDeleted": False,
+            "version": chat.get("version", 0)
+        }
+
+    def _format_message(self, message: dict) -> dict:
+        if message.get("isDeleted"):
+            return {
+                "messageId": str(message["_id"]),
+                "chatId": message["chatId"],
+                "isDeleted": True,
+                "updatedAt": message.get("updatedAt", message["timestamp"]),
+                "version": message.get("version", 0)
+            }
+        return self.message_controller.format_message(message)
@@ -1,21 +1,243 @@
+import logging
 import motor.motor_asyncio
 from models.user import UserModel
 import os
-from dotenv import load_dotenv
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from config import load_env
+from pymongo import WriteConcern
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from services.db_monitoring import pool_monitor, command_monitor
+from services.tracing import TRACING_ENABLED, tracing_command_listener
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "eko_backend"  # You can change this to your preferred database name
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
-database = client[DB_NAME]
+# Client settings (see https://www.mongodb.com/docs/manual/reference/connection-string-options/)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "2"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+MONGO_ZLIB_COMPRESSION_LEVEL = int(os.getenv("MONGO_ZLIB_COMPRESSION_LEVEL", "6"))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_RETRY_READS = os.getenv("MONGO_RETRY_READS", "true").lower() == "true"
+MONGO_RETRY_WRITES = os.getenv("MONGO_RETRY_WRITES", "true").lower() == "true"
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "eko_backend")
+
+# Listing/history reads tolerate slight staleness and may go to secondaries;
+# ownership checks and reads that follow a write stay on the primary
+MONGO_LISTING_READ_PREFERENCE = os.getenv("MONGO_LISTING_READ_PREFERENCE", "secondaryPreferred")
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "90"))  # server minimum is 90
+# Causally consistent sessions give read-your-writes on secondaries (needs a replica set or sharded cluster)
+MONGO_CAUSAL_CONSISTENCY = os.getenv("MONGO_CAUSAL_CONSISTENCY", "true").lower() == "true"
+CAUSAL_TOKEN_CACHE_SIZE = int(os.getenv("CAUSAL_TOKEN_CACHE_SIZE", "10000"))
+
+# Write concern tiers: chat/message traffic favours latency, account data favours durability.
+# "w" is a node count or "majority"; with w=1 an acknowledged message can be lost on failover.
+MONGO_MESSAGE_WRITE_CONCERN = os.getenv("MONGO_MESSAGE_WRITE_CONCERN", "1")
+MONGO_MESSAGE_WRITE_JOURNAL = os.getenv("MONGO_MESSAGE_WRITE_JOURNAL", "false").lower() == "true"
+MONGO_ACCOUNT_WRITE_CONCERN = os.getenv("MONGO_ACCOUNT_WRITE_CONCERN", "majority")
+MONGO_ACCOUNT_WRITE_JOURNAL = os.getenv("MONGO_ACCOUNT_WRITE_JOURNAL", "true").lower() == "true"
+MONGO_WRITE_TIMEOUT_MS = int(os.getenv("MONGO_WRITE_TIMEOUT_MS", "5000"))
+
+# Collection -> write concern tier
+COLLECTION_WRITE_TIERS = {
+    "users": "account",
+    "chats": "message",
+    "messages": "message",
+    "bot_jobs": "message"
+}
+
+
+def _available_compressors(requested: str) -> list:
+    """Keep only wire compressors whose Python packages are installed"""
+    modules = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+    available = []
+    for name in [value.strip() for value in requested.split(",") if value.strip()]:
+        try:
+            __import__(modules.get(name, name))
+            available.append(name)
+        except ImportError:
+            pass
+    return available
+
+
+def create_client(uri: str = MONGO_URI) -> motor.motor_asyncio.AsyncIOMotorClient:
+    """Build a Motor client from the MONGO_* settings with pool/command monitoring"""
+    return motor.motor_asyncio.AsyncIOMotorClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        maxConnecting=MONGO_MAX_CONNECTING,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        compressors=_available_compressors(MONGO_COMPRESSORS),
+        zlibCompressionLevel=MONGO_ZLIB_COMPRESSION_LEVEL,
+        readPreference=MONGO_READ_PREFERENCE,
+        retryReads=MONGO_RETRY_READS,
+        retryWrites=MONGO_RETRY_WRITES,
+        appname=MONGO_APP_NAME,
+        event_listeners=[pool_monitor, command_monitor] + ([tracing_command_listener] if TRACING_ENABLED else [])
+    )
+
+
+_client = None
+_collections = {}
+
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    """Return the process-wide client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def get_database():
+    return get_client()[DB_NAME]
+
+
+def _read_preference(mode: str, max_staleness: int):
+    """Build a read preference from its connection-string name"""
+    if mode == "primary":
+        return Primary()
+    preferences = {
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest
+    }
+    return preferences[mode](max_staleness=max_staleness)
+
+
+def _write_concern(w: str, journal: bool) -> WriteConcern:
+    """Build a write concern from its env form ("majority" or a node count)"""
+    return WriteConcern(
+        w=int(w) if w.isdigit() else w,
+        j=journal or None,
+        wtimeout=MONGO_WRITE_TIMEOUT_MS
+    )
+
+
+WRITE_CONCERN_TIERS = {
+    "message": _write_concern(MONGO_MESSAGE_WRITE_CONCERN, MONGO_MESSAGE_WRITE_JOURNAL),
+    "account": _write_concern(MONGO_ACCOUNT_WRITE_CONCERN, MONGO_ACCOUNT_WRITE_JOURNAL)
+}
+
+
+def get_collection(name: str, routing: str = "primary"):
+    """
+    Return a collection handle with the write concern of its tier;
+    routing="listing" reads with the listing read preference
+    """
+    key = (name, routing)
+    collection = _collections.get(key)
+    if collection is None:
+        collection = get_database()[name]
+        tier = COLLECTION_WRITE_TIERS.get(name)
+        if tier is not None:
+            collection = collection.with_options(write_concern=WRITE_CONCERN_TIERS[tier])
+        if routing == "listing":
+            collection = collection.with_options(
+                read_preference=_read_preference(MONGO_LISTING_READ_PREFERENCE, MONGO_MAX_STALENESS_SECONDS)
+            )
+        _collections[key] = collection
+    return collection
+
+
+def connect():
+    """Create the client (called from the app lifespan so it binds to the running loop)"""
+    return get_client()
+
+
+def close_client():
+    """Close the client and its pool (called on app shutdown)"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+    _collections.clear()
+    _causal_tokens.clear()
+
+
+class _CollectionProxy:
+    """
+    Module-level collection handle that resolves against the current client, so
+    `from database import users` works before the lifespan creates the client
+    and keeps working after it is recreated.
+    """
+
+    def __init__(self, name: str, routing: str = "primary"):
+        self._name = name
+        self._routing = routing
+
+    def __getattr__(self, attribute):
+        return getattr(get_collection(self._name, self._routing), attribute)
+
+    def __repr__(self):
+        return f"<collection proxy {DB_NAME}.{self._name} ({self._routing})>"
+
 
 # Collections
-users = database.users
-chats = database.chats
-messages = database.messages
+users = _CollectionProxy("users")
+chats = _CollectionProxy("chats")
+messages = _CollectionProxy("messages")
+bot_jobs = _CollectionProxy("bot_jobs")
+
+# Listing/history reads (secondaryPreferred by default)
+chats_listing = _CollectionProxy("chats", routing="listing")
+messages_listing = _CollectionProxy("messages", routing="listing")
+
+
+# user id -> (cluster time, operation time) of the user's latest write in this process
+_causal_tokens = OrderedDict()
+
+
+def _record_causal_token(user_id: str, session):
+    operation_time = session.operation_time
+    if operation_time is None:
+        return
+    previous = _causal_tokens.get(user_id)
+    if previous is None or previous[1] < operation_time:
+        _causal_tokens[user_id] = (session.cluster_time, operation_time)
+    _causal_tokens.move_to_end(user_id)
+    while len(_causal_tokens) > CAUSAL_TOKEN_CACHE_SIZE:
+        _causal_tokens.popitem(last=False)
+
+
+@asynccontextmanager
+async def causal_session(user_id: str):
+    """
+    Causally consistent session for one user.
+
+    The session starts after the user's last recorded write, so reads routed to
+    a secondary wait until that write is visible there; writes made in the
+    session advance the recorded point. Yields None when disabled, which the
+    driver treats as "no explicit session".
+    """
+    if not MONGO_CAUSAL_CONSISTENCY:
+        yield None
+        return
+
+    async with await get_client().start_session(causal_consistency=True) as session:
+        token = _causal_tokens.get(user_id)
+        if token is not None:
+            if token[0] is not None:
+                session.advance_cluster_time(token[0])
+            session.advance_operation_time(token[1])
+        yield session
+        _record_causal_token(user_id, session)
 
 # Create indexes for better performance
 async def create_indexes():
@@ -27,16 +249,44 @@ async def create_indexes():
     
     # Chats collection indexes
     await chats.create_index([("userId", 1), ("isDeleted", 1)])
-    await chats.create_index([("userId", 1), ("lastMessageAt", -1)])
+    # Keyset pagination of GET /chat/saved, with and without the status filter
+    await chats.create_index([("userId", 1), ("isDeleted", 1), ("lastMessageAt", -1), ("_id", -1)])
+    await chats.create_index([("userId", 1), ("isDeleted", 1), ("status", 1), ("lastMessageAt", -1), ("_id", -1)])
     await chats.create_index("status")
+    # Delta sync (GET /sync) walks each user's changes in (updatedAt, _id) order
+    await chats.create_index([("userId", 1), ("updatedAt", 1), ("_id", 1)])
+    # Title search, scoped to one user; documents pick their stemming language via searchLanguage
+    await chats.create_index(
+        [("userId", 1), ("title", "text")],
+        name="chat_title_search",
+        default_language="english",
+        language_override="searchLanguage"
+    )
     
     # Messages collection indexes
     await messages.create_index([("chatId", 1), ("isDeleted", 1)])
     await messages.create_index([("chatId", 1), ("timestamp", -1)])
     await messages.create_index("userId")
     await messages.create_index("sender")
+    await messages.create_index([("userId", 1), ("updatedAt", 1), ("_id", 1)])
+    # At most one bot reply per queued job, so a retried job cannot store a second reply
+    await messages.create_index("jobId", unique=True, partialFilterExpression={"jobId": {"$exists": True}})
+    # Message search, scoped to one user
+    await messages.create_index(
+        [("userId", 1), ("message", "text")],
+        name="message_search",
+        default_language="english",
+        language_override="searchLanguage"
+    )
+    
+    # Bot reply job queue indexes
+    await bot_jobs.create_index([("status", 1), ("availableAt", 1)])
+    await bot_jobs.create_index([("status", 1), ("leaseExpiresAt", 1)])
+    await bot_jobs.create_index([("chatId", 1), ("userId", 1)])
+    # Finished jobs are removed after a day
+    await bot_jobs.create_index("finishedAt", expireAfterSeconds=86400)
 
 # Initialize database
 async def init_db():
     await create_indexes()
-    print("Database initialized successfully!") 
\ No newline at end of file
+    logger.info("database indexes ensured")
\ No newline at end of file
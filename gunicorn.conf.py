@@ -0,0 +1,38 @@
+"""
+Production server: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker is a separate process running the FastAPI lifespan, so it opens
+its own MongoDB pool, LLM HTTP client and shared-state connection after the
+fork. State that must be consistent across workers (response cache, rate
+limits, push events) goes through SHARED_STATE_BACKEND=redis.
+"""
+import multiprocessing
+import os
+
+# The container always listens on 8000 (docker-compose maps the host port)
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# One worker per core; the app is async, so more workers than cores only adds overhead
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# The app must not be imported before forking: Motor and httpx clients are bound
+# to the event loop of the process that creates them
+preload_app = False
+
+# Graceful shutdown: on SIGTERM workers stop accepting connections and get this long
+# to finish in-flight requests and run the lifespan shutdown (worker pool, clients)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# A worker that stops heartbeating for this long is killed and replaced
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers periodically (jittered so they do not all restart together)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# The app logs requests itself (middleware.request_logging); set "-" for gunicorn's access log as well
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
@@ -1,17 +1,24 @@
-from fastapi import HTTPException, Depends, status, Request
+from fastapi import HTTPException, Depends, status, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hmac
 import jwt
 import os
-from dotenv import load_dotenv
+from typing import Optional
+from config import load_env
 from database import users
 from bson import ObjectId
 from locales import get_message
 from schemas.enums import Language
 
-load_dotenv()
+load_env()
 
 TOKEN_KEY = os.getenv("TOKEN_KEY", "Test_124")  # Default fallback
+# Operator token for the /admin routes (profiling); they are not mounted when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 security = HTTPBearer()
+# WebSocket clients offer the JWT as subprotocols ["bearer", "<token>"]: browsers
+# cannot set Authorization on an upgrade, and query strings end up in access logs
+WEBSOCKET_AUTH_SUBPROTOCOL = "bearer"
 
 def get_language_from_request(request: Request) -> str:
     """Get language from request headers or default to English"""
@@ -20,6 +27,31 @@ def get_language_from_request(request: Request) -> str:
         language = "en"
     return language
 
+def get_websocket_token(websocket: WebSocket) -> Optional[str]:
+    """JWT sent in Sec-WebSocket-Protocol as "bearer, <token>", or None"""
+    subprotocols = websocket.scope.get("subprotocols") or []
+    if len(subprotocols) == 2 and subprotocols[0] == WEBSOCKET_AUTH_SUBPROTOCOL:
+        return subprotocols[1]
+    return None
+
+async def get_user_from_token(token: str):
+    """Resolve a JWT to its user document, or None if the token or user is invalid
+    
+    Used where the Authorization header is unavailable (e.g. WebSocket upgrades).
+    """
+    try:
+        payload = jwt.decode(token, TOKEN_KEY, algorithms=["HS256"])
+        user_object_id = ObjectId(payload.get("_id"))
+    except Exception:
+        return None
+    
+    user = await users.find_one({"_id": user_object_id})
+    if user is None:
+        return None
+    
+    user["_id"] = str(user["_id"])
+    return user
+
 async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user with language support"""
     try:
@@ -90,4 +122,14 @@ async def get_current_user(request: Request, credentials: HTTPAuthorizationCrede
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=get_message(language, "general.unauthorized"),
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        ) 
+
+async def require_admin(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Allow only callers presenting ADMIN_TOKEN as their bearer token"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(credentials.credentials, ADMIN_TOKEN):
+        language = get_language_from_request(request)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=get_message(language, "general.unauthorized"),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
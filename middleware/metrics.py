@@ -0,0 +1,45 @@
+import time
+from services.metrics import METRICS_ENABLED, http_requests, http_request_duration, http_requests_in_flight
+
+# Label for requests that matched no route (keeps 404 scans from creating new series)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight count per request.
+
+    Requests are labelled with the route template ("/chat/{chat_id}/messages"),
+    not the raw path, so the number of series stays bounded. Latency covers the
+    whole response, including streamed bodies.
+    """
+
+    def __init__(self, app, enabled: bool = METRICS_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc((method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            http_requests_in_flight.dec((method,))
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            http_request_duration.observe(duration, (method, route_path))
+            http_requests.inc((method, route_path, str(status_code[0])))
@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence, Tuple
+import jwt
+from config import load_env
+from starlette.datastructures import Headers
+from locales import get_message
+from middleware.auth import TOKEN_KEY
+from services.shared_state import SHARED_STATE_BACKEND, SHARED_STATE_REDIS_URL
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" keeps buckets in this process; "redis" shares them across workers/instances.
+# Follows the shared state backend unless set explicitly.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND") or SHARED_STATE_BACKEND
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL") or SHARED_STATE_REDIS_URL
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+RATE_LIMIT_CLEANUP_INTERVAL = float(os.getenv("RATE_LIMIT_CLEANUP_INTERVAL", "60"))
+# Only enable behind a proxy that sets X-Forwarded-For, otherwise clients can spoof their IP
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+# JSON list overriding DEFAULT_RATE_LIMIT_RULES, e.g.
+# [{"method": "POST", "path": "/chat/{chat_id}/message", "per_user": "20/60", "per_ip": "60/60"}]
+RATE_LIMIT_RULES = os.getenv("RATE_LIMIT_RULES", "")
+
+# Limits are "<requests>/<seconds>": the bucket holds <requests> tokens and refills
+# at <requests>/<seconds> per second, so short bursts up to the limit are allowed
+DEFAULT_RATE_LIMIT_RULES = [
+    # Every message triggers an LLM call
+    {"method": "POST", "path": "/chat/{chat_id}/message", "per_user": "20/60", "per_ip": "60/60"},
+    # Login/signup/password reset call Firebase
+    {"method": "POST", "path": "/auth/login", "per_ip": "10/60"},
+    {"method": "POST", "path": "/auth/signup", "per_ip": "5/60"},
+    {"method": "POST", "path": "/auth/forgot-password", "per_ip": "5/300"},
+    {"method": "POST", "path": "/chat/import", "per_user": "10/3600"},
+    {"method": "POST", "path": "/chat/{chat_id}/import", "per_user": "10/3600"},
+    {"method": "GET", "path": "/chat/search", "per_user": "60/60"}
+]
+
+
+class Rate:
+    """Token bucket parameters parsed from "<requests>/<seconds>" """
+
+    def __init__(self, spec: str):
+        requests, _, seconds = spec.partition("/")
+        self.spec = spec
+        self.capacity = int(requests)
+        self.refill_per_second = self.capacity / float(seconds or 1)
+
+
+class RateLimitRule:
+    """Limits for one method + path template ("{param}" matches one path segment)"""
+
+    def __init__(self, method: str, path: str, per_user: Optional[str] = None, per_ip: Optional[str] = None):
+        self.method = method.upper()
+        self.path = path
+        segments = [
+            "[^/]+" if segment.startswith("{") and segment.endswith("}") else re.escape(segment)
+            for segment in path.split("/")
+        ]
+        self.pattern = re.compile("^" + "/".join(segments) + "$")
+        self.per_user = Rate(per_user) if per_user else None
+        self.per_ip = Rate(per_ip) if per_ip else None
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.pattern.match(path) is not None
+
+
+def load_rules(rules_json: str = RATE_LIMIT_RULES) -> List[RateLimitRule]:
+    rules = json.loads(rules_json) if rules_json else DEFAULT_RATE_LIMIT_RULES
+    return [RateLimitRule(**rule) for rule in rules]
+
+
+class RateLimitBackend(ABC):
+    """Stores token buckets; take_all() consumes one token from each bucket, or none"""
+
+    @abstractmethod
+    async def take_all(self, checks: Sequence[Tuple[str, Rate]]) -> Tuple[Optional[int], float]:
+        """
+        Take one token from every (key, rate) bucket if all of them have one.
+
+        Returns (None, 0.0) when the tokens were taken, otherwise the index of
+        the first empty bucket and the seconds until it has a token. A rejected
+        request takes nothing, so it does not drain the buckets that had room.
+        """
+
+    async def take(self, key: str, rate: Rate) -> Tuple[bool, float]:
+        """Return (allowed, seconds until a token is available)"""
+        rejected, retry_after = await self.take_all([(key, rate)])
+        return rejected is None, retry_after
+
+    def start(self):
+        """Start background maintenance (called on app startup)"""
+        return None
+
+    async def aclose(self):
+        return None
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in this process, split across shards so concurrent callers
+    (event loop and worker threads) rarely contend on the same lock.
+    Idle buckets are dropped by a periodic sweep once they would have
+    refilled completely, off the request path.
+    """
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, cleanup_interval: float = RATE_LIMIT_CLEANUP_INTERVAL):
+        self._locks = [threading.Lock() for _ in range(shards)]
+        # key -> [tokens, last refill time, seconds to refill completely]
+        self._buckets = [{} for _ in range(shards)]
+        self.cleanup_interval = cleanup_interval
+        self._cleanup_task = None
+
+    def _shard(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % len(self._locks)
+
+    def take_all_now(self, checks: Sequence[Tuple[str, Rate]], now: Optional[float] = None) -> Tuple[Optional[int], float]:
+        now = time.monotonic() if now is None else now
+        # Locks are taken in shard order so two requests never wait on each other
+        shards = sorted({self._shard(key) for key, _ in checks})
+        for shard in shards:
+            self._locks[shard].acquire()
+        try:
+            pending = []
+            for index, (key, rate) in enumerate(checks):
+                buckets = self._buckets[self._shard(key)]
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = [float(rate.capacity), now, rate.capacity / rate.refill_per_second]
+                else:
+                    bucket[0] = min(rate.capacity, bucket[0] + (now - bucket[1]) * rate.refill_per_second)
+                    bucket[1] = now
+                if bucket[0] < 1:
+                    return index, (1 - bucket[0]) / rate.refill_per_second
+                pending.append(bucket)
+
+            for bucket in pending:
+                bucket[0] -= 1
+            return None, 0.0
+        finally:
+            for shard in shards:
+                self._locks[shard].release()
+
+    def take_now(self, key: str, rate: Rate, now: Optional[float] = None) -> Tuple[bool, float]:
+        rejected, retry_after = self.take_all_now([(key, rate)], now)
+        return rejected is None, retry_after
+
+    async def take_all(self, checks: Sequence[Tuple[str, Rate]]) -> Tuple[Optional[int], float]:
+        return self.take_all_now(checks)
+
+    def start(self):
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._sweep(), name="rate-limit-cleanup")
+
+    async def aclose(self):
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            await asyncio.gather(self._cleanup_task, return_exceptions=True)
+            self._cleanup_task = None
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                # Shard locks are thread locks, so the sweep runs in a thread and
+                # requests on the other shards keep going meanwhile
+                await asyncio.to_thread(self.cleanup)
+            except Exception as error:
+                logger.warning("rate limit cleanup failed: %s", error)
+
+    def cleanup(self, now: Optional[float] = None):
+        """Drop buckets that are full again (same state as a missing bucket)"""
+        now = time.monotonic() if now is None else now
+        for lock, buckets in zip(self._locks, self._buckets):
+            with lock:
+                idle = [key for key, (_, updated, refill_seconds) in buckets.items() if now - updated >= refill_seconds]
+                for key in idle:
+                    del buckets[key]
+
+    def __len__(self):
+        return sum(len(buckets) for buckets in self._buckets)
+
+
+# Atomic all-or-nothing token buckets in Redis: KEYS = buckets,
+# ARGV = capacity and refill per second for each bucket in turn.
+# Returns {0, "0"} when every token was taken, otherwise the 1-based index
+# of the first empty bucket and the seconds until it has a token.
+_REDIS_TOKEN_BUCKETS = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local refill = tonumber(ARGV[2 * i])
+  local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local available = tonumber(bucket[1]) or capacity
+  local ts = tonumber(bucket[2]) or now
+  available = math.min(capacity, available + (now - ts) * refill)
+  if available < 1 then
+    return {i, tostring((1 - available) / refill)}
+  end
+  tokens[i] = available
+end
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local refill = tonumber(ARGV[2 * i])
+  redis.call('HSET', KEYS[i], 'tokens', tokens[i] - 1, 'ts', now)
+  redis.call('EXPIRE', KEYS[i], math.ceil(capacity / refill) + 1)
+end
+return {0, '0'}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker and instance (requires the redis package)"""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(_REDIS_TOKEN_BUCKETS)
+
+    async def take_all(self, checks: Sequence[Tuple[str, Rate]]) -> Tuple[Optional[int], float]:
+        if not checks:
+            return None, 0.0
+        args = []
+        for _, rate in checks:
+            args += [rate.capacity, rate.refill_per_second]
+        rejected, retry_after = await self._script(keys=[self.prefix + key for key, _ in checks], args=args)
+        if not rejected:
+            return None, 0.0
+        return int(rejected) - 1, max(0.0, float(retry_after))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_rate_limit_backend(backend_name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    """Build the backend selected by RATE_LIMIT_BACKEND"""
+    if backend_name == "memory":
+        return InMemoryRateLimitBackend()
+    if backend_name == "redis":
+        return RedisRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {backend_name}")
+
+
+_rate_limit_backend = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Process-wide backend shared by the middleware"""
+    global _rate_limit_backend
+    if _rate_limit_backend is None:
+        _rate_limit_backend = create_rate_limit_backend()
+    return _rate_limit_backend
+
+
+async def close_rate_limit_backend():
+    """Release backend connections (called on app shutdown)"""
+    global _rate_limit_backend
+    if _rate_limit_backend is not None:
+        await _rate_limit_backend.aclose()
+        _rate_limit_backend = None
+
+
+def _user_id_from_headers(headers: Headers) -> Optional[str]:
+    """User id from the bearer token (signature checked, no database lookup)"""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], TOKEN_KEY, algorithms=["HS256"]).get("_id")
+    except jwt.PyJWTError:
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying per-user and per-IP token buckets to matching routes.
+
+    Requests over a limit get 429 with a Retry-After header. If the backend is
+    unavailable requests are let through rather than failing the API.
+    """
+
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None, backend: Optional[RateLimitBackend] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.rules = load_rules() if rules is None else rules
+        self.backend = backend
+        self.enabled = enabled
+
+    def _client_ip(self, scope, headers: Headers) -> str:
+        if RATE_LIMIT_TRUST_FORWARDED_FOR:
+            forwarded_for = headers.get("x-forwarded-for")
+            if forwarded_for:
+                return forwarded_for.split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        rule = next((rule for rule in self.rules if rule.matches(method, path)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        backend = self.backend or get_rate_limit_backend()
+        headers = Headers(scope=scope)
+        checks = []
+        if rule.per_user:
+            user_id = _user_id_from_headers(headers)
+            if user_id:
+                checks.append((f"user:{user_id}:{rule.method}:{rule.path}", rule.per_user))
+        if rule.per_ip:
+            checks.append((f"ip:{self._client_ip(scope, headers)}:{rule.method}:{rule.path}", rule.per_ip))
+
+        if checks:
+            try:
+                # All buckets are checked before any is charged
+                rejected, retry_after = await backend.take_all(checks)
+            except Exception as error:
+                logger.warning("rate limit check failed, allowing request: %s", error)
+                rejected = None
+            if rejected is not None:
+                await self._reject(headers, send, retry_after, checks[rejected][1])
+                return
+
+        await self.app(scope, receive, send)
+
+    async def _reject(self, headers: Headers, send, retry_after: float, rate: Rate):
+        language = headers.get("accept-language", "en")[:2]
+        if language not in ["en", "fr"]:
+            language = "en"
+        body = json.dumps({
+            "success": False,
+            "message": get_message(language, "general.rate_limited"),
+            "data": None
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+                (b"x-ratelimit-limit", rate.spec.encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
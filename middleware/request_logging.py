@@ -0,0 +1,70 @@
+import logging
+import re
+import time
+import uuid
+from services.log import log_sampled, request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Accept the caller's id (e.g. from a proxy) only if it is short and plain
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware giving every request an id and logging its outcome.
+
+    The id comes from X-Request-ID when valid, otherwise it is generated. It is
+    echoed in the response and attached to every log record made while the
+    request runs. Successful requests are logged at the sample rate; 4xx and
+    5xx are always logged. Paths are logged as route templates, so ids in URLs
+    are not logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if scope["type"] == "http":
+                self._log(scope, status_code[0], time.perf_counter() - started)
+            request_id_var.reset(token)
+
+    def _log(self, scope, status_code: int, duration: float):
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        fields = {
+            "method": scope["method"],
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 2)
+        }
+        if status_code >= 500:
+            logger.error("request failed", extra=fields)
+        elif status_code >= 400:
+            logger.info("request rejected", extra=fields)
+        else:
+            log_sampled(logger, "request completed", **fields)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from services import metrics
+from services.log import request_id_var
+from services.profiling import SLOW_REQUEST_THRESHOLD_MS, capture_slow_request, request_timings_var, slow_requests
+
+logger = logging.getLogger(__name__)
+
+slow_requests_total = metrics.counter("slow_requests_total", "Requests slower than SLOW_REQUEST_THRESHOLD_MS", ("method", "route"))
+
+
+class SlowRequestMiddleware:
+    """
+    ASGI middleware reporting requests slower than SLOW_REQUEST_THRESHOLD_MS.
+
+    Each request collects its Mongo, LLM and Firebase time by component. A timer
+    fires at the threshold and dumps the request task's await chain while the
+    request is still stuck, which shows what it is waiting on. Once the request
+    finishes, the report is logged and kept for GET /admin/slow-requests.
+    """
+
+    def __init__(self, app, threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if self.threshold <= 0 or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        report = {}
+        timings = {}
+        token = request_timings_var.set(timings)
+        started = time.perf_counter()
+        timer = asyncio.get_running_loop().call_later(
+            self.threshold, capture_slow_request, asyncio.current_task(), report, started
+        )
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            timer.cancel()
+            request_timings_var.reset(token)
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self._report(scope, status_code[0], duration, timings, report)
+
+    def _report(self, scope, status_code: int, duration: float, timings: dict, report: dict):
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        report.update({
+            "method": scope["method"],
+            "route": route,
+            "status": status_code,
+            "request_id": request_id_var.get(),
+            "duration_ms": round(duration * 1000, 2),
+            "timings": {
+                component: {"count": count, "ms": round(seconds * 1000, 2)}
+                for component, (count, seconds) in sorted(timings.items(), key=lambda item: -item[1][1])
+            },
+            "at": time.time()
+        })
+        slow_requests.append(report)
+        slow_requests_total.inc((scope["method"], route))
+        logger.warning("slow request", extra=report)
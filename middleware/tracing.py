@@ -0,0 +1,51 @@
+from services.tracing import get_tracer
+
+# Span name for requests that matched no route
+UNMATCHED_ROUTE = "unmatched"
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per HTTP request.
+
+    A W3C traceparent header from the caller is honoured, so the request joins
+    an existing trace. The span is renamed to "<method> <route template>" once
+    routing has run; Mongo, LLM and Firebase spans made while handling the
+    request become its children. Streamed bodies are included in the span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracer = get_tracer()
+        if tracer is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        from opentelemetry.propagate import extract
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+
+        carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        method = scope["method"]
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            method, context=extract(carrier), kind=SpanKind.SERVER,
+            record_exception=True, set_status_on_exception=True
+        ) as current:
+            current.set_attribute("http.request.method", method)
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+                current.update_name(f"{method} {route}")
+                current.set_attribute("http.route", route)
+                current.set_attribute("http.response.status_code", status_code[0])
+                if status_code[0] >= 500:
+                    current.set_status(Status(StatusCode.ERROR))
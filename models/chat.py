@@ -13,8 +13,12 @@ class ChatModel(BaseModel):
     createdAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     updatedAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     lastMessageAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+    lastMessage: Optional[str] = Field(default=None, description="Preview of the latest message")
+    lastMessageSender: Optional[str] = Field(default=None, description="Sender of the latest message: user or bot")
+    lastMessageId: Optional[str] = Field(default=None, description="ID of the latest message")
     messageCount: int = Field(default=0, description="Total messages in chat")
     isDeleted: bool = Field(default=False, description="Soft delete flag")
+    version: int = Field(default=1, description="Incremented on every write (ETag / If-Match)")
 
     model_config = {
         "validate_by_name": True,
@@ -42,6 +46,7 @@ class ChatResponse(BaseModel):
     lastMessageAt: datetime
     messageCount: int
     isDeleted: bool
+    version: int
 
 class CreateChatRequest(BaseModel):
     title: str = Field(..., description="Chat title")
@@ -51,6 +56,7 @@ class CreateChatRequest(BaseModel):
 class DeleteChatResponse(BaseModel):
     chatId: str
     deletedAt: datetime
+    version: int
 
 class DeleteAllChatsResponse(BaseModel):
     deletedCount: int
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from bson import ObjectId
 
 class MessageModel(BaseModel):
@@ -14,6 +14,7 @@ class MessageModel(BaseModel):
     timestamp: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     isDeleted: bool = Field(default=False, description="Soft delete flag")
     updatedAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = Field(default=1, description="Incremented on every write (ETag / If-Match)")
 
     model_config = {
         "validate_by_name": True,
@@ -41,17 +42,44 @@ class MessageResponse(BaseModel):
     timestamp: datetime
     isDeleted: bool
     updatedAt: datetime
+    version: int
 
 class SendMessageRequest(BaseModel):
     message: str = Field(..., description="Message content")
     pictures: List[str] = Field(default=[], description="Array of picture URLs")
     voices: List[str] = Field(default=[], description="Array of voice URLs")
+    use_cache: bool = Field(default=True, description="Allow the bot reply to be served from the response cache")
 
 class UpdateMessageRequest(BaseModel):
     message: str = Field(..., description="Updated message content")
     pictures: List[str] = Field(default=[], description="Array of picture URLs")
     voices: List[str] = Field(default=[], description="Array of voice URLs")
 
+# Most messages one batch request may touch
+MESSAGE_BATCH_LIMIT = 100
+
+class BatchDeleteMessagesRequest(BaseModel):
+    message_ids: List[str] = Field(..., min_length=1, max_length=MESSAGE_BATCH_LIMIT, description="IDs of the messages to delete")
+
+class MessagePatch(BaseModel):
+    message_id: str = Field(..., description="ID of the message to update")
+    message: Optional[str] = Field(default=None, description="New message content (unchanged if omitted)")
+    pictures: Optional[List[str]] = Field(default=None, description="New picture URLs (unchanged if omitted)")
+    voices: Optional[List[str]] = Field(default=None, description="New voice URLs (unchanged if omitted)")
+    version: Optional[int] = Field(default=None, ge=0, description="Only update if the message is still at this version")
+
+class BatchUpdateMessagesRequest(BaseModel):
+    updates: List[MessagePatch] = Field(..., min_length=1, max_length=MESSAGE_BATCH_LIMIT, description="Changes to apply, one per message")
+    
+    @validator('updates')
+    def one_change_per_message(cls, v):
+        message_ids = [patch.message_id for patch in v]
+        if len(set(message_ids)) != len(message_ids):
+            raise ValueError('Each message_id may appear only once')
+        if any(patch.message is None and patch.pictures is None and patch.voices is None for patch in v):
+            raise ValueError('Each update must change message, pictures or voices')
+        return v
+
 class ConversationResponse(BaseModel):
     messages: List[MessageResponse]
     pagination: dict
@@ -72,6 +100,8 @@ class UpdateMessageResponse(BaseModel):
     pictures: List[str]
     voices: List[str]
     updated_at: datetime
+    version: int
 
 class DeleteMessageResponse(BaseModel):
     deleted_message_id: str
+    version: int
@@ -22,6 +22,8 @@ class UserModel(BaseModel):
     createdAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     updatedAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     deletedAt: Optional[datetime] = None
+    # Incremented on every write (ETag / If-Match)
+    version: int = 1
 
     model_config = {
         "validate_by_name": True,
@@ -58,3 +60,4 @@ class UserResponse(BaseModel):
     createdAt: datetime
     updatedAt: datetime
     deletedAt: Optional[datetime] = None
+    version: int = 1
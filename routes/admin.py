@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query, Request
+from controllers.admin_controller import AdminController
+from services.container import get_admin_controller
+from schemas.response import StandardResponse
+from middleware.auth import get_language_from_request, require_admin
+from services.profiling import PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS
+
+# Operator endpoints, mounted only when ADMIN_TOKEN is set. Each call is served by
+# (and reports on) whichever worker process receives it.
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.post("/profile")
+async def profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS, description="How long to sample"),
+    interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1, le=1000, description="Sampling interval"),
+    include_idle: bool = Query(False, description="Keep samples of threads waiting for work"),
+    admin_controller: AdminController = Depends(get_admin_controller)
+):
+    """Run the sampling profiler on this worker and download collapsed stacks (flamegraph.pl, speedscope)"""
+    return await admin_controller.profile(seconds, interval_ms, include_idle, get_language_from_request(request))
+
+@router.get("/slow-requests", response_model=StandardResponse)
+async def get_slow_requests(request: Request, limit: int = Query(20, ge=1, le=200), admin_controller: AdminController = Depends(get_admin_controller)):
+    """Recent requests over SLOW_REQUEST_THRESHOLD_MS, with task stack and timing breakdown"""
+    return await admin_controller.get_slow_requests(limit, get_language_from_request(request))
@@ -1,25 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, WebSocket, Request
+from datetime import datetime
+from typing import Optional
 from controllers.chat_controller import ChatController
 from controllers.message_controller import MessageController
+from controllers.export_controller import ExportController
+from services.container import get_chat_controller, get_message_controller, get_export_controller
 from models.chat import CreateChatRequest, ChatResponse, DeleteChatResponse, DeleteAllChatsResponse
 from models.message import (
     SendMessageRequest, UpdateMessageRequest, 
     ConversationResponse, SendMessageResponse, 
     UpdateMessageResponse, DeleteMessageResponse
 )
-from middleware.auth import get_current_user
+from middleware.auth import get_current_user, get_user_from_token, get_websocket_token, WEBSOCKET_AUTH_SUBPROTOCOL
+from services.etag import conditional_json
 from locales import get_message
-from schemas.enums import Language
+from schemas.enums import Language, ChatStatus
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# Initialize controllers
-chat_controller = ChatController()
-message_controller = MessageController()
-
 @router.get("/suggestions", response_model=dict)
 async def get_chat_suggestions(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
 ):
     """
     Retrieve available chat suggestion options
@@ -37,10 +39,17 @@ async def get_chat_suggestions(
 
 @router.get("/saved", response_model=dict)
 async def get_saved_chats(
-    current_user: dict = Depends(get_current_user)
+    limit: int = Query(20, ge=1, le=100, description="Number of chats per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    chat_status: Optional[ChatStatus] = Query(None, alias="status", description="Only return chats with this status"),
+    http_request: Request = None,
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
 ):
     """
-    Retrieve user's saved chat conversations
+    Retrieve user's saved chat conversations, most recently active first (cursor paginated)
+    
+    Returns an ETag; send it back in If-None-Match to get 304 when nothing changed.
     """
     user_id = current_user["_id"]
     user_language = current_user.get("language", "english")
@@ -51,12 +60,117 @@ async def get_saved_chats(
     else:
         locale_code = "en"
     
-    return await chat_controller.get_saved_chats(user_id, locale_code)
+    return conditional_json(http_request, await chat_controller.get_saved_chats(
+        user_id, locale_code, limit, cursor, chat_status.value if chat_status else None
+    ))
+
+@router.get("/search", response_model=dict)
+async def search_chats(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text (supports \"phrases\" and -exclusions)"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=50, description="Number of results per page (for chats and for messages)"),
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
+):
+    """
+    Full-text search across the user's chat titles and messages
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await chat_controller.search(user_id, q, page, limit, locale_code)
+
+@router.get("/export")
+async def export_history(
+    current_user: dict = Depends(get_current_user),
+    export_controller: ExportController = Depends(get_export_controller)
+):
+    """
+    Download every chat and message of the user as streamed NDJSON
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await export_controller.export_history(user_id, None, locale_code)
+
+@router.post("/import", response_model=dict)
+async def import_history(
+    http_request: Request,
+    current_user: dict = Depends(get_current_user),
+    export_controller: ExportController = Depends(get_export_controller)
+):
+    """
+    Import an NDJSON export: each chat record creates a new chat holding the messages that follow it
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await export_controller.import_history(user_id, http_request, None, locale_code)
+
+@router.get("/{chat_id}/export")
+async def export_chat(
+    chat_id: str,
+    current_user: dict = Depends(get_current_user),
+    export_controller: ExportController = Depends(get_export_controller)
+):
+    """
+    Download one chat and its messages as streamed NDJSON
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await export_controller.export_history(user_id, chat_id, locale_code)
+
+@router.post("/{chat_id}/import", response_model=dict)
+async def import_chat(
+    chat_id: str,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user),
+    export_controller: ExportController = Depends(get_export_controller)
+):
+    """
+    Append the messages of an NDJSON export to an existing chat
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await export_controller.import_history(user_id, http_request, chat_id, locale_code)
 
 @router.post("/create", response_model=dict)
 async def create_chat(
     request: CreateChatRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
 ):
     """
     Create a new chat conversation
@@ -74,7 +188,8 @@ async def create_chat(
 
 @router.delete("/all", response_model=dict)
 async def delete_all_chats(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
 ):
     """
     Delete all chats for the authenticated user
@@ -94,7 +209,9 @@ async def delete_all_chats(
 @router.delete("/{chat_id}", response_model=dict)
 async def delete_chat(
     chat_id: str,
-    current_user: dict = Depends(get_current_user)
+    if_match: Optional[str] = Header(None, description="Only delete if the chat is still at this version (ETag)"),
+    current_user: dict = Depends(get_current_user),
+    chat_controller: ChatController = Depends(get_chat_controller)
 ):
     """
     Delete a specific chat for the authenticated user
@@ -109,17 +226,46 @@ async def delete_chat(
     else:
         locale_code = "en"
     
-    return await chat_controller.delete_chat(user_id, chat_id, locale_code)
+    return await chat_controller.delete_chat(user_id, chat_id, locale_code, if_match)
 
 @router.get("/{chat_id}/messages", response_model=dict)
 async def get_conversation_messages(
     chat_id: str,
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(20, ge=1, le=100, description="Number of messages per page"),
-    current_user: dict = Depends(get_current_user)
+    since: Optional[datetime] = Query(None, description="Only return messages newer than this timestamp (oldest first)"),
+    http_request: Request = None,
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
 ):
     """
     Retrieve paginated messages from a chat conversation
+    
+    Returns an ETag; send it back in If-None-Match to get 304 when the page did not change.
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return conditional_json(
+        http_request, await message_controller.get_conversation_messages(user_id, chat_id, page, limit, locale_code, since)
+    )
+
+@router.get("/{chat_id}/messages/poll", response_model=dict)
+async def poll_messages(
+    chat_id: str,
+    since: Optional[datetime] = Query(None, description="Return messages newer than this timestamp (defaults to now)"),
+    timeout: int = Query(25, ge=0, le=60, description="Seconds to wait for a new message before returning"),
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
+):
+    """
+    Long-poll for new messages in a chat conversation
     """
     user_id = current_user["_id"]
     user_language = current_user.get("language", "english")
@@ -130,13 +276,29 @@ async def get_conversation_messages(
     else:
         locale_code = "en"
     
-    return await message_controller.get_conversation_messages(user_id, chat_id, page, limit, locale_code)
+    return await message_controller.wait_for_messages(user_id, chat_id, since, timeout, locale_code)
+
+@router.websocket("/{chat_id}/ws")
+async def chat_messages_websocket(
+    websocket: WebSocket,
+    chat_id: str,
+    message_controller: MessageController = Depends(get_message_controller)
+):
+    """
+    Subscribe to a chat and receive new messages as they are inserted
+    
+    The access token is sent as subprotocols: Sec-WebSocket-Protocol: bearer, <token>
+    """
+    token = get_websocket_token(websocket)
+    user = await get_user_from_token(token) if token else None
+    await message_controller.stream_chat_messages(websocket, user, chat_id, subprotocol=WEBSOCKET_AUTH_SUBPROTOCOL)
 
 @router.post("/{chat_id}/message", response_model=dict)
 async def send_message(
     chat_id: str,
     request: SendMessageRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
 ):
     """
     Send a message to the chatbot in a specific chat
@@ -151,3 +313,25 @@ async def send_message(
         locale_code = "en"
     
     return await message_controller.send_message(user_id, chat_id, request, locale_code)
+
+@router.get("/{chat_id}/jobs/{job_id}", response_model=dict)
+async def get_bot_job(
+    chat_id: str,
+    job_id: str,
+    wait: int = Query(0, ge=0, le=30, description="Seconds to wait for the reply before returning (long-poll)"),
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
+):
+    """
+    Retrieve the status of a queued bot reply (async reply mode)
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await message_controller.get_bot_job(user_id, chat_id, job_id, wait, locale_code)
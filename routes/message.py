@@ -1,27 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from typing import Optional
 from controllers.message_controller import MessageController
+from services.container import get_message_controller
 from models.message import (
-    UpdateMessageRequest, 
+    UpdateMessageRequest, BatchDeleteMessagesRequest, BatchUpdateMessagesRequest,
     UpdateMessageResponse, DeleteMessageResponse
 )
 from middleware.auth import get_current_user
+from services.etag import version_etag
 from locales import get_message
 from schemas.enums import Language
 
 router = APIRouter(prefix="/message", tags=["messages"])
 
-# Initialize message controller
-message_controller = MessageController()
 
+@router.post("/batch-delete", response_model=dict)
+async def batch_delete_messages(
+    request: BatchDeleteMessagesRequest,
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
+):
+    """
+    Delete several messages at once (soft delete), with a result per message id
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await message_controller.batch_delete_messages(user_id, request, locale_code)
+
+@router.patch("/batch", response_model=dict)
+async def batch_update_messages(
+    request: BatchUpdateMessagesRequest,
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
+):
+    """
+    Update several messages at once, with a result per message id
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await message_controller.batch_update_messages(user_id, request, locale_code)
 
 @router.put("/{message_id}", response_model=dict)
 async def update_message(
     message_id: str,
     request: UpdateMessageRequest,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    if_match: Optional[str] = Header(None, description="Only update if the message is still at this version (ETag)"),
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
 ):
     """
-    Update a specific message
+    Update a specific message (412 if If-Match no longer matches its version)
     """
     user_id = current_user["_id"]
     user_language = current_user.get("language", "english")
@@ -32,15 +75,19 @@ async def update_message(
     else:
         locale_code = "en"
     
-    return await message_controller.update_message(user_id, message_id, request, locale_code)
+    result = await message_controller.update_message(user_id, message_id, request, locale_code, if_match)
+    response.headers["ETag"] = version_etag(result["data"]["version"])
+    return result
 
 @router.delete("/{message_id}", response_model=dict)
 async def delete_message(
     message_id: str,
-    current_user: dict = Depends(get_current_user)
+    if_match: Optional[str] = Header(None, description="Only delete if the message is still at this version (ETag)"),
+    current_user: dict = Depends(get_current_user),
+    message_controller: MessageController = Depends(get_message_controller)
 ):
     """
-    Delete a specific message
+    Delete a specific message (412 if If-Match no longer matches its version)
     """
     user_id = current_user["_id"]
     user_language = current_user.get("language", "english")
@@ -51,4 +98,4 @@ async def delete_message(
     else:
         locale_code = "en"
     
-    return await message_controller.delete_message(user_id, message_id, locale_code)
+    return await message_controller.delete_message(user_id, message_id, locale_code, if_match)
@@ -1,62 +1,80 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, Request, Response
+from typing import Optional
 from controllers.profile_controller import ProfileController
+from services.container import get_profile_controller
 from schemas.profile import ChangeNameRequest, ChangeImageRequest, UpdateTokenRequest
 from schemas.response import StandardResponse
 from middleware.auth import get_current_user
+from services.etag import not_modified, version_etag, versioned_json
+
+# If-Match on writes: only apply the change if the user is still at this version (ETag)
+IF_MATCH = Header(None, description="Only write if the user is still at this version (ETag)")
 
 router = APIRouter(prefix="/profile", tags=["Profile Management"])
-profile_controller = ProfileController()
 
 @router.put("/change-name", response_model=StandardResponse)
-async def change_name(request: ChangeNameRequest, current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def change_name(request: ChangeNameRequest, response: Response, if_match: Optional[str] = IF_MATCH, current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Change user's display name"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.change_name(current_user["_id"], request.newName, user_language)
+    result = await profile_controller.change_name(current_user["_id"], request.newName, user_language, if_match)
+    response.headers["ETag"] = version_etag(result["data"]["version"])
+    return result
 
 @router.put("/change-image", response_model=StandardResponse)
-async def change_image(request: ChangeImageRequest, current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def change_image(request: ChangeImageRequest, response: Response, if_match: Optional[str] = IF_MATCH, current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Change user's profile image"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.change_image(current_user["_id"], request.image_url, user_language)
+    result = await profile_controller.change_image(current_user["_id"], request.image_url, user_language, if_match)
+    response.headers["ETag"] = version_etag(result["data"]["version"])
+    return result
 
 @router.delete("/delete", response_model=StandardResponse)
-async def delete_user(current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def delete_user(if_match: Optional[str] = IF_MATCH, current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Delete user account"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.delete_user(current_user["_id"], user_language)
+    return await profile_controller.delete_user(current_user["_id"], user_language, if_match)
 
 @router.get("/is-active", response_model=StandardResponse)
-async def is_active(current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def is_active(current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Check if user account is active"""
     user_language = getattr(http_request.state, 'user_language', 'en')
     return await profile_controller.is_active(current_user["_id"], user_language)
 
 @router.get("/user", response_model=StandardResponse)
-async def get_user(current_user: dict = Depends(get_current_user), http_request: Request = None):
-    """Get current user's profile"""
+async def get_user(current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
+    """Get current user's profile (ETag "<version>"; If-None-Match returns 304 when unchanged)"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.get_user(current_user["_id"], user_language)
+    # get_current_user just loaded the user, so a revalidation is answered without building the profile
+    unchanged = not_modified(http_request, current_user.get("version", 0))
+    if unchanged is not None:
+        return unchanged
+    result = await profile_controller.get_user(current_user["_id"], user_language)
+    return versioned_json(result, result["data"]["version"])
 
 @router.get("/welcome1", response_model=StandardResponse)
-async def welcome1(current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def welcome1(current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Check user's welcome status"""
     user_language = getattr(http_request.state, 'user_language', 'en')
     return await profile_controller.welcome1(current_user["_id"], user_language)
 
 @router.put("/welcome2", response_model=StandardResponse)
-async def welcome2(current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def welcome2(response: Response, if_match: Optional[str] = IF_MATCH, current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Update user's welcome status"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.welcome2(current_user["_id"], user_language)
+    result = await profile_controller.welcome2(current_user["_id"], user_language, if_match)
+    response.headers["ETag"] = version_etag(result["data"]["version"])
+    return result
 
 @router.put("/update-token", response_model=StandardResponse)
-async def update_token(request: UpdateTokenRequest, current_user: dict = Depends(get_current_user), http_request: Request = None):
+async def update_token(request: UpdateTokenRequest, response: Response, if_match: Optional[str] = IF_MATCH, current_user: dict = Depends(get_current_user), http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     """Update user's notification token"""
     user_language = getattr(http_request.state, 'user_language', 'en')
-    return await profile_controller.update_token(current_user["_id"], request.notificationToken, user_language) 
+    result = await profile_controller.update_token(current_user["_id"], request.notificationToken, user_language, if_match)
+    response.headers["ETag"] = version_etag(result["data"]["version"])
+    return result
 
 @router.get("/debug-name/{user_id}", response_model=StandardResponse)
-async def debug_user_name(user_id: str, http_request: Request = None):
+async def debug_user_name(user_id: str, http_request: Request = None, profile_controller: ProfileController = Depends(get_profile_controller)):
     language = http_request.headers.get("Accept-Language", "en")[:2] if http_request else "en"
     if language not in ["en", "fr"]:
         language = "en"
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from controllers.sync_controller import SyncController
+from services.container import get_sync_controller
+from middleware.auth import get_current_user
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.get("", response_model=dict)
+async def sync(
+    since: Optional[str] = Query(None, description="next_token from the previous sync; omit for a full sync"),
+    limit: int = Query(100, ge=1, le=500, description="Maximum chats and maximum messages per page"),
+    current_user: dict = Depends(get_current_user),
+    sync_controller: SyncController = Depends(get_sync_controller)
+):
+    """
+    Retrieve chats and messages created, updated or deleted since the last sync
+    """
+    user_id = current_user["_id"]
+    user_language = current_user.get("language", "english")
+    
+    # Convert database language to locale code for get_message
+    if user_language == "french":
+        locale_code = "fr"
+    else:
+        locale_code = "en"
+    
+    return await sync_controller.sync(user_id, since, limit, locale_code)
@@ -31,3 +31,8 @@ class LanguageRequest(str, Enum):
         if request_lang == cls.fr:
             return Language.FRENCH.value
         return Language.ENGLISH.value
+
+class ChatStatus(str, Enum):
+    """Chat status values that can be filtered on"""
+    ACTIVE = "active"
+    ARCHIVED = "archived"
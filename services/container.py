@@ -0,0 +1,107 @@
+import logging
+import database
+from controllers.admin_controller import AdminController
+from controllers.auth_controller import AuthController
+from controllers.chat_controller import ChatController
+from controllers.export_controller import ExportController
+from controllers.message_controller import MessageController
+from controllers.profile_controller import ProfileController
+from controllers.sync_controller import SyncController
+from services.firebase import close_firebase_rest, get_firebase_auth, get_firebase_rest
+from services.job_queue import bot_job_queue
+from services.llm_provider import close_llm_provider, get_llm_provider
+from services.openai import get_openai_service
+from services.pubsub import message_broker
+from services.response_cache import response_cache
+from services.shared_state import close_shared_state, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    One instance of each service and controller per process. Routes receive the
+    controllers through Depends (see the get_*_controller providers below), so
+    HTTP pools, caches and the Firebase facade are built once and shared.
+    """
+
+    def __init__(self):
+        # Clients and caches
+        self.mongo_client = database.connect()
+        self.shared_state = get_shared_state()
+        self.llm_provider = get_llm_provider()
+        self.response_cache = response_cache
+        self.firebase = get_firebase_auth()
+        self.firebase_rest = get_firebase_rest()
+        self.openai_service = get_openai_service()
+        self.bot_job_queue = bot_job_queue
+        self.message_broker = message_broker
+
+        # Controllers
+        self.auth_controller = AuthController(self.firebase, self.firebase_rest)
+        self.profile_controller = ProfileController(self.firebase)
+        self.chat_controller = ChatController(self.openai_service)
+        self.message_controller = MessageController(self.openai_service)
+        self.export_controller = ExportController(self.message_controller)
+        self.sync_controller = SyncController(self.message_controller)
+        self.admin_controller = AdminController()
+
+    async def aclose(self):
+        """Release pooled clients (producers such as the bot workers are stopped first)"""
+        await close_shared_state()
+        await close_llm_provider()
+        await close_firebase_rest()
+        database.close_client()
+
+
+_container = None
+
+
+def create_container() -> ServiceContainer:
+    """Build the container (called from the app lifespan, so clients bind to the running loop)"""
+    global _container
+    if _container is None:
+        _container = ServiceContainer()
+        logger.info("service container created")
+    return _container
+
+
+def get_container() -> ServiceContainer:
+    """Return the process-wide container, creating it on first use (e.g. without a lifespan)"""
+    return _container or create_container()
+
+
+async def close_container():
+    global _container
+    if _container is not None:
+        await _container.aclose()
+        _container = None
+
+
+# FastAPI dependencies
+def get_auth_controller() -> AuthController:
+    return get_container().auth_controller
+
+
+def get_profile_controller() -> ProfileController:
+    return get_container().profile_controller
+
+
+def get_chat_controller() -> ChatController:
+    return get_container().chat_controller
+
+
+def get_message_controller() -> MessageController:
+    return get_container().message_controller
+
+
+def get_export_controller() -> ExportController:
+    return get_container().export_controller
+
+
+def get_sync_controller() -> SyncController:
+    return get_container().sync_controller
+
+
+def get_admin_controller() -> AdminController:
+    return get_container().admin_controller
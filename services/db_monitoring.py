@@ -0,0 +1,115 @@
+import threading
+import time
+from pymongo import monitoring
+from services import metrics
+from services.profiling import record_timing
+
+POOL_EVENTS = ("connections_created", "connections_closed", "checked_out", "checked_in", "checkout_failed", "pool_cleared")
+
+# Exported on /metrics; events fire on driver threads, and the metric types update without locks
+mongodb_pool_events = metrics.counter("mongodb_pool_events_total", "MongoDB connection pool events", ("event",))
+mongodb_pool_checkout_wait = metrics.histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled MongoDB connection"
+)
+mongodb_command_duration = metrics.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by command name", ("command",)
+)
+mongodb_command_failures = metrics.counter("mongodb_command_failures_total", "Failed MongoDB commands", ("command",))
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    CMAP listener: connection counts and how long requests wait to check out
+    a pooled connection.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _inc(self, event: str):
+        mongodb_pool_events.inc((event,))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc("connections_closed")
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failed")
+
+    def connection_checked_out(self, event):
+        # Newer drivers report the wait on the event; otherwise time it per thread
+        duration = getattr(event, "duration", None)
+        if duration is None:
+            started = getattr(self._local, "started", None)
+            duration = (time.perf_counter() - started) if started is not None else 0.0
+        self._inc("checked_out")
+        mongodb_pool_checkout_wait.observe(duration)
+
+    def connection_checked_in(self, event):
+        self._inc("checked_in")
+
+    def snapshot(self) -> dict:
+        values = mongodb_pool_events.values()
+        counters = {event: int(values.get((event,), 0)) for event in POOL_EVENTS}
+        return {
+            **counters,
+            "in_use": counters["checked_out"] - counters["checked_in"],
+            "open": counters["connections_created"] - counters["connections_closed"],
+            "checkout_wait": mongodb_pool_checkout_wait.snapshot()
+        }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Command listener: latency per command name (find, insert, update, ...)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1_000_000, (event.command_name,))
+        record_timing(f"mongo.{event.command_name}", event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1_000_000, (event.command_name,))
+        record_timing(f"mongo.{event.command_name}", event.duration_micros / 1_000_000)
+        mongodb_command_failures.inc((event.command_name,))
+
+    def snapshot(self) -> dict:
+        failures = mongodb_command_failures.values()
+        return {
+            labels[0]: {**mongodb_command_duration.snapshot(labels), "failures": int(failures.get(labels, 0))}
+            for labels in mongodb_command_duration.values()
+        }
+
+
+# Registered on the Motor client in database.create_client()
+pool_monitor = PoolMonitor()
+command_monitor = CommandMonitor()
+
+
+def _pool_gauges() -> dict:
+    snapshot = pool_monitor.snapshot()
+    return {("open",): snapshot["open"], ("in_use",): snapshot["in_use"]}
+
+
+metrics.callback_gauge("mongodb_pool_connections", "MongoDB pooled connections (open, in_use)", _pool_gauges, ("state",))
@@ -0,0 +1,105 @@
+import hashlib
+from typing import Optional
+from fastapi import HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from locales import get_message
+
+# Clients may keep a copy but must revalidate it (If-None-Match) before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def version_etag(version: int) -> str:
+    """Strong entity tag of a stored document version, as compared by If-Match"""
+    return f'"{version}"'
+
+
+def _opaque_tags(header: str) -> set:
+    """Entity tags listed in an If-None-Match header, without the weak prefix"""
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag:
+            tags.add(tag[2:] if tag.startswith("W/") else tag)
+    return tags
+
+
+def _none_match(request: Request, etag: str) -> bool:
+    """True when If-None-Match lists etag (weak comparison) or is a wildcard"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = _opaque_tags(if_none_match)
+    return "*" in tags or (etag[2:] if etag.startswith("W/") else etag) in tags
+
+
+def conditional_json(request: Request, payload) -> Response:
+    """
+    Render a JSON payload with a weak ETag (hash of the body). When the client's
+    If-None-Match already lists that tag, answer 304 Not Modified without a body.
+    """
+    response = JSONResponse(jsonable_encoder(payload))
+    etag = f'W/"{hashlib.sha1(response.body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if _none_match(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return response
+
+
+def not_modified(request: Request, version: int) -> Optional[Response]:
+    """
+    304 Not Modified when If-None-Match already holds this document version.
+    Checked against the stored version before the response body is loaded.
+    """
+    etag = version_etag(version)
+    if _none_match(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def versioned_json(payload, version: int) -> Response:
+    """Render a single document with its version as the ETag, so it can be sent back in If-Match"""
+    return JSONResponse(
+        jsonable_encoder(payload),
+        headers={"ETag": version_etag(version), "Cache-Control": CACHE_CONTROL}
+    )
+
+
+def if_match_version(if_match: Optional[str], language: str = "en") -> Optional[int]:
+    """
+    Version required by an If-Match header; None when the header is absent or "*".
+
+    Only strong version tags ("3") can match; weak or foreign tags fail the
+    precondition, so a 412 is raised before anything is written.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+        return int(tag[1:-1])
+    raise precondition_failed(language)
+
+
+def ensure_version(document: dict, expected_version: Optional[int], language: str = "en"):
+    """Raise 412 unless the document is at the version the client last saw"""
+    if expected_version is not None and document.get("version", 0) != expected_version:
+        raise precondition_failed(language)
+
+
+def version_filter(expected_version: Optional[int]) -> dict:
+    """Update filter clause that matches only the expected version (unversioned documents are version 0)"""
+    if expected_version is None:
+        return {}
+    if expected_version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": expected_version}
+
+
+def precondition_failed(language: str = "en") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=get_message(language, "general.precondition_failed")
+    )
@@ -1,12 +1,29 @@
-import firebase_admin
-from firebase_admin import credentials, auth
+import asyncio
+import logging
 import os
-from dotenv import load_dotenv
+import threading
+from typing import TYPE_CHECKING, Optional
+from config import load_env
+from services.tracing import TracingTransport
 
-load_dotenv()
+if TYPE_CHECKING:
+    import httpx
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Firebase Auth REST endpoint (overridable to point at an emulator or a load-test stub)
+FIREBASE_AUTH_URL = os.getenv("FIREBASE_AUTH_URL", "https://identitytoolkit.googleapis.com/v1").rstrip("/")
+# Web API key for the REST endpoint (password sign-in is not part of the Admin SDK)
+FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY")
 
 def initialize_admin():
     """Initialize Firebase Admin SDK"""
+    # Imported here: firebase_admin pulls in the Google auth/HTTP stack, which
+    # is slow to import and only needed once a Firebase call is made
+    import firebase_admin
+    from firebase_admin import credentials, auth
     # Check if we're in a test environment
     if os.getenv("PYTEST_CURRENT_TEST") or "pytest" in os.getenv("_", ""):
         # Return a mock Firebase admin for testing
@@ -58,18 +75,14 @@ def initialize_admin():
             "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_X509_CERT_URL"),
             "universe_domain": os.getenv("FIREBASE_UNIVERSE_DOMAIN")
         }
-        # print("================== FIREBASE CONFIG ===================================")
-        # print(firebase_config)
-        # print("================== FIREBASE CONFIG ===================================")
         try:
             cred = credentials.Certificate(firebase_config)
             firebase_admin.initialize_app(cred)
-            print("✅ Firebase Admin initialized successfully!")
+            logger.info("Firebase Admin initialized")
             return firebase_admin
         except Exception as e:
-            print(f"❌ Firebase initialization failed: {str(e)}")
-            print("🔧 Please check your Firebase credentials in .env file")
-            print("💡 The app will continue without Firebase authentication")
+            logger.error("Firebase initialization failed, continuing without Firebase authentication "
+                         "(check the FIREBASE_* credentials): %s", e)
             # Return a mock object so the app doesn't crash
             from unittest.mock import Mock
             mock_admin = Mock()
@@ -87,6 +100,93 @@ def initialize_admin():
             
             return mock_admin
 
+class FirebaseAuth:
+    """
+    Async facade over firebase_admin.auth. The SDK is imported and initialized on
+    the first call, and every call runs on a worker thread (the SDK is synchronous).
+    """
+
+    def __init__(self):
+        self._admin = None
+        self._lock = threading.Lock()
+
+    @property
+    def admin(self):
+        if self._admin is None:
+            with self._lock:
+                if self._admin is None:
+                    self._admin = initialize_admin()
+        return self._admin
+
+    async def call(self, method: str, *args, **kwargs):
+        """Call firebase_admin.auth.<method>(*args, **kwargs) off the event loop"""
+        def run():
+            return getattr(self.admin.auth, method)(*args, **kwargs)
+
+        return await asyncio.to_thread(run)
+
+
+_firebase_auth = None
+
+
+def get_firebase_auth() -> FirebaseAuth:
+    """Process-wide facade shared by the auth and profile controllers"""
+    global _firebase_auth
+    if _firebase_auth is None:
+        _firebase_auth = FirebaseAuth()
+    return _firebase_auth
+
+
+class FirebaseRestClient:
+    """Firebase Auth REST API over one pooled HTTP client shared by every login"""
+
+    def __init__(self, base_url: str = FIREBASE_AUTH_URL, api_key: Optional[str] = FIREBASE_API_KEY):
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            # Imported on first use, keeping it off the startup path
+            import httpx
+            self._client = httpx.AsyncClient(base_url=self.base_url, transport=TracingTransport())
+        return self._client
+
+    async def sign_in_with_password(self, email: str, password: str) -> "httpx.Response":
+        return await self.client.post(
+            "/accounts:signInWithPassword",
+            params={"key": self.api_key},
+            json={"email": email, "password": password, "returnSecureToken": True}
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_firebase_rest = None
+
+
+def get_firebase_rest() -> FirebaseRestClient:
+    """Process-wide REST client used for password sign-in"""
+    global _firebase_rest
+    if _firebase_rest is None:
+        _firebase_rest = FirebaseRestClient()
+    return _firebase_rest
+
+
+async def close_firebase_rest():
+    """Close the REST client's connection pool (called on app shutdown)"""
+    if _firebase_rest is not None:
+        await _firebase_rest.aclose()
+
+
 def get_firebase_admin():
-    """Get Firebase Admin instance"""
-    return firebase_admin
+    """Get Firebase Admin instance (initialized on first use)"""
+    return get_firebase_auth().admin
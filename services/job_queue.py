@@ -0,0 +1,208 @@
+import logging
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import load_env
+from database import bot_jobs
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# "sync" generates the bot reply inside POST /chat/{chat_id}/message,
+# "async" acknowledges the user message and hands generation to the worker pool
+BOT_REPLY_MODE = os.getenv("BOT_REPLY_MODE", "sync")
+BOT_WORKER_CONCURRENCY = int(os.getenv("BOT_WORKER_CONCURRENCY", "8"))
+BOT_JOB_LEASE_SECONDS = int(os.getenv("BOT_JOB_LEASE_SECONDS", "60"))
+BOT_JOB_MAX_ATTEMPTS = int(os.getenv("BOT_JOB_MAX_ATTEMPTS", "3"))
+BOT_JOB_POLL_INTERVAL = float(os.getenv("BOT_JOB_POLL_INTERVAL", "1.0"))
+
+JOB_PENDING = "pending"
+JOB_PROCESSING = "processing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class BotJobQueue:
+    """
+    Durable queue of bot reply jobs stored in the bot_jobs collection.
+
+    Workers claim a job by atomically moving it to "processing" with a lease;
+    a job whose lease expires (worker crashed) becomes claimable again.
+    """
+
+    def __init__(self, collection=bot_jobs):
+        self.collection = collection
+        # Wakes idle workers in this process as soon as a job is enqueued
+        self.wakeup = asyncio.Event()
+        # job_id -> events of the requests waiting on the job, set when it finishes in this process
+        self._waiters = {}
+
+    async def enqueue(self, chat_id: str, user_id: str, user_message_id: str, user_message_at: datetime, user_language: str, use_cache: bool = True) -> str:
+        """Persist a new job and return its id"""
+        now = datetime.now(timezone.utc)
+        job = {
+            "chatId": chat_id,
+            "userId": user_id,
+            "userMessageId": user_message_id,
+            "userMessageAt": user_message_at,
+            "language": user_language,
+            "useCache": use_cache,
+            "status": JOB_PENDING,
+            "attempts": 0,
+            "availableAt": now,
+            "leaseExpiresAt": None,
+            "botMessageId": None,
+            "error": None,
+            "createdAt": now,
+            "updatedAt": now,
+            "finishedAt": None
+        }
+        result = await self.collection.insert_one(job)
+        self.wakeup.set()
+        return str(result.inserted_id)
+
+    async def claim(self) -> Optional[dict]:
+        """Claim the oldest available job, or return None if the queue is empty"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": JOB_PENDING, "availableAt": {"$lte": now}},
+                    {"status": JOB_PROCESSING, "leaseExpiresAt": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": JOB_PROCESSING,
+                    "leaseExpiresAt": now + timedelta(seconds=BOT_JOB_LEASE_SECONDS),
+                    "updatedAt": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("availableAt", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def complete(self, job_id: ObjectId, bot_message_id: Optional[str]):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": JOB_DONE,
+                "botMessageId": bot_message_id,
+                "leaseExpiresAt": None,
+                "updatedAt": now,
+                "finishedAt": now
+            }}
+        )
+        self._notify(job_id)
+
+    async def fail(self, job: dict, error: str):
+        """Retry with exponential backoff, or mark the job failed after the last attempt"""
+        now = datetime.now(timezone.utc)
+        if job.get("attempts", 1) >= BOT_JOB_MAX_ATTEMPTS:
+            update = {"status": JOB_FAILED, "finishedAt": now}
+        else:
+            backoff = 2 ** job.get("attempts", 1)
+            update = {"status": JOB_PENDING, "availableAt": now + timedelta(seconds=backoff)}
+        update.update({"error": error, "leaseExpiresAt": None, "updatedAt": now})
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+        if update["status"] == JOB_FAILED:
+            self._notify(job["_id"])
+
+    async def get(self, job_id: ObjectId, user_id: str, chat_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id, "userId": user_id, "chatId": chat_id})
+
+    async def wait_for(self, job_id: ObjectId, user_id: str, chat_id: str, timeout: float) -> Optional[dict]:
+        """
+        Long-poll until the job is done/failed or the timeout elapses.
+        Jobs finished in this process wake the waiter immediately; jobs finished by
+        another process are picked up by re-reading the job every poll interval.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # One event per waiter: concurrent waiters on a job each get the signal
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        try:
+            while True:
+                job = await self.get(job_id, user_id, chat_id)
+                if job is None or job["status"] in (JOB_DONE, JOB_FAILED):
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, BOT_JOB_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            events = self._waiters.get(job_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[job_id]
+
+    def _notify(self, job_id: ObjectId):
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+
+class BotWorkerPool:
+    """Runs bot reply jobs on a fixed number of asyncio worker tasks"""
+
+    def __init__(self, queue: BotJobQueue, handler: Callable[[dict], Awaitable[Optional[str]]], concurrency: int = BOT_WORKER_CONCURRENCY):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"bot-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+        logger.info("started %d bot reply workers", self.concurrency)
+
+    async def stop(self):
+        self._stopping = True
+        self.queue.wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                job = await self.queue.claim()
+            except Exception as error:
+                logger.warning("claiming bot job failed: %s", error)
+                await asyncio.sleep(BOT_JOB_POLL_INTERVAL)
+                continue
+
+            if job is None:
+                # Idle: wait for a local enqueue, or poll for jobs from other processes
+                self.queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.queue.wakeup.wait(), timeout=BOT_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                bot_message_id = await self.handler(job)
+                await self.queue.complete(job["_id"], bot_message_id)
+            except Exception as error:
+                logger.exception("error processing bot job", extra={"job_id": str(job["_id"])})
+                await self.queue.fail(job, str(error))
+
+
+# Shared by the message controller (enqueue/long-poll) and the worker pool
+bot_job_queue = BotJobQueue()
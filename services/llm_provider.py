@@ -0,0 +1,245 @@
+import logging
+import asyncio
+import hashlib
+import json
+import os
+import random
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+from config import load_env
+from services.tracing import TracingTransport
+
+if TYPE_CHECKING:
+    import httpx
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Provider configuration
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")  # openai | mock
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+LLM_API_KEY = os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+# Per-feature models: a small model is enough for chat names
+LLM_CHAT_NAME_MODEL = os.getenv("LLM_CHAT_NAME_MODEL", LLM_MODEL)
+LLM_REPLY_MODEL = os.getenv("LLM_REPLY_MODEL", LLM_MODEL)
+LLM_EMBEDDING_MODEL = os.getenv("LLM_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Mock provider configuration (offline load testing)
+LLM_MOCK_LATENCY = os.getenv("LLM_MOCK_LATENCY", "fixed:0.5")
+LLM_MOCK_TOKEN_DELAY = float(os.getenv("LLM_MOCK_TOKEN_DELAY", "0.02"))
+LLM_MOCK_SEED = int(os.getenv("LLM_MOCK_SEED", "42"))
+
+
+class LLMProvider(ABC):
+    """
+    Interface for chat completion backends.
+
+    Request bodies are OpenAI chat completion JSON (already encoded), so the
+    pre-encoded templates in services/openai.py work with every provider.
+    """
+    name = "base"
+
+    @property
+    def is_configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def chat_completion(self, body: bytes, timeout: float) -> Optional[str]:
+        """Return the completion text, or None if the backend failed"""
+
+    @abstractmethod
+    def stream_chat_completion(self, body: bytes, timeout: float) -> AsyncIterator[str]:
+        """Yield the completion text token by token (body must set "stream": true)"""
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """Return an embedding vector for text, or None if unsupported/failed"""
+        return None
+
+    async def aclose(self):
+        """Release network resources"""
+        return None
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any backend that speaks the OpenAI /chat/completions API"""
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: Optional[str] = LLM_API_KEY):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self._client = None
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # One pooled client per provider instead of a new connection per call
+        if self._client is None or self._client.is_closed:
+            # Imported on first use, keeping it off the startup path
+            import httpx
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers, transport=TracingTransport())
+        return self._client
+
+    async def chat_completion(self, body: bytes, timeout: float) -> Optional[str]:
+        response = await self.client.post("/chat/completions", content=body, timeout=timeout)
+        if response.status_code != 200:
+            logger.warning("LLM API error %d: %s", response.status_code, response.text[:500])
+            return None
+        data = response.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def stream_chat_completion(self, body: bytes, timeout: float) -> AsyncIterator[str]:
+        async with self.client.stream("POST", "/chat/completions", content=body, timeout=timeout) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.warning("LLM API error %d: %s", response.status_code, response.text[:500])
+                return
+            # Server-sent events: "data: {...}" lines terminated by "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):]
+                if payload == "[DONE]":
+                    return
+                delta = json.loads(payload)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        response = await self.client.post(
+            "/embeddings",
+            json={"model": LLM_EMBEDDING_MODEL, "input": text},
+            timeout=5.0
+        )
+        if response.status_code != 200:
+            logger.warning("LLM embeddings error %d: %s", response.status_code, response.text[:500])
+            return None
+        return response.json()["data"][0]["embedding"]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LatencyDistribution:
+    """
+    Seeded latency sampler parsed from a spec string (seconds):
+    "fixed:0.5", "uniform:0.2,1.5", "normal:0.8,0.2", "lognormal:-0.5,0.4", "exponential:0.7"
+    """
+
+    def __init__(self, spec: str, seed: int = LLM_MOCK_SEED):
+        self.spec = spec
+        self.random = random.Random(seed)
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(value) for value in params.split(",") if value.strip()]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            value = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            value = self.random.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            value = self.random.gauss(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            value = self.random.lognormvariate(self.params[0], self.params[1])
+        else:
+            value = self.random.expovariate(1.0 / self.params[0])
+        return max(0.0, value)
+
+
+MOCK_REPLIES = (
+    "I'm here with you. Can you tell me a little more about what's on your mind?",
+    "That sounds like a lot to carry. What has been the hardest part of it for you?",
+    "Thank you for sharing that. How have you been taking care of yourself lately?",
+    "It makes sense to feel that way. Would a short breathing exercise help right now?",
+    "I hear you. What would feel like a small, manageable next step today?"
+)
+
+MOCK_CHAT_NAMES = ("New Journey", "Fresh Start", "Let's Talk", "New Beginning")
+
+
+class MockLLMProvider(LLMProvider):
+    """
+    Local deterministic backend for offline load tests and benchmarks.
+
+    The reply depends only on the last message in the request (same prompt,
+    same reply); latency is drawn from a seeded distribution and streamed
+    tokens are spaced by a fixed per-token delay.
+    """
+    name = "mock"
+
+    def __init__(self, latency: str = LLM_MOCK_LATENCY, token_delay: float = LLM_MOCK_TOKEN_DELAY, seed: int = LLM_MOCK_SEED):
+        self.latency = LatencyDistribution(latency, seed)
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def _reply_for(self, body: bytes) -> str:
+        request = json.loads(body)
+        last_message = request["messages"][-1]["content"] if request.get("messages") else ""
+        digest = int(hashlib.sha256(last_message.encode("utf-8")).hexdigest(), 16)
+        # Short completions (chat names) get a short answer
+        if request.get("max_tokens", 0) <= 20:
+            return MOCK_CHAT_NAMES[digest % len(MOCK_CHAT_NAMES)]
+        return MOCK_REPLIES[digest % len(MOCK_REPLIES)]
+
+    async def chat_completion(self, body: bytes, timeout: float) -> Optional[str]:
+        self.calls += 1
+        reply = self._reply_for(body)
+        await asyncio.sleep(min(self.latency.sample(), timeout))
+        return reply
+
+    async def stream_chat_completion(self, body: bytes, timeout: float) -> AsyncIterator[str]:
+        self.calls += 1
+        reply = self._reply_for(body)
+        # Time to first token comes from the latency distribution
+        await asyncio.sleep(min(self.latency.sample(), timeout))
+        words = reply.split(" ")
+        for index, word in enumerate(words):
+            yield word if index == 0 else " " + word
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        # Hashed bag-of-words, enough to exercise the similarity cache offline
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % 64] += 1.0
+        return vector
+
+
+def create_llm_provider(provider_name: str = LLM_PROVIDER) -> LLMProvider:
+    """Build the provider selected by LLM_PROVIDER"""
+    if provider_name == "mock":
+        return MockLLMProvider()
+    if provider_name == "openai":
+        return OpenAICompatibleProvider()
+    raise ValueError(f"Unknown LLM provider: {provider_name}")
+
+
+_llm_provider = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """Process-wide provider shared by every OpenAIService instance"""
+    global _llm_provider
+    if _llm_provider is None:
+        _llm_provider = create_llm_provider()
+    return _llm_provider
+
+
+async def close_llm_provider():
+    """Close the provider's HTTP connection pool (called on app shutdown)"""
+    if _llm_provider is not None:
+        await _llm_provider.aclose()
@@ -0,0 +1,173 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from config import load_env
+from services import metrics
+from services.tracing import current_trace_id
+
+load_env()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-logger overrides, e.g. "services.openai=DEBUG,pymongo=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# httpx logs every request URL at INFO, and the Firebase sign-in URL carries the API key
+DEFAULT_LOG_LEVELS = "httpx=WARNING,httpcore=WARNING"
+# json (one object per line, for log shippers) or text (for local development)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Fraction of high-volume success records (log_sampled) that are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+# Records waiting for the writer thread; further records are dropped rather than blocking requests
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Set per request by middleware.request_logging.RequestLoggingMiddleware
+request_id_var: ContextVar[str] = ContextVar("request_id", default="")
+
+# LogRecord attributes that are not user-supplied "extra" fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Runs on the calling thread before the record is queued and stamps the
+    request id and, when tracing is on, the trace id (the writer thread cannot
+    see the request's context).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        trace_id = current_trace_id()
+        if trace_id:
+            record.trace_id = trace_id
+        return True
+
+
+def log_sampled(logger: logging.Logger, message: str, **fields):
+    """
+    INFO record for high-volume successes, kept for LOG_SAMPLE_RATE of calls.
+    The decision is made before the record is built, so skipped calls cost
+    almost nothing. Kept records carry "sampled": true.
+    """
+    if random.random() < LOG_SAMPLE_RATE and logger.isEnabledFor(logging.INFO):
+        logger.info(message, extra={**fields, "sampled": True})
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records when the queue is full instead of blocking"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here (so later mutation of them cannot change the
+        # line); formatting happens on the writer thread. This handler is the only
+        # one on the root logger, so the record is updated in place rather than copied.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, request id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", "")
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = ""
+        line = super().format(record)
+        extra = {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES and not key.startswith("_")}
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, levels: str = LOG_LEVELS):
+    """
+    Route the root logger through a bounded queue to a writer thread, so
+    request handlers only pay for building the record. Safe to call again.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _queue_handler
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for item in f"{DEFAULT_LOG_LEVELS},{levels}".split(","):
+        name, _, logger_level = item.partition("=")
+        if name.strip() and logger_level.strip():
+            logging.getLogger(name.strip()).setLevel(logger_level.strip().upper())
+
+    # Uvicorn's server logs go through the queue too; its access log is replaced by
+    # middleware.request_logging (sampled, with route templates instead of raw paths)
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+metrics.callback_counter("log_records_dropped_total", "Log records dropped because the log queue was full", dropped_records)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from config import load_env
+from services import metrics
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+# How often the probe task wakes up; lag is how late it wakes
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+# A single callback holding the loop this long counts as blocking
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+# Debug mode: a watchdog thread logs the stack of whatever is blocking the loop
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "false").lower() == "true"
+
+event_loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer scheduled every LOOP_MONITOR_INTERVAL_MS",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+event_loop_blocked = metrics.counter("event_loop_blocked_total", "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD_MS")
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag with a probe task, and optionally watches for blocking.
+
+    The probe sleeps for the interval and records how late it wakes up: time
+    spent in callbacks that never yield (sync I/O, heavy CPU) shows up as lag.
+    In watchdog mode a thread checks the probe's heartbeat. When the loop has not
+    ticked for the threshold, it logs the loop thread's current Python stack and
+    the running task, which points at the blocking call while it still blocks.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+                 watchdog: bool = LOOP_WATCHDOG):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.watchdog = watchdog
+        self._task = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._probe(), name="loop-monitor")
+        if self.watchdog:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+        logger.info("event loop monitor started", extra={"watchdog": self.watchdog})
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            event_loop_lag.observe(lag)
+            if lag >= self.threshold:
+                event_loop_blocked.inc()
+
+    def _watch(self):
+        reported = False
+        # Check a few times per threshold so a block is caught while it is happening
+        while not self._stopping.wait(self.threshold / 4):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            # One report per blocking episode
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            # current_task() only works from the loop's own thread; read its table directly
+            task = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+            logger.warning("event loop blocked", extra={
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "task": task.get_name() if task is not None else None,
+                "stack": "".join(traceback.format_stack(frame, limit=30))
+            })
+
+
+# Started and stopped in the app lifespan (one per worker process)
+loop_monitor = LoopMonitor()
@@ -0,0 +1,297 @@
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+from config import load_env
+from services.profiling import record_timing
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# GET /metrics is mounted only when set, and requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class _ThreadCells:
+    """
+    Per-thread value maps. Each thread only writes its own map, so updates take
+    no lock (Motor and pool events arrive on driver threads, requests on the
+    event loop); maps are summed when metrics are collected.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._maps = []
+        # Taken once per thread on its first write, and when collecting
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = self._local.cells = {}
+            with self._lock:
+                self._maps.append(cells)
+            return cells
+
+    def maps(self) -> list:
+        with self._lock:
+            return list(self._maps)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yield (suffix, formatted labels, value)"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonic count per label set"""
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._cells = _ThreadCells()
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        cells = self._cells.get()
+        cells[labels] = cells.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals = {}
+        for cells in self._cells.maps():
+            for labels, value in cells.copy().items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.values().items()):
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. requests in flight)"""
+    type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+
+class CallbackGauge(Metric):
+    """Gauge read from a callback when collected: returns a number or {labels: number}"""
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            yield "", _format_labels(self.labelnames, labels), value
+
+
+class CallbackCounter(CallbackGauge):
+    """Counter kept elsewhere (e.g. an existing stats dict), read when collected"""
+    type = "counter"
+
+
+class Histogram(Metric):
+    """Bucketed observations per label set (Prometheus cumulative "le" buckets)"""
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._cells = _ThreadCells()
+        # Cell layout: one count per bucket, the +Inf bucket, then sum, count, max
+        self._size = len(self.buckets) + 4
+
+    def observe(self, value: float, labels: Labels = ()):
+        cells = self._cells.get()
+        cell = cells.get(labels)
+        if cell is None:
+            cell = cells[labels] = [0] * self._size
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-3] += value
+        cell[-2] += 1
+        if value > cell[-1]:
+            cell[-1] = value
+
+    @contextmanager
+    def time(self, labels: Labels = ()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    def values(self) -> Dict[Labels, list]:
+        totals = {}
+        for cells in self._cells.maps():
+            for labels, cell in cells.copy().items():
+                cell = list(cell)
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = cell
+                else:
+                    for index in range(self._size - 1):
+                        total[index] += cell[index]
+                    total[-1] = max(total[-1], cell[-1])
+        return totals
+
+    def snapshot(self, labels: Labels = ()) -> dict:
+        """Summary of one label set in the db_monitoring snapshot format"""
+        cell = self.values().get(labels) or [0] * self._size
+        count, total = cell[-2], cell[-3]
+        return {
+            "count": count,
+            "total_seconds": total,
+            "avg_seconds": (total / count) if count else 0.0,
+            "max_seconds": cell[-1],
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], cell[:len(self.buckets) + 1]))
+        }
+
+    def samples(self):
+        bounds = [*map(_format_value, self.buckets), "+Inf"]
+        for labels, cell in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, cell):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, labels, f'le="{bound}"'), cumulative
+            yield "_sum", _format_labels(self.labelnames, labels), cell[-3]
+            yield "_count", _format_labels(self.labelnames, labels), cell[-2]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        sections = []
+        for metric in list(self._metrics.values()):
+            try:
+                sections.append(metric.render())
+            except Exception:
+                logger.exception("error collecting metric %s", metric.name)
+        return "\n".join(sections) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return registry.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return registry.register(Gauge(name, help_text, labelnames))
+
+
+def callback_gauge(name: str, help_text: str, callback: Callable, labelnames: Tuple[str, ...] = ()) -> CallbackGauge:
+    return registry.register(CallbackGauge(name, help_text, callback, labelnames))
+
+
+def callback_counter(name: str, help_text: str, callback: Callable, labelnames: Tuple[str, ...] = ()) -> CallbackCounter:
+    return registry.register(CallbackCounter(name, help_text, callback, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help_text, labelnames, buckets))
+
+
+# HTTP (recorded by middleware.metrics.MetricsMiddleware)
+http_requests = counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_request_duration = histogram("http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+http_requests_in_flight = gauge("http_requests_in_flight", "HTTP requests currently being handled", ("method",))
+
+# Upstream calls
+llm_request_duration = histogram(
+    "llm_request_duration_seconds", "LLM provider call latency", ("operation", "outcome"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+firebase_request_duration = histogram(
+    "firebase_request_duration_seconds", "Firebase Auth call latency", ("operation", "outcome"),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+@contextmanager
+def track(histogram_metric: Histogram, operation: str):
+    """
+    Time an upstream call. The outcome label is "ok" unless the block raises
+    ("error") or sets outcome["value"] itself (e.g. "fallback"). The time also
+    goes to the slow request breakdown, as "llm.reply", "firebase.get_user", ...
+    """
+    outcome = {"value": "ok"}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except BaseException:
+        outcome["value"] = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        histogram_metric.observe(duration, (operation, outcome["value"]))
+        record_timing(f"{histogram_metric.name.partition('_')[0]}.{operation}", duration)
+
+
+def render_metrics() -> str:
+    return registry.render()
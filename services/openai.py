@@ -1,112 +1,188 @@
-import openai
-import os
-from dotenv import load_dotenv
+import logging
+import json
+import random
 from datetime import datetime
+from types import MappingProxyType
+from typing import AsyncIterator
 import asyncio
-import httpx
+from services.llm_provider import get_llm_provider, LLMProvider, LLM_CHAT_NAME_MODEL, LLM_REPLY_MODEL
+from services.response_cache import response_cache
+from services.metrics import llm_request_duration, track
+from services.tracing import span
+from services.log import log_sampled
+
+logger = logging.getLogger(__name__)
+
+CHAT_NAME_SYSTEM_PROMPT = "You are a helpful assistant that generates short, friendly names for chat sessions in a psychological support app. Respond with only the chat name, nothing else."
+
+# Prompts are immutable and keyed by language code so they are built once per process
+CHAT_NAME_PROMPTS = MappingProxyType({
+    "fr": """Génère un nom court et amical pour une session de chat dans une application d'assistance psychologique. 
+L'utilisateur commence une nouvelle conversation.
+Contexte: Support et guidance psychologique
+Format: 2-4 mots, encourageant et accueillant
+Exemples: "Nouveau Départ", "Parlons-en", "Nouveau Voyage", "Nouveau Commencement"
+Réponds seulement avec le nom du chat, rien d'autre.""",
+    "en": """Generate a short, friendly chat session name for a psychological assistant app. 
+The user is starting a new conversation. 
+Context: Psychological support and guidance
+Format: 2-4 words, encouraging and welcoming
+Examples: "New Journey", "Fresh Start", "Let's Talk", "New Beginning"
+Respond with only the chat name, nothing else."""
+})
+
+BOT_SYSTEM_PROMPTS = MappingProxyType({
+    "fr": """Tu es EKO, un assistant psychologique conversationnel. Tu es là pour fournir un soutien émotionnel, des conseils bienveillants et une écoute attentive.
+
+Caractéristiques d'EKO:
+- Tu es empathique, compréhensif et non-jugeant
+- Tu encourages l'expression des émotions et des pensées
+- Tu fournis des conseils pratiques pour le bien-être mental
+- Tu restes professionnel tout en étant chaleureux
+- Tu poses des questions réfléchies pour mieux comprendre
+- Tu offres des techniques de relaxation et de gestion du stress
+
+Réponds de manière naturelle et conversationnelle, comme si tu parlais à un ami de confiance. Garde tes réponses concises mais significatives.""",
+    "en": """You are EKO, a conversational psychological assistant. You are here to provide emotional support, gentle guidance, and a listening ear.
+
+EKO's characteristics:
+- You are empathetic, understanding, and non-judgmental
+- You encourage expression of emotions and thoughts
+- You provide practical advice for mental well-being
+- You remain professional while being warm and approachable
+- You ask thoughtful questions to better understand
+- You offer relaxation and stress management techniques
+
+Respond naturally and conversationally, as if speaking to a trusted friend. Keep your responses concise but meaningful."""
+})
+
+FALLBACK_RESPONSES = (
+    "I'm here to listen and support you. How are you feeling today?",
+    "Thank you for sharing that with me. I'm here to help you work through this.",
+    "I understand this might be difficult to talk about. Take your time, I'm here to listen.",
+    "Your feelings are valid and important. Let's explore this together.",
+    "I'm here to support you through whatever you're going through."
+)
+
+
+# One encoder instance: json.dumps() with non-default options builds a new encoder per call
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode(value) -> bytes:
+    """Compact UTF-8 JSON encoding used for every request fragment"""
+    return _JSON_ENCODER.encode(value).encode("utf-8")
+
+
+class ChatRequestTemplate:
+    """
+    Pre-encoded chat completion request body.
+
+    Everything except the conversation (model, sampling parameters and the
+    system message) is encoded once; render() only encodes the context.
+    """
+    __slots__ = ("prefix",)
+
+    def __init__(self, system_prompt: str, model: str, max_tokens: int, temperature: float, stream: bool = False):
+        self.prefix = (
+            b'{"model":' + _encode(model)
+            + b',"max_tokens":' + _encode(max_tokens)
+            + b',"temperature":' + _encode(temperature)
+            + (b',"stream":true' if stream else b"")
+            + b',"messages":[' + _encode({"role": "system", "content": system_prompt})
+        )
+
+    def render(self, conversation_context: list) -> bytes:
+        if not conversation_context:
+            return self.prefix + b"]}"
+        # Encode the whole context in one pass and splice it after the system message
+        encoded_context = _encode(conversation_context)
+        return self.prefix + b"," + encoded_context[1:-1] + b"]}"
+
+
+BOT_REQUEST_TEMPLATES = MappingProxyType({
+    language_code: ChatRequestTemplate(system_prompt, LLM_REPLY_MODEL, max_tokens=500, temperature=0.7)
+    for language_code, system_prompt in BOT_SYSTEM_PROMPTS.items()
+})
+
+BOT_STREAM_REQUEST_TEMPLATES = MappingProxyType({
+    language_code: ChatRequestTemplate(system_prompt, LLM_REPLY_MODEL, max_tokens=500, temperature=0.7, stream=True)
+    for language_code, system_prompt in BOT_SYSTEM_PROMPTS.items()
+})
+
+# The chat name request never changes for a given language, so the whole body is pre-encoded
+CHAT_NAME_REQUEST_BODIES = MappingProxyType({
+    language_code: ChatRequestTemplate(CHAT_NAME_SYSTEM_PROMPT, LLM_CHAT_NAME_MODEL, max_tokens=20, temperature=0.7).render(
+        [{"role": "user", "content": prompt}]
+    )
+    for language_code, prompt in CHAT_NAME_PROMPTS.items()
+})
+
+class LLMRequestError(Exception):
+    """The provider answered without a completion"""
 
-load_dotenv()
 
 class OpenAIService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            print("⚠️ OPENAI_API_KEY not found in environment variables")
-        else:
-            openai.api_key = self.api_key
+    def __init__(self, provider: LLMProvider = None):
+        # Completions go through the configured provider (OpenAI-compatible API or local mock)
+        self.provider = provider or get_llm_provider()
+        if not self.provider.is_configured:
+            logger.warning("OPENAI_API_KEY is not set, using fallback responses")
+        self.response_cache = response_cache
+        if self.provider.is_configured and self.response_cache.embedder is None:
+            self.response_cache.embedder = self._embed_text
     
     async def generate_chat_name(self, user_language: str = "english") -> str:
         """
-        Generate a friendly chat name using OpenAI API
+        Generate a friendly chat name using the LLM provider
         Falls back to timestamp-based name if API fails
         """
-        if not self.api_key:
+        if not self.provider.is_configured:
             return self._generate_fallback_name()
         
         try:
             # Convert database language to OpenAI language code
             language_code = "en" if user_language == "english" else "fr"
             
-            prompt = self._build_chat_name_prompt(language_code)
+            request_body = CHAT_NAME_REQUEST_BODIES[language_code]
             
-            # Use async HTTP client for OpenAI API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a helpful assistant that generates short, friendly names for chat sessions in a psychological support app. Respond with only the chat name, nothing else."
-                            },
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "max_tokens": 20,
-                        "temperature": 0.7
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    chat_name = data["choices"][0]["message"]["content"].strip()
-                    
-                    # Clean up the response (remove quotes, extra text)
-                    chat_name = chat_name.strip('"').strip("'").strip()
-                    
-                    # Ensure it's not too long
-                    if len(chat_name) > 50:
-                        chat_name = chat_name[:47] + "..."
-                    
-                    # Ensure it's not empty
-                    if not chat_name:
-                        return self._generate_fallback_name()
-                    
-                    print(f"✅ Generated chat name: '{chat_name}'")
-                    return chat_name
-                else:
-                    print(f"❌ OpenAI API error: {response.status_code} - {response.text}")
-                    return self._generate_fallback_name()
+            with track(llm_request_duration, "chat_name") as outcome, span("llm.chat_name"):
+                chat_name = await self.provider.chat_completion(request_body, timeout=10.0)
+                if chat_name is None:
+                    outcome["value"] = "failed"
+            if chat_name is None:
+                return self._generate_fallback_name()
+            
+            # Clean up the response (remove quotes, extra text)
+            chat_name = chat_name.strip().strip('"').strip("'").strip()
+            
+            # Ensure it's not too long
+            if len(chat_name) > 50:
+                chat_name = chat_name[:47] + "..."
+            
+            # Ensure it's not empty
+            if not chat_name:
+                return self._generate_fallback_name()
+            
+            logger.debug("generated chat name", extra={"length": len(chat_name)})
+            return chat_name
                     
         except Exception as e:
-            print(f"❌ OpenAI API error: {e}")
+            logger.warning("LLM request failed: %s", e)
             return self._generate_fallback_name()
     
-    def _build_chat_name_prompt(self, language_code: str) -> str:
-        """Build the prompt for chat name generation based on language"""
-        if language_code == "fr":
-            return """Génère un nom court et amical pour une session de chat dans une application d'assistance psychologique. 
-L'utilisateur commence une nouvelle conversation.
-Contexte: Support et guidance psychologique
-Format: 2-4 mots, encourageant et accueillant
-Exemples: "Nouveau Départ", "Parlons-en", "Nouveau Voyage", "Nouveau Commencement"
-Réponds seulement avec le nom du chat, rien d'autre."""
-        else:
-            return """Generate a short, friendly chat session name for a psychological assistant app. 
-The user is starting a new conversation. 
-Context: Psychological support and guidance
-Format: 2-4 words, encouraging and welcoming
-Examples: "New Journey", "Fresh Start", "Let's Talk", "New Beginning"
-Respond with only the chat name, nothing else."""
-    
     def _generate_fallback_name(self) -> str:
         """Generate a fallback name based on timestamp"""
         now = datetime.now()
         return f"Chat - {now.strftime('%b %d')}"
     
-    async def generate_bot_response(self, conversation_context: list, user_language: str = "english") -> str:
+    async def generate_bot_response(self, conversation_context: list, user_language: str = "english", use_cache: bool = True, fallback: bool = True) -> str:
         """
-        Generate EKO bot response using OpenAI API
+        Generate EKO bot response using the LLM provider
+        Short conversations are served from the response cache unless use_cache is False
+        With fallback=False a failed request raises LLMRequestError instead of returning the fallback text
         """
-        if not self.api_key:
+        if not self.provider.is_configured:
             return self._generate_fallback_response()
         
         try:
@@ -116,76 +192,87 @@ Respond with only the chat name, nothing else."""
             # Build system prompt for EKO bot
             system_prompt = self._build_bot_system_prompt(language_code)
             
-            # Prepare messages for OpenAI
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(conversation_context)
+            if use_cache:
+                cached_response = await self.response_cache.get(system_prompt, language_code, conversation_context)
+                if cached_response:
+                    return cached_response
             
-            # Use async HTTP client for OpenAI API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": messages,
-                        "max_tokens": 500,
-                        "temperature": 0.7
-                    },
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    bot_response = data["choices"][0]["message"]["content"].strip()
-                    
-                    print(f"✅ Generated bot response: '{bot_response[:100]}...'")
-                    return bot_response
-                else:
-                    print(f"❌ OpenAI API error: {response.status_code} - {response.text}")
-                    return self._generate_fallback_response()
+            # Assemble the request body from the pre-encoded template
+            request_body = BOT_REQUEST_TEMPLATES[language_code].render(conversation_context)
+            
+            with track(llm_request_duration, "reply") as outcome, span("llm.reply"):
+                bot_response = await self.provider.chat_completion(request_body, timeout=30.0)
+                if bot_response is None:
+                    outcome["value"] = "failed"
+            if bot_response is None:
+                raise LLMRequestError("provider returned no completion")
+            
+            bot_response = bot_response.strip()
+            log_sampled(logger, "generated bot response", length=len(bot_response))
+            if use_cache:
+                await self.response_cache.set(system_prompt, language_code, conversation_context, bot_response)
+            return bot_response
                     
         except Exception as e:
-            print(f"❌ OpenAI API error: {e}")
+            logger.warning("LLM request failed: %s", e)
+            if not fallback:
+                raise
             return self._generate_fallback_response()
     
+    async def stream_bot_response(self, conversation_context: list, user_language: str = "english") -> AsyncIterator[str]:
+        """
+        Stream EKO bot response token by token
+        Yields a single fallback response if the provider is unavailable or fails before the first token
+        """
+        if not self.provider.is_configured:
+            yield self._generate_fallback_response()
+            return
+        
+        language_code = "en" if user_language == "english" else "fr"
+        request_body = BOT_STREAM_REQUEST_TEMPLATES[language_code].render(conversation_context)
+        
+        streamed_any = False
+        try:
+            # Covers the whole stream, including time the consumer spends between tokens
+            with track(llm_request_duration, "reply_stream") as outcome, span("llm.reply_stream"):
+                async for token in self.provider.stream_chat_completion(request_body, timeout=30.0):
+                    streamed_any = True
+                    yield token
+                if not streamed_any:
+                    outcome["value"] = "failed"
+        except Exception as e:
+            logger.warning("LLM request failed: %s", e)
+        
+        if not streamed_any:
+            yield self._generate_fallback_response()
+    
+    async def _embed_text(self, text: str):
+        """Embed text for the response cache's similarity tier"""
+        try:
+            with track(llm_request_duration, "embed") as outcome, span("llm.embed"):
+                embedding = await self.provider.embed(text)
+                if embedding is None:
+                    outcome["value"] = "failed"
+            return embedding
+        except Exception as e:
+            logger.warning("embedding failed: %s", e)
+            return None
+    
     def _build_bot_system_prompt(self, language_code: str) -> str:
-        """Build the system prompt for EKO bot based on language"""
-        if language_code == "fr":
-            return """Tu es EKO, un assistant psychologique conversationnel. Tu es là pour fournir un soutien émotionnel, des conseils bienveillants et une écoute attentive.
+        """Get the system prompt for EKO bot based on language"""
+        return BOT_SYSTEM_PROMPTS["fr" if language_code == "fr" else "en"]
+    
+    def _generate_fallback_response(self) -> str:
+        """Generate a fallback response when OpenAI fails"""
+        return random.choice(FALLBACK_RESPONSES)
 
-Caractéristiques d'EKO:
-- Tu es empathique, compréhensif et non-jugeant
-- Tu encourages l'expression des émotions et des pensées
-- Tu fournis des conseils pratiques pour le bien-être mental
-- Tu restes professionnel tout en étant chaleureux
-- Tu poses des questions réfléchies pour mieux comprendre
-- Tu offres des techniques de relaxation et de gestion du stress
 
-Réponds de manière naturelle et conversationnelle, comme si tu parlais à un ami de confiance. Garde tes réponses concises mais significatives."""
-        else:
-            return """You are EKO, a conversational psychological assistant. You are here to provide emotional support, gentle guidance, and a listening ear.
+_openai_service = None
 
-EKO's characteristics:
-- You are empathetic, understanding, and non-judgmental
-- You encourage expression of emotions and thoughts
-- You provide practical advice for mental well-being
-- You remain professional while being warm and approachable
-- You ask thoughtful questions to better understand
-- You offer relaxation and stress management techniques
 
-Respond naturally and conversationally, as if speaking to a trusted friend. Keep your responses concise but meaningful."""
-    
-    def _generate_fallback_response(self) -> str:
-        """Generate a fallback response when OpenAI fails"""
-        fallback_responses = [
-            "I'm here to listen and support you. How are you feeling today?",
-            "Thank you for sharing that with me. I'm here to help you work through this.",
-            "I understand this might be difficult to talk about. Take your time, I'm here to listen.",
-            "Your feelings are valid and important. Let's explore this together.",
-            "I'm here to support you through whatever you're going through."
-        ]
-        import random
-        return random.choice(fallback_responses)
+def get_openai_service() -> OpenAIService:
+    """Process-wide service shared by the chat and message controllers"""
+    global _openai_service
+    if _openai_service is None:
+        _openai_service = OpenAIService()
+    return _openai_service
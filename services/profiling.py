@@ -0,0 +1,152 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+from config import load_env
+
+load_env()
+
+# Longest profile one POST /admin/profile call may take, and the default sampling interval
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# Requests slower than this get a task stack dump and timing breakdown (0 disables)
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "0"))
+# Most recent slow request reports kept per worker for GET /admin/slow-requests
+SLOW_REQUEST_HISTORY = int(os.getenv("SLOW_REQUEST_HISTORY", "50"))
+
+# Frames a thread sits in while waiting for work; samples ending there are idle time
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+# Per-request upstream time by component ("mongo.find", "llm.reply", ...), set by
+# middleware.slow_requests. Motor runs commands with a copy of the request's
+# context, so driver threads add to the same dict.
+request_timings_var: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+slow_requests = deque(maxlen=SLOW_REQUEST_HISTORY)
+
+
+def record_timing(component: str, seconds: float):
+    """Add upstream time to the current request's breakdown (no-op outside sampled requests)"""
+    timings = request_timings_var.get()
+    if timings is not None:
+        entry = timings.get(component)
+        if entry is None:
+            timings[component] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+def _short_path(filename: str) -> str:
+    for path in sys.path:
+        if path and filename.startswith(path):
+            return filename[len(path):].lstrip("/")
+    return filename
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def collapse_stack(frame) -> str:
+    """Root-first "a;b;c" line, the format flamegraph.pl and speedscope read"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler: a background thread reads every other thread's stack
+    with sys._current_frames() at a fixed interval and counts identical stacks.
+    Nothing is installed on the profiled threads, so overhead is the sampler's
+    own GIL time (a few percent at the default 10 ms interval).
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not self.include_idle and os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                name = names.get(thread_id)
+                if name is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    name = names.get(thread_id, str(thread_id))
+                self.stacks[f"{name};{collapse_stack(frame)}"] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+def profile_running() -> bool:
+    return _profile_lock.locked()
+
+
+async def run_profile(seconds: float, interval: float = PROFILE_INTERVAL_MS / 1000, include_idle: bool = False) -> SamplingProfiler:
+    """Sample this worker for `seconds` while it keeps serving requests"""
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval, include_idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        finally:
+            # join() is short: the sampler wakes within one interval
+            profiler.stop()
+        return profiler
+
+
+def format_task_stack(task: asyncio.Task, limit: int = 40) -> list:
+    """
+    Await chain of a suspended task, outermost first ("file:line in function").
+    Task.get_stack() only returns the outer frame of a suspended coroutine, so
+    the chain is followed through cr_await / gi_yieldfrom instead.
+    """
+    lines = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(lines) < limit:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) or getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            # A future, e.g. a Motor executor call or an httpx read
+            lines.append(f"awaiting {type(awaitable).__name__}")
+            break
+        lines.append(f"{_short_path(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) or getattr(awaitable, "ag_await", None)
+    return lines
+
+
+def capture_slow_request(task: asyncio.Task, report: dict, started: float):
+    """Called on the event loop once a request passes the threshold, while it is still running"""
+    report["captured_after_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    report["stack"] = format_task_stack(task)
+    report["tasks"] = len(asyncio.all_tasks())
@@ -0,0 +1,150 @@
+import logging
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Callable, Optional
+from config import load_env
+from fastapi.encoders import jsonable_encoder
+from services.shared_state import SharedState, get_shared_state
+from services import metrics
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Feed the broker from MongoDB change streams (requires a replica set) so that
+# subscribers see messages inserted by any process, not just this one
+MESSAGE_CHANGE_STREAMS_ENABLED = os.getenv("MESSAGE_CHANGE_STREAMS_ENABLED", "false").lower() == "true"
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", "100"))
+
+
+class MessageBroker:
+    """
+    In-process pub/sub of new chat messages, keyed by chat id.
+
+    Each subscriber gets its own bounded queue; a slow subscriber loses its
+    oldest undelivered events rather than blocking publishers.
+
+    With a cross-process shared state backend, message events are published
+    there and a relay task delivers them to this process's subscribers, so a
+    client connected to one worker sees messages written by any worker.
+    """
+
+    def __init__(self, change_streams_enabled: bool = MESSAGE_CHANGE_STREAMS_ENABLED, shared_state: Optional[SharedState] = None):
+        self.change_streams_enabled = change_streams_enabled
+        self._shared_state = shared_state
+        self._subscribers = defaultdict(set)
+        self._change_stream_task = None
+        self._relay_task = None
+        self._pending_publishes = set()
+
+    def _shared(self) -> Optional[SharedState]:
+        shared_state = self._shared_state or get_shared_state()
+        return shared_state if shared_state.is_shared else None
+
+    def subscribe(self, chat_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[chat_id].add(queue)
+        return queue
+
+    def unsubscribe(self, chat_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(chat_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[chat_id]
+
+    def subscriber_count(self, chat_id: Optional[str] = None) -> int:
+        if chat_id is not None:
+            return len(self._subscribers.get(chat_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, chat_id: str, event: dict):
+        """Deliver an event to every subscriber of the chat in this process"""
+        for queue in self._subscribers.get(chat_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def publish_message(self, message: dict):
+        """
+        Announce a newly inserted message (already formatted for the API).
+        When change streams are enabled the watcher is the single source of
+        events, so local publishes are skipped to avoid duplicates.
+        """
+        if self.change_streams_enabled:
+            return
+        event = {"type": "message", "data": message}
+        shared_state = self._shared()
+        if shared_state is None:
+            self.publish(message["chatId"], event)
+            return
+        # Delivered back to this process by the relay, like every other worker
+        task = asyncio.create_task(self._publish_shared(shared_state, message["chatId"], event))
+        self._pending_publishes.add(task)
+        task.add_done_callback(self._pending_publishes.discard)
+
+    async def _publish_shared(self, shared_state: SharedState, chat_id: str, event: dict):
+        try:
+            await shared_state.publish(f"chat:{chat_id}", json.dumps(jsonable_encoder(event)))
+        except Exception as error:
+            logger.warning("publishing message event failed, delivering locally only: %s", error)
+            self.publish(chat_id, event)
+
+    def start_relay(self):
+        """Start delivering events published by other workers (shared state backends only)"""
+        if self._shared() is not None and not self.change_streams_enabled and self._relay_task is None:
+            self._relay_task = asyncio.create_task(self._relay(), name="message-relay")
+
+    async def stop_relay(self):
+        if self._relay_task is not None:
+            self._relay_task.cancel()
+            await asyncio.gather(self._relay_task, return_exceptions=True)
+            self._relay_task = None
+
+    async def _relay(self):
+        while True:
+            try:
+                async for channel, payload in self._shared().subscribe("chat:*"):
+                    self.publish(channel[len("chat:"):], json.loads(payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("message relay failed, retrying: %s", error)
+                await asyncio.sleep(5)
+
+    def start_change_stream(self, collection, formatter: Callable[[dict], dict]):
+        """Start publishing message inserts seen by a MongoDB change stream"""
+        if self.change_streams_enabled and self._change_stream_task is None:
+            self._change_stream_task = asyncio.create_task(self._watch(collection, formatter), name="message-change-stream")
+
+    async def stop_change_stream(self):
+        if self._change_stream_task is not None:
+            self._change_stream_task.cancel()
+            await asyncio.gather(self._change_stream_task, return_exceptions=True)
+            self._change_stream_task = None
+
+    async def _watch(self, collection, formatter: Callable[[dict], dict]):
+        resume_token = None
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                    logger.info("watching message inserts via change stream")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        document = change["fullDocument"]
+                        self.publish(document["chatId"], {"type": "message", "data": formatter(document)})
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.warning("message change stream failed, retrying: %s", error)
+                await asyncio.sleep(5)
+
+
+# Shared by message write paths and push subscribers
+message_broker = MessageBroker()
+
+metrics.callback_gauge("push_subscribers", "WebSocket and long-poll subscribers in this worker", message_broker.subscriber_count)
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+from config import load_env
+from services.shared_state import SharedState, get_shared_state
+from services import metrics
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Response cache configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+# Only conversations this short are cached; longer ones are too specific to reuse
+RESPONSE_CACHE_MAX_CONTEXT = int(os.getenv("RESPONSE_CACHE_MAX_CONTEXT", "2"))
+# Embedding-similarity tier is opt-in because it costs an embedding call per miss
+RESPONSE_CACHE_SEMANTIC_ENABLED = os.getenv("RESPONSE_CACHE_SEMANTIC_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.92"))
+# Vectors kept for the semantic tier (the oldest are dropped first); bounds each scan
+RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES", "2000"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?…,;:]+$")
+
+Embedder = Callable[[str], Awaitable[Optional[List[float]]]]
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a prompt so trivially different openers share a cache entry"""
+    text = _WHITESPACE.sub(" ", text.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def _unit_vector(vector):
+    # numpy is only needed by the semantic tier, so it is imported on first use
+    import numpy as np
+
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+
+def _scan(keys: list, matrix, rows: list, vector):
+    """Cosine scan of one bucket (runs in a worker thread); returns (key, similarity, matrix)"""
+    import numpy as np
+
+    query = _unit_vector(vector)
+    if matrix is None:
+        matrix = np.stack(rows)
+    if query is None or query.shape[0] != matrix.shape[1]:
+        return None, 0.0, matrix
+    scores = matrix @ query
+    best = int(np.argmax(scores))
+    return keys[best], float(scores[best]), matrix
+
+
+class _VectorIndex:
+    """
+    Bounded in-process vector index.
+
+    Unit vectors are grouped by bucket. A lookup is one matrix product over the
+    bucket, done with numpy in a worker thread so the event loop is not held
+    for the scan. Each bucket's matrix is cached until the bucket changes.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # cache key -> bucket, oldest first
+        self.entries = OrderedDict()
+        # bucket -> {cache key: unit vector}
+        self._buckets = {}
+        # bucket -> (generation, keys, matrix)
+        self._matrices = {}
+        self._generations = {}
+
+    def add(self, key: str, bucket: str, vector: List[float]):
+        unit = _unit_vector(vector)
+        if unit is None:
+            return
+        self.remove(key)
+        self.entries[key] = bucket
+        self._buckets.setdefault(bucket, {})[key] = unit
+        self._changed(bucket)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key: str):
+        bucket = self.entries.pop(key, None)
+        if bucket is None:
+            return
+        vectors = self._buckets[bucket]
+        vectors.pop(key, None)
+        if not vectors:
+            del self._buckets[bucket]
+        self._changed(bucket)
+
+    def clear(self):
+        self.entries.clear()
+        self._buckets.clear()
+        self._matrices.clear()
+
+    def _changed(self, bucket: str):
+        self._generations[bucket] = self._generations.get(bucket, 0) + 1
+        self._matrices.pop(bucket, None)
+
+    async def nearest(self, bucket: str, vector: List[float]):
+        """Return (key, similarity) of the closest entry in the same bucket"""
+        vectors = self._buckets.get(bucket)
+        if not vectors:
+            return None, 0.0
+
+        generation = self._generations.get(bucket, 0)
+        cached = self._matrices.get(bucket)
+        if cached is not None and cached[0] == generation:
+            keys, matrix, rows = cached[1], cached[2], None
+        else:
+            # Snapshot taken on the loop; the thread only reads it
+            keys, matrix, rows = list(vectors), None, list(vectors.values())
+
+        key, score, matrix = await asyncio.to_thread(_scan, keys, matrix, rows, vector)
+        if self._generations.get(bucket, 0) == generation:
+            self._matrices[bucket] = (generation, keys, matrix)
+        return key, score
+
+
+class ResponseCache:
+    """
+    Cache for EKO bot replies to short, repeated conversations.
+
+    Exact tier: sha256 of the normalized system prompt, language and context.
+    Semantic tier (optional): nearest neighbour over context embeddings, scoped
+    to the same system prompt and language.
+    Entries expire after a TTL and the least recently used entry is evicted
+    once the cache is full. With a cross-process shared state backend the exact
+    tier is also written there, so every worker reuses replies cached by the others.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_context: int = RESPONSE_CACHE_MAX_CONTEXT,
+        semantic_threshold: float = RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        embedder: Optional[Embedder] = None,
+        shared_state: Optional[SharedState] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_context = max_context
+        self.semantic_threshold = semantic_threshold
+        self.enabled = enabled
+        self.embedder = embedder
+        self._shared_state = shared_state
+        # cache key -> (expires_at, response)
+        self._entries = OrderedDict()
+        self._index = _VectorIndex()
+        self._counters = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "shared_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def is_cacheable(self, conversation_context: list) -> bool:
+        """Only short conversations (e.g. the opening line of a chat) are cached"""
+        return self.enabled and 0 < len(conversation_context) <= self.max_context
+
+    def _bucket(self, system_prompt: str, language: str) -> str:
+        return hashlib.sha256(f"{language}\x00{normalize_text(system_prompt)}".encode("utf-8")).hexdigest()
+
+    def _context_text(self, conversation_context: list) -> str:
+        return "\n".join(
+            f"{message['role']}:{normalize_text(message['content'])}"
+            for message in conversation_context
+        )
+
+    def _key(self, bucket: str, context_text: str) -> str:
+        return hashlib.sha256(f"{bucket}\x00{context_text}".encode("utf-8")).hexdigest()
+
+    def _get_live(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self._counters["expirations"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def _shared(self) -> Optional[SharedState]:
+        shared_state = self._shared_state or get_shared_state()
+        return shared_state if shared_state.is_shared else None
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._index.remove(key)
+
+    async def get(self, system_prompt: str, language: str, conversation_context: list) -> Optional[str]:
+        """Look up a cached reply, trying the exact tier before the semantic tier"""
+        if not self.is_cacheable(conversation_context):
+            self._counters["bypassed"] += 1
+            return None
+
+        self._counters["lookups"] += 1
+        bucket = self._bucket(system_prompt, language)
+        context_text = self._context_text(conversation_context)
+
+        key = self._key(bucket, context_text)
+        response = self._get_live(key)
+        if response is not None:
+            self._counters["exact_hits"] += 1
+            return response
+
+        shared_state = self._shared()
+        if shared_state is not None:
+            try:
+                response = await shared_state.get(f"respcache:{key}")
+            except Exception as error:
+                logger.warning("reading shared response cache failed: %s", error)
+                response = None
+            if response is not None:
+                self._store_local(key, response)
+                self._counters["shared_hits"] += 1
+                return response
+
+        if RESPONSE_CACHE_SEMANTIC_ENABLED and self.embedder:
+            vector = await self.embedder(context_text)
+            if vector:
+                nearest_key, score = await self._index.nearest(bucket, vector)
+                if nearest_key and score >= self.semantic_threshold:
+                    response = self._get_live(nearest_key)
+                    if response is not None:
+                        self._counters["semantic_hits"] += 1
+                        return response
+
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, system_prompt: str, language: str, conversation_context: list, response: str):
+        """Store a reply generated by the model"""
+        if not response or not self.is_cacheable(conversation_context):
+            return
+
+        bucket = self._bucket(system_prompt, language)
+        context_text = self._context_text(conversation_context)
+        key = self._key(bucket, context_text)
+
+        self._store_local(key, response)
+        self._counters["stores"] += 1
+
+        shared_state = self._shared()
+        if shared_state is not None:
+            try:
+                await shared_state.set(f"respcache:{key}", response, ttl=self.ttl_seconds)
+            except Exception as error:
+                logger.warning("writing shared response cache failed: %s", error)
+
+        if RESPONSE_CACHE_SEMANTIC_ENABLED and self.embedder and key not in self._index.entries:
+            vector = await self.embedder(context_text)
+            if vector and key in self._entries:
+                self._index.add(key, bucket, vector)
+
+    def _store_local(self, key: str, response: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            oldest_key, _ = self._entries.popitem(last=False)
+            self._index.remove(oldest_key)
+            self._counters["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def stats(self) -> dict:
+        """Hit-rate metrics for the cache"""
+        lookups = self._counters["lookups"]
+        hits = self._counters["exact_hits"] + self._counters["shared_hits"] + self._counters["semantic_hits"]
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "hit_rate": (hits / lookups) if lookups else 0.0
+        }
+
+
+# Shared by every OpenAIService instance in the process
+response_cache = ResponseCache()
+
+
+def _cache_events() -> dict:
+    stats = response_cache.stats()
+    return {(name,): value for name, value in stats.items() if name not in ("size", "hit_rate")}
+
+
+metrics.callback_counter("response_cache_events_total", "Response cache lookups, hits, misses, stores and evictions", _cache_events, ("event",))
+metrics.callback_gauge("response_cache_entries", "Entries in the local response cache", lambda: response_cache.stats()["size"])
+metrics.callback_gauge("response_cache_hit_rate", "Response cache hits per lookup since start", lambda: response_cache.stats()["hit_rate"])
@@ -0,0 +1,62 @@
+import re
+from typing import List
+
+# Languages with Mongo text-search stemming, matching the stored Language values
+SEARCH_LANGUAGES = ("english", "french")
+SNIPPET_LENGTH = 160
+
+_QUOTED = re.compile(r'"([^"]+)"')
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_language(language: str) -> str:
+    """Text index language for a user's stored language (also used as the document's language override)"""
+    return language if language in SEARCH_LANGUAGES else "english"
+
+
+def query_terms(query: str) -> List[str]:
+    """Phrases and words of a $text search string; negated terms (-word) are not highlighted"""
+    terms = [phrase.strip() for phrase in _QUOTED.findall(query) if phrase.strip()]
+    for token in _QUOTED.sub(" ", query).split():
+        if not token.startswith("-"):
+            terms.extend(_WORD.findall(token))
+    return terms
+
+
+def _terms_pattern(terms: List[str]) -> re.Pattern:
+    # Stemming makes "running" match "runs"; approximate it by matching on a word prefix
+    parts = []
+    for term in sorted(terms, key=len, reverse=True):
+        if " " in term or len(term) <= 3:
+            parts.append(re.escape(term))
+        else:
+            parts.append(re.escape(term[:max(3, len(term) - 3)]) + r"\w*")
+    return re.compile(r"\b(?:" + "|".join(parts) + ")", re.IGNORECASE)
+
+
+def highlight(text: str, terms: List[str], max_length: int = SNIPPET_LENGTH) -> dict:
+    """
+    Snippet of `text` centred on the first matching term, with the
+    [start, end) character offsets of every match inside the snippet
+    """
+    matches = list(_terms_pattern(terms).finditer(text)) if terms else []
+
+    start = 0
+    if matches and len(text) > max_length:
+        first = matches[0].start()
+        start = max(0, min(first - max_length // 4, len(text) - max_length))
+        # Start on a word boundary
+        space = text.find(" ", start) if start > 0 else -1
+        if 0 <= space < first:
+            start = space + 1
+    end = min(len(text), start + max_length)
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    offset = len(prefix) - start
+    highlights = [
+        [match.start() + offset, min(match.end(), end) + offset]
+        for match in matches
+        if start <= match.start() < end
+    ]
+    return {"snippet": prefix + text[start:end] + suffix, "highlights": highlights}
@@ -0,0 +1,156 @@
+import asyncio
+import fnmatch
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional, Tuple
+from config import load_env
+
+load_env()
+
+# "memory" keeps state in each worker process; "redis" shares it across workers and
+# instances (any Redis-compatible server: Redis, Valkey, KeyDB, Dragonfly)
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")
+SHARED_STATE_REDIS_URL = os.getenv("SHARED_STATE_REDIS_URL", "redis://localhost:6379/0")
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "eko:")
+
+
+class SharedState(ABC):
+    """
+    Key/value store with expiry plus pub/sub, used for state that must be
+    consistent across worker processes (response cache, rate limits, push events).
+    """
+    name = "base"
+    # True when other processes see the same state
+    is_shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the value stored at key, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Store value at key, expiring after ttl seconds when given"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Remove key if present"""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        """Send message to every subscriber of a matching pattern"""
+
+    @abstractmethod
+    def subscribe(self, pattern: str) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (channel, message) for every message published to a matching channel"""
+
+    async def aclose(self):
+        return None
+
+
+class InMemorySharedState(SharedState):
+    """Single-process implementation (the default; state is per worker)"""
+    name = "memory"
+
+    def __init__(self):
+        # key -> (expires_at or None, value)
+        self._values = {}
+        # pattern -> set of subscriber queues
+        self._subscribers = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._values[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        for pattern, queues in self._subscribers.items():
+            if fnmatch.fnmatchcase(channel, pattern):
+                for queue in queues:
+                    queue.put_nowait((channel, message))
+
+    async def subscribe(self, pattern: str) -> AsyncIterator[Tuple[str, str]]:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(pattern, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[pattern].discard(queue)
+            if not self._subscribers[pattern]:
+                del self._subscribers[pattern]
+
+
+class RedisSharedState(SharedState):
+    """Shared across processes through a Redis-compatible server (requires the redis package)"""
+    name = "redis"
+    is_shared = True
+
+    def __init__(self, url: str = SHARED_STATE_REDIS_URL, prefix: str = SHARED_STATE_PREFIX):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, pattern: str) -> AsyncIterator[Tuple[str, str]]:
+        pubsub = self.client.pubsub()
+        await pubsub.psubscribe(self.prefix + pattern)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "pmessage":
+                    yield message["channel"][len(self.prefix):], message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_shared_state(backend_name: str = SHARED_STATE_BACKEND) -> SharedState:
+    """Build the backend selected by SHARED_STATE_BACKEND"""
+    if backend_name == "memory":
+        return InMemorySharedState()
+    if backend_name == "redis":
+        return RedisSharedState()
+    raise ValueError(f"Unknown shared state backend: {backend_name}")
+
+
+_shared_state = None
+
+
+def get_shared_state() -> SharedState:
+    """Process-wide shared state (each worker has its own connection)"""
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = create_shared_state()
+    return _shared_state
+
+
+async def close_shared_state():
+    """Release connections (called on app shutdown)"""
+    global _shared_state
+    if _shared_state is not None:
+        await _shared_state.aclose()
+        _shared_state = None
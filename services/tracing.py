@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import threading
+from contextlib import nullcontext
+from pymongo import monitoring
+from config import load_env
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# OpenTelemetry tracing (requires opentelemetry-sdk; off by default)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+# otlp (OTLP/HTTP collector, see OTEL_EXPORTER_OTLP_ENDPOINT), file (JSON lines) or console
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file")
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "eko-backend")
+# Fraction of new traces recorded; requests carrying a traceparent follow the caller's decision
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+
+_tracer = None
+_provider = None
+_NO_SPAN = nullcontext()
+
+
+def setup_tracing(enabled: bool = TRACING_ENABLED, exporter_name: str = TRACING_EXPORTER):
+    """
+    Install the tracer provider and exporter. Without opentelemetry-sdk (or when
+    disabled) tracing stays off and every hook below is a no-op.
+    """
+    global _tracer, _provider
+    if not enabled or _tracer is not None:
+        return _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warning("TRACING_ENABLED is set but opentelemetry-sdk is not installed; tracing is off")
+        return None
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO))
+    )
+    # Spans are exported in batches from a background thread
+    _provider.add_span_processor(BatchSpanProcessor(_create_exporter(exporter_name)))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("eko_backend")
+    logger.info("tracing enabled", extra={"exporter": exporter_name})
+    return _tracer
+
+
+def _create_exporter(exporter_name: str):
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if exporter_name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if exporter_name == "file":
+        return _file_exporter(TRACING_FILE_PATH)
+    raise ValueError(f"Unknown tracing exporter: {exporter_name}")
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class FileSpanExporter(SpanExporter):
+        """One JSON object per span, appended to a local file (works offline)"""
+
+        def __init__(self):
+            self._lock = threading.Lock()
+            self._file = open(path, "a", encoding="utf-8")
+
+        def export(self, spans):
+            lines = "".join(json.dumps(json.loads(span.to_json(indent=None))) + "\n" for span in spans)
+            with self._lock:
+                self._file.write(lines)
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            with self._lock:
+                self._file.close()
+
+    return FileSpanExporter()
+
+
+def shutdown_tracing():
+    """Export pending spans (called on app shutdown)"""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = None
+    _provider = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Context manager for a child span of the current one (no-op when tracing is off)"""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def current_trace_id() -> str:
+    """Hex trace id of the active span, or "" (used to correlate log records)"""
+    if _tracer is None:
+        return ""
+    from opentelemetry import trace
+    context = trace.get_current_span().get_span_context()
+    return format(context.trace_id, "032x") if context.is_valid else ""
+
+
+class TracingTransport:
+    """
+    httpx transport wrapper giving each outbound request a client span.
+    The span covers the request until response headers arrive (streamed bodies
+    are read afterwards). Query strings are left out: they can carry API keys.
+    Implements the httpx.AsyncBaseTransport interface without subclassing it,
+    so importing this module does not import httpx.
+    """
+
+    def __init__(self, transport=None):
+        if transport is None:
+            import httpx
+            transport = httpx.AsyncHTTPTransport()
+        self._transport = transport
+
+    async def __aenter__(self):
+        await self._transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._transport.__aexit__(*exc_info)
+
+    async def handle_async_request(self, request):
+        if _tracer is None:
+            return await self._transport.handle_async_request(request)
+
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+        url = request.url
+        with _tracer.start_as_current_span(f"{request.method} {url.host}{url.path}", kind=SpanKind.CLIENT) as current:
+            current.set_attribute("http.request.method", request.method)
+            current.set_attribute("url.full", str(url.copy_with(query=None, fragment=None)))
+            current.set_attribute("server.address", url.host)
+            response = await self._transport.handle_async_request(request)
+            current.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                current.set_status(Status(StatusCode.ERROR))
+            return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class TracingCommandListener(monitoring.CommandListener):
+    """
+    Motor/PyMongo command listener: one client span per command. Motor runs
+    commands on executor threads with a copy of the caller's context, so spans
+    nest under the request span. Command documents are not recorded.
+    """
+
+    def __init__(self):
+        self._spans = {}
+
+    def _key(self, event):
+        return (event.request_id, event.connection_id)
+
+    def started(self, event):
+        if _tracer is None:
+            return
+        from opentelemetry.trace import SpanKind
+        collection = event.command.get(event.command_name)
+        attributes = {
+            "db.system": "mongodb",
+            "db.operation.name": event.command_name,
+            "db.namespace": event.database_name,
+            "server.address": str(event.connection_id[0])
+        }
+        if isinstance(collection, str):
+            attributes["db.collection.name"] = collection
+        name = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+        self._spans[self._key(event)] = _tracer.start_span(name, kind=SpanKind.CLIENT, attributes=attributes)
+
+    def succeeded(self, event):
+        current = self._spans.pop(self._key(event), None)
+        if current is not None:
+            current.end()
+
+    def failed(self, event):
+        current = self._spans.pop(self._key(event), None)
+        if current is not None:
+            from opentelemetry.trace import Status, StatusCode
+            current.set_status(Status(StatusCode.ERROR, str(event.failure.get("errmsg", ""))[:200]))
+            current.end()
+
+
+# Registered on the Motor client in database.create_client() when tracing is enabled
+tracing_command_listener = TracingCommandListener()
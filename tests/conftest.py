@@ -0,0 +1,34 @@
+import os
+
+# Settings are read at import time, so they are fixed before any app module is imported
+os.environ.update(
+    LLM_PROVIDER="mock",
+    LLM_MOCK_LATENCY="fixed:0",
+    MONGO_CAUSAL_CONSISTENCY="false",
+    TOKEN_KEY="test-token-key-with-at-least-32-bytes",
+    RATE_LIMIT_ENABLED="false",
+    SHARED_STATE_BACKEND="memory",
+    LOG_SAMPLE_RATE="0"
+)
+
+import mongomock.collection
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+import database
+
+COLLECTIONS = ("users", "chats", "messages", "bot_jobs")
+
+# pymongo passes sort= to bulk updates, which mongomock does not accept yet
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+mongomock.collection.BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs)
+
+
+@pytest.fixture
+def db():
+    """In-memory database behind the module-level collection proxies"""
+    mock_db = AsyncMongoMockClient()["eko_test"]
+    for name in COLLECTIONS:
+        for routing in ("primary", "listing"):
+            database._collections[(name, routing)] = mock_db[name]
+    yield mock_db
+    database._collections.clear()
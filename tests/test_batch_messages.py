@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+import pytest
+from bson import ObjectId
+import database
+from controllers.message_controller import MessageController
+from models.message import BatchDeleteMessagesRequest, BatchUpdateMessagesRequest, MessagePatch
+from services.llm_provider import MockLLMProvider
+from services.openai import OpenAIService
+
+
+@pytest.fixture
+def controller():
+    return MessageController(OpenAIService(MockLLMProvider("fixed:0")))
+
+
+@pytest.fixture
+async def chat(db):
+    """A user with one chat holding three messages (the last one is the chat preview)"""
+    user_id = str((await db["users"].insert_one({"email": "a@b.co", "isDeleted": False})).inserted_id)
+    chat_id = (await db["chats"].insert_one({"userId": user_id, "messageCount": 3, "version": 1})).inserted_id
+    message_ids = []
+    for index in range(3):
+        timestamp = datetime(2024, 1, 1, 12, index, tzinfo=timezone.utc)
+        result = await db["messages"].insert_one({
+            "chatId": str(chat_id), "userId": user_id, "sender": "user", "message": f"message {index}",
+            "timestamp": timestamp, "updatedAt": timestamp, "isDeleted": False, "version": 1
+        })
+        message_ids.append(str(result.inserted_id))
+    await db["chats"].update_one(
+        {"_id": chat_id}, {"$set": {"lastMessageId": message_ids[-1], "lastMessage": "message 2", "lastMessageSender": "user"}}
+    )
+    return {"user_id": user_id, "chat_id": chat_id, "message_ids": message_ids}
+
+
+async def test_batch_delete_reports_each_id(controller, chat, db):
+    other = (await db["messages"].insert_one({"chatId": "x", "userId": "someone-else", "isDeleted": False})).inserted_id
+    first, second, last = chat["message_ids"]
+    request = BatchDeleteMessagesRequest(message_ids=[first, last, str(other), str(ObjectId()), "not-an-id", first])
+
+    data = (await controller.batch_delete_messages(chat["user_id"], request))["data"]
+
+    assert data["deleted_count"] == 2
+    assert [(result["message_id"], result["status"]) for result in data["results"]] == [
+        (first, "deleted"), (last, "deleted"), (str(other), "not_found"),
+        (request.message_ids[3], "not_found"), ("not-an-id", "invalid_id")
+    ]
+    stored_chat = await db["chats"].find_one({"_id": chat["chat_id"]})
+    assert stored_chat["messageCount"] == 1
+    # The preview showed a deleted message, so it moves to the newest one left
+    assert stored_chat["lastMessageId"] == second
+    assert stored_chat["lastMessage"] == "message 1"
+    assert (await db["messages"].find_one({"_id": other}))["isDeleted"] is False
+
+
+async def test_batch_delete_skips_messages_deleted_concurrently(controller, chat, db, monkeypatch):
+    first, second, _ = chat["message_ids"]
+    collection = database.get_collection("messages")
+    update_many = collection.update_many
+
+    async def racing_update_many(*args, **kwargs):
+        # Another request deletes the first message between the read and the write
+        await db["messages"].update_one(
+            {"_id": ObjectId(first)}, {"$set": {"isDeleted": True, "batchId": ObjectId()}, "$inc": {"version": 1}}
+        )
+        return await update_many(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "update_many", racing_update_many)
+    data = (await controller.batch_delete_messages(chat["user_id"], BatchDeleteMessagesRequest(message_ids=[first, second])))["data"]
+
+    assert [result["status"] for result in data["results"]] == ["not_found", "deleted"]
+    # Only the message this request deleted is taken off the chat's count
+    assert (await db["chats"].find_one({"_id": chat["chat_id"]}))["messageCount"] == 2
+
+
+async def test_batch_update_reports_version_conflicts(controller, chat, db):
+    first, second, last = chat["message_ids"]
+    request = BatchUpdateMessagesRequest(updates=[
+        MessagePatch(message_id=first, message="edited", version=1),
+        MessagePatch(message_id=second, message="stale", version=7),
+        MessagePatch(message_id=last, message="new preview"),
+        MessagePatch(message_id=str(ObjectId()), message="missing"),
+        MessagePatch(message_id="bad", message="invalid")
+    ])
+
+    data = (await controller.batch_update_messages(chat["user_id"], request))["data"]
+
+    assert [(result["status"], result.get("version")) for result in data["results"]] == [
+        ("updated", 2), ("version_conflict", None), ("updated", 2), ("not_found", None), ("invalid_id", None)
+    ]
+    assert data["updated_count"] == 2
+    assert (await db["messages"].find_one({"_id": ObjectId(second)}))["message"] == "message 1"
+    assert (await db["chats"].find_one({"_id": chat["chat_id"]}))["lastMessage"] == "new preview"
+
+
+async def test_batch_update_detects_writes_that_lost_a_race(controller, chat, db, monkeypatch):
+    first, second, _ = chat["message_ids"]
+    collection = database.get_collection("messages")
+    bulk_write = collection.bulk_write
+
+    async def racing_bulk_write(operations, **kwargs):
+        # A concurrent edit bumps the second message's version after it was read
+        await db["messages"].update_one({"_id": ObjectId(second)}, {"$set": {"message": "theirs"}, "$inc": {"version": 1}})
+        return await bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", racing_bulk_write)
+    request = BatchUpdateMessagesRequest(updates=[
+        MessagePatch(message_id=first, message="mine"),
+        MessagePatch(message_id=second, message="mine too")
+    ])
+    data = (await controller.batch_update_messages(chat["user_id"], request))["data"]
+
+    assert [result["status"] for result in data["results"]] == ["updated", "version_conflict"]
+    assert (await db["messages"].find_one({"_id": ObjectId(second)}))["message"] == "theirs"
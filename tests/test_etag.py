@@ -0,0 +1,96 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from controllers.profile_controller import ProfileController
+from services.etag import (
+    conditional_json, ensure_version, if_match_version, not_modified, version_etag, version_filter, versioned_json
+)
+
+
+class FailingFirebase:
+    async def call(self, method, *args, **kwargs):
+        raise RuntimeError("firebase unavailable")
+
+
+def make_request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode("latin-1"))] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.mark.parametrize("header, expected", [(None, None), ("*", None), (' "7" ', 7), ('"0"', 0)])
+def test_if_match_accepts_version_tags(header, expected):
+    assert if_match_version(header) == expected
+
+
+@pytest.mark.parametrize("header", ['W/"7"', "7", '"abc"', '""', 'W/"2d0f5e8c"'])
+def test_if_match_rejects_other_tags(header):
+    with pytest.raises(HTTPException) as error:
+        if_match_version(header)
+    assert error.value.status_code == 412
+
+
+def test_version_filter():
+    assert version_filter(None) == {}
+    # Documents written before versioning have no version field
+    assert version_filter(0) == {"version": {"$in": [0, None]}}
+    assert version_filter(3) == {"version": 3}
+
+
+def test_ensure_version():
+    ensure_version({"version": 2}, None)
+    ensure_version({"version": 2}, 2)
+    ensure_version({}, 0)
+    with pytest.raises(HTTPException) as error:
+        ensure_version({"version": 2}, 1)
+    assert error.value.status_code == 412
+
+
+def test_versioned_json_sets_the_if_match_tag():
+    response = versioned_json({"data": {"version": 4}}, 4)
+
+    assert response.headers["etag"] == version_etag(4) == '"4"'
+    assert if_match_version(response.headers["etag"]) == 4
+
+
+def test_not_modified_compares_versions():
+    assert not_modified(make_request(), 4) is None
+    assert not_modified(make_request('"3"'), 4) is None
+    assert not_modified(make_request('"3", W/"4"'), 4).status_code == 304
+    assert not_modified(make_request("*"), 4).status_code == 304
+
+
+def test_conditional_json_answers_304_for_the_same_body():
+    payload = {"data": [1, 2, 3]}
+    first = conditional_json(make_request(), payload)
+
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith('W/"')
+    assert conditional_json(make_request(first.headers["etag"]), payload).status_code == 304
+    assert conditional_json(make_request(first.headers["etag"]), {"data": [1, 2]}).status_code == 200
+
+
+async def test_conditional_update_applies_only_at_the_expected_version(db):
+    user_id = (await db["users"].insert_one({"name": "Old", "email": "a@b.co", "version": 3})).inserted_id
+    controller = ProfileController(FailingFirebase())
+
+    result = await controller.change_image(str(user_id), "https://img", if_match='"3"')
+    assert result["data"]["version"] == 4
+
+    with pytest.raises(HTTPException) as error:
+        await controller.change_image(str(user_id), "https://other", if_match='"3"')
+    assert error.value.status_code == 412
+    assert (await db["users"].find_one({"_id": user_id}))["image"] == "https://img"
+
+
+async def test_change_name_restores_mongo_when_firebase_fails(db):
+    user_id = (await db["users"].insert_one({"name": "Old", "email": "a@b.co", "uid": "firebase-uid", "version": 3})).inserted_id
+    controller = ProfileController(FailingFirebase())
+
+    with pytest.raises(HTTPException) as error:
+        await controller.change_name(str(user_id), "New", if_match='"3"')
+
+    assert error.value.status_code == 500
+    user = await db["users"].find_one({"_id": user_id})
+    assert user["name"] == "Old"
+    # Both the write and its undo are versions, so stale copies cannot be written back
+    assert user["version"] == 5
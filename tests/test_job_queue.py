@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+import services.job_queue as job_queue_module
+from bson import ObjectId
+from controllers.message_controller import MessageController
+from services.job_queue import BotJobQueue, BOT_JOB_MAX_ATTEMPTS, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_PROCESSING
+from services.llm_provider import MockLLMProvider
+from services.openai import LLMRequestError, OpenAIService
+
+
+class FailingProvider(MockLLMProvider):
+    """Mock backend whose completions always fail"""
+
+    async def chat_completion(self, body: bytes, timeout: float):
+        self.calls += 1
+        return None
+
+
+@pytest.fixture
+def queue(db):
+    return BotJobQueue(db["bot_jobs"])
+
+
+async def enqueue(queue, chat_id="c1", user_id="u1"):
+    return ObjectId(await queue.enqueue(chat_id, user_id, "m1", datetime.now(timezone.utc), "english"))
+
+
+async def test_claim_takes_a_lease(queue):
+    job_id = await enqueue(queue)
+
+    job = await queue.claim()
+
+    assert job["_id"] == job_id
+    assert job["status"] == JOB_PROCESSING
+    assert job["attempts"] == 1
+    assert job["leaseExpiresAt"] > datetime.now(timezone.utc).replace(tzinfo=None)
+    # Leased jobs are not handed out twice
+    assert await queue.claim() is None
+
+
+async def test_expired_lease_is_reclaimed(queue, db):
+    job_id = await enqueue(queue)
+    await queue.claim()
+    await db["bot_jobs"].update_one(
+        {"_id": job_id}, {"$set": {"leaseExpiresAt": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+
+    job = await queue.claim()
+
+    assert job["_id"] == job_id
+    assert job["attempts"] == 2
+
+
+async def test_fail_backs_off_then_gives_up(queue, db):
+    job_id = await enqueue(queue)
+
+    job = await queue.claim()
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+    await queue.fail(job, "boom")
+    stored = await db["bot_jobs"].find_one({"_id": job_id})
+    assert stored["status"] == JOB_PENDING
+    assert stored["error"] == "boom"
+    assert stored["leaseExpiresAt"] is None
+    # Backoff is 2 ** attempts seconds, so the job is not claimable yet
+    assert stored["availableAt"] >= before + timedelta(seconds=2) - timedelta(milliseconds=1)
+    assert await queue.claim() is None
+
+    await db["bot_jobs"].update_one({"_id": job_id}, {"$set": {"attempts": BOT_JOB_MAX_ATTEMPTS - 1, "availableAt": before}})
+    job = await queue.claim()
+    await queue.fail(job, "boom again")
+    stored = await db["bot_jobs"].find_one({"_id": job_id})
+    assert stored["status"] == JOB_FAILED
+    assert stored["finishedAt"] is not None
+
+
+async def test_complete_records_the_bot_message(queue, db):
+    job_id = await enqueue(queue)
+    await queue.claim()
+
+    await queue.complete(job_id, "b1")
+
+    stored = await db["bot_jobs"].find_one({"_id": job_id})
+    assert stored["status"] == JOB_DONE
+    assert stored["botMessageId"] == "b1"
+
+
+async def test_every_waiter_is_woken_when_the_job_finishes(queue, monkeypatch):
+    # Long poll interval: only the completion signal can wake the waiters in time
+    monkeypatch.setattr(job_queue_module, "BOT_JOB_POLL_INTERVAL", 30.0)
+    job_id = await enqueue(queue)
+    await queue.claim()
+
+    early = asyncio.create_task(queue.wait_for(job_id, "u1", "c1", timeout=0.05))
+    waiting = [asyncio.create_task(queue.wait_for(job_id, "u1", "c1", timeout=30.0)) for _ in range(2)]
+    # The first waiter leaves before the job finishes, while the others keep waiting
+    assert (await early)["status"] == JOB_PROCESSING
+    late = asyncio.create_task(queue.wait_for(job_id, "u1", "c1", timeout=30.0))
+    await asyncio.sleep(0.01)
+
+    await queue.complete(job_id, "b1")
+    jobs = await asyncio.wait_for(asyncio.gather(*waiting, late), timeout=1.0)
+
+    assert [job["status"] for job in jobs] == [JOB_DONE] * 3
+    assert queue._waiters == {}
+
+
+async def test_retried_job_stores_one_reply(db):
+    chat_id = (await db["chats"].insert_one({"userId": "u1", "messageCount": 1, "version": 1})).inserted_id
+    user_message_at = datetime.now(timezone.utc)
+    await db["messages"].insert_one({
+        "chatId": str(chat_id), "userId": "u1", "sender": "user", "message": "hello",
+        "timestamp": user_message_at, "isDeleted": False
+    })
+    job = {"_id": ObjectId(), "chatId": str(chat_id), "userId": "u1", "userMessageAt": user_message_at, "language": "english"}
+    provider = MockLLMProvider("fixed:0")
+    controller = MessageController(OpenAIService(provider))
+
+    first = await controller.process_bot_job(job)
+    # Same job again, as after an expired lease or a crash before complete()
+    second = await controller.process_bot_job(job)
+
+    assert first == second
+    assert await db["messages"].count_documents({"jobId": str(job["_id"])}) == 1
+    assert (await db["chats"].find_one({"_id": chat_id}))["messageCount"] == 2
+    assert provider.calls == 1
+
+
+async def test_provider_failure_is_raised_for_retry(db):
+    chat_id = (await db["chats"].insert_one({"userId": "u1", "messageCount": 1})).inserted_id
+    job = {
+        "_id": ObjectId(), "chatId": str(chat_id), "userId": "u1",
+        "userMessageAt": datetime.now(timezone.utc), "language": "english", "useCache": False
+    }
+    controller = MessageController(OpenAIService(FailingProvider("fixed:0")))
+
+    with pytest.raises(LLMRequestError):
+        await controller.process_bot_job(job)
+
+    # No fallback text was stored as a reply
+    assert await db["messages"].count_documents({"jobId": str(job["_id"])}) == 0
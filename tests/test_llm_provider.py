@@ -0,0 +1,85 @@
+import json
+import time
+import httpx
+import pytest
+from services.llm_provider import LatencyDistribution, LLMProvider, MockLLMProvider, OpenAICompatibleProvider
+from services.openai import BOT_STREAM_REQUEST_TEMPLATES, FALLBACK_RESPONSES, OpenAIService
+
+CONTEXT = [{"role": "user", "content": "I feel anxious before exams"}]
+
+
+class BrokenStreamProvider(MockLLMProvider):
+    """Mock backend whose stream fails before the first token"""
+
+    async def stream_chat_completion(self, body: bytes, timeout: float):
+        raise RuntimeError("connection reset")
+        yield
+
+
+def sse_response(request: httpx.Request) -> httpx.Response:
+    assert json.loads(request.content)["stream"] is True
+    chunks = [{"choices": [{"index": 0, "delta": {"content": word}}]} for word in ("Take", " a", " breath")]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+
+def test_provider_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        LLMProvider()
+
+
+def test_latency_distribution_is_seeded():
+    first = [LatencyDistribution("lognormal:-0.5,0.4", seed=7).sample() for _ in range(3)]
+    second = [LatencyDistribution("lognormal:-0.5,0.4", seed=7).sample() for _ in range(3)]
+
+    assert first == second
+    with pytest.raises(ValueError):
+        LatencyDistribution("pareto:1")
+
+
+async def test_mock_stream_matches_the_completion():
+    provider = MockLLMProvider("fixed:0", token_delay=0)
+    body = BOT_STREAM_REQUEST_TEMPLATES["en"].render(CONTEXT)
+
+    tokens = [token async for token in provider.stream_chat_completion(body, timeout=1.0)]
+
+    assert len(tokens) > 1
+    assert "".join(tokens) == await provider.chat_completion(body, timeout=1.0)
+
+
+async def test_mock_stream_spaces_tokens_by_the_token_delay():
+    provider = MockLLMProvider("fixed:0", token_delay=0.01)
+    body = BOT_STREAM_REQUEST_TEMPLATES["en"].render(CONTEXT)
+
+    started = time.perf_counter()
+    tokens = [token async for token in provider.stream_chat_completion(body, timeout=1.0)]
+
+    assert time.perf_counter() - started >= 0.01 * len(tokens)
+
+
+async def test_openai_compatible_provider_parses_server_sent_events():
+    provider = OpenAICompatibleProvider(base_url="http://llm.test", api_key="key")
+    provider._client = httpx.AsyncClient(base_url="http://llm.test", transport=httpx.MockTransport(sse_response))
+    body = BOT_STREAM_REQUEST_TEMPLATES["en"].render(CONTEXT)
+
+    tokens = [token async for token in provider.stream_chat_completion(body, timeout=1.0)]
+
+    assert tokens == ["Take", " a", " breath"]
+    await provider.aclose()
+
+
+async def test_stream_bot_response_yields_tokens():
+    service = OpenAIService(MockLLMProvider("fixed:0", token_delay=0))
+
+    tokens = [token async for token in service.stream_bot_response(CONTEXT)]
+
+    assert "".join(tokens) == await service.generate_bot_response(CONTEXT, use_cache=False)
+
+
+async def test_stream_bot_response_falls_back_before_the_first_token():
+    service = OpenAIService(BrokenStreamProvider("fixed:0", token_delay=0))
+
+    tokens = [token async for token in service.stream_bot_response(CONTEXT)]
+
+    assert len(tokens) == 1
+    assert tokens[0] in FALLBACK_RESPONSES
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from middleware.rate_limit import InMemoryRateLimitBackend, Rate, RateLimitBackend, RateLimitRule
+
+
+def test_rate_parses_requests_per_seconds():
+    rate = Rate("20/60")
+
+    assert rate.capacity == 20
+    assert rate.refill_per_second == pytest.approx(1 / 3)
+
+
+def test_bucket_allows_a_burst_up_to_capacity():
+    backend = InMemoryRateLimitBackend(shards=4)
+    rate = Rate("3/60")
+
+    results = [backend.take_now("user:1", rate, now=100.0) for _ in range(4)]
+
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    # One token comes back every 20 seconds
+    assert results[-1][1] == pytest.approx(20.0)
+
+
+def test_bucket_refills_over_time():
+    backend = InMemoryRateLimitBackend(shards=4)
+    rate = Rate("2/10")
+    backend.take_now("ip:1", rate, now=0.0)
+    backend.take_now("ip:1", rate, now=0.0)
+
+    assert backend.take_now("ip:1", rate, now=2.0)[0] is False
+    assert backend.take_now("ip:1", rate, now=5.0) == (True, 0.0)
+    # Refill never exceeds capacity, however long the bucket sat idle
+    assert [backend.take_now("ip:1", rate, now=1000.0)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_independent_per_key():
+    backend = InMemoryRateLimitBackend(shards=4)
+    rate = Rate("1/60")
+
+    assert backend.take_now("user:1", rate, now=0.0)[0] is True
+    assert backend.take_now("user:2", rate, now=0.0)[0] is True
+    assert backend.take_now("user:1", rate, now=0.0)[0] is False
+
+
+def test_cleanup_drops_only_refilled_buckets():
+    backend = InMemoryRateLimitBackend(shards=4, cleanup_interval=3600)
+    backend.take_now("short", Rate("1/10"), now=0.0)
+    backend.take_now("long", Rate("1/100"), now=0.0)
+
+    backend.cleanup(now=50.0)
+
+    assert len(backend) == 1
+    # A dropped bucket starts full again
+    assert backend.take_now("short", Rate("1/10"), now=50.0)[0] is True
+
+
+async def test_take_uses_the_monotonic_clock():
+    backend = InMemoryRateLimitBackend(shards=4)
+
+    assert await backend.take("user:1", Rate("1/60")) == (True, 0.0)
+    assert (await backend.take("user:1", Rate("1/60")))[0] is False
+
+
+def test_backend_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+
+def test_rule_matches_path_templates():
+    rule = RateLimitRule("post", "/chat/{chat_id}/message", per_user="20/60")
+
+    assert rule.matches("POST", "/chat/abc123/message")
+    assert not rule.matches("GET", "/chat/abc123/message")
+    assert not rule.matches("POST", "/chat/abc/123/message")
+    assert rule.per_ip is None
+
+
+def test_take_all_charges_no_bucket_when_one_is_empty():
+    backend = InMemoryRateLimitBackend(shards=4)
+    user, ip = ("user:1", Rate("5/60")), ("ip:1", Rate("1/60"))
+    assert backend.take_all_now([user, ip], now=0.0) == (None, 0.0)
+
+    # The IP bucket is empty: the request is rejected on it and the user keeps their tokens
+    rejected = [backend.take_all_now([user, ip], now=0.0)[0] for _ in range(3)]
+
+    assert rejected == [1, 1, 1]
+    assert [backend.take_now("user:1", Rate("5/60"), now=0.0)[0] for _ in range(5)] == [True, True, True, True, False]
+
+
+async def test_cleanup_runs_in_the_background():
+    backend = InMemoryRateLimitBackend(shards=4, cleanup_interval=0.01)
+    backend.take_now("short", Rate("1/0.001"))
+    backend.start()
+
+    await asyncio.sleep(0.1)
+    await backend.aclose()
+
+    assert len(backend) == 0
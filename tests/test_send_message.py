@@ -0,0 +1,56 @@
+import pytest
+import database
+from controllers.message_controller import MessageController
+from models.message import SendMessageRequest
+from services.llm_provider import MockLLMProvider
+from services.openai import OpenAIService
+
+
+@pytest.fixture
+async def chat(db):
+    user_id = str((await db["users"].insert_one({"email": "a@b.co", "language": "english", "isDeleted": False})).inserted_id)
+    chat_id = (await db["chats"].insert_one({"userId": user_id, "messageCount": 0, "version": 1, "isDeleted": False})).inserted_id
+    return user_id, str(chat_id)
+
+
+def count_calls(monkeypatch, name, method, calls):
+    collection = database.get_collection(name)
+    original = getattr(collection, method)
+
+    async def counted(*args, **kwargs):
+        calls.append(f"{name}.{method}")
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(collection, method, counted)
+
+
+async def test_sync_send_counts_both_messages_in_one_chat_write(chat, db, monkeypatch):
+    user_id, chat_id = chat
+    calls = []
+    count_calls(monkeypatch, "messages", "insert_many", calls)
+    count_calls(monkeypatch, "chats", "update_one", calls)
+    controller = MessageController(OpenAIService(MockLLMProvider("fixed:0")))
+
+    data = (await controller.send_message(user_id, chat_id, SendMessageRequest(message="hello")))["data"]
+
+    # User message first, then the bot message and one chat update for both
+    assert calls == ["messages.insert_many", "messages.insert_many", "chats.update_one"]
+    stored_chat = await db["chats"].find_one({"userId": user_id})
+    assert stored_chat["messageCount"] == 2
+    assert stored_chat["lastMessageId"] == data["bot_response"]["messageId"]
+
+
+async def test_sync_send_counts_the_user_message_when_generation_fails(chat, db, monkeypatch):
+    user_id, chat_id = chat
+    controller = MessageController(OpenAIService(MockLLMProvider("fixed:0")))
+
+    async def failing_generate(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(controller, "_generate_bot_response", failing_generate)
+    data = (await controller.send_message(user_id, chat_id, SendMessageRequest(message="hello")))["data"]
+
+    assert "bot_response" not in data
+    stored_chat = await db["chats"].find_one({"userId": user_id})
+    assert stored_chat["messageCount"] == 1
+    assert stored_chat["lastMessageId"] == data["messageId"]
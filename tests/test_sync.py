@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+import controllers.sync_controller as sync_module
+from controllers.message_controller import MessageController
+from controllers.sync_controller import SyncController, decode_sync_token, encode_sync_token
+from services.llm_provider import MockLLMProvider
+from services.openai import OpenAIService
+
+LONG_AGO = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def message_controller():
+    return MessageController(OpenAIService(MockLLMProvider("fixed:0")))
+
+
+@pytest.fixture
+def controller(message_controller):
+    return SyncController(message_controller)
+
+
+@pytest.fixture
+async def user_id(db):
+    result = await db["users"].insert_one({"email": "a@b.co", "isDeleted": False})
+    return str(result.inserted_id)
+
+
+async def insert_messages(db, user_id, count, updated_at=LONG_AGO):
+    docs = [
+        {
+            "chatId": "c1", "userId": user_id, "sender": "user", "message": f"m{index}",
+            "timestamp": updated_at, "updatedAt": updated_at, "isDeleted": False, "version": 1
+        }
+        for index in range(count)
+    ]
+    await db["messages"].insert_many(docs)
+    return [str(doc["_id"]) for doc in docs]
+
+
+def test_token_round_trip():
+    position = (datetime(2024, 5, 1, 12, 30, 15, 123000), ObjectId())
+
+    decoded = decode_sync_token(encode_sync_token({"chats": None, "messages": position}))
+
+    assert decoded == {"chats": None, "messages": position}
+
+
+def test_token_positions_are_naive_utc():
+    aware = datetime(2024, 5, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    decoded = decode_sync_token(encode_sync_token({"chats": (aware, ObjectId()), "messages": None}))
+
+    assert decoded["chats"][0] == datetime(2024, 5, 1, 12, 0)
+
+
+@pytest.mark.parametrize("token", ["not-base64!", "e30=", encode_sync_token({"chats": None})])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_sync_token(token)
+
+
+async def test_invalid_token_is_a_400(controller, user_id):
+    with pytest.raises(HTTPException) as error:
+        await controller.sync(user_id, since="garbage")
+    assert error.value.status_code == 400
+
+
+async def test_keyset_pages_cover_ties_once(controller, user_id, db, monkeypatch):
+    monkeypatch.setattr(sync_module, "SYNC_SAFETY_WINDOW_SECONDS", 0)
+    # Same updatedAt for every message: only _id orders them
+    message_ids = await insert_messages(db, user_id, 5)
+
+    seen, token, pages = [], None, []
+    while True:
+        data = (await controller.sync(user_id, since=token, limit=2))["data"]
+        seen += [message["messageId"] for message in data["messages"]]
+        pages.append(data["has_more"])
+        token = data["next_token"]
+        if not data["has_more"]:
+            break
+
+    assert pages == [True, True, False]
+    assert seen == message_ids
+    # Caught up: nothing new until something changes
+    assert (await controller.sync(user_id, since=token))["data"]["messages"] == []
+
+
+async def test_changes_after_the_token_include_tombstones(controller, user_id, db, monkeypatch):
+    monkeypatch.setattr(sync_module, "SYNC_SAFETY_WINDOW_SECONDS", 0)
+    message_ids = await insert_messages(db, user_id, 2)
+    await db["messages"].insert_one({
+        "chatId": "c1", "userId": user_id, "sender": "user", "message": "gone", "timestamp": datetime(2019, 1, 1),
+        "updatedAt": datetime(2019, 1, 1), "isDeleted": True, "version": 2
+    })
+    first = (await controller.sync(user_id))["data"]
+    # A full sync leaves deleted messages out
+    assert [message["messageId"] for message in first["messages"]] == message_ids
+
+    await db["messages"].update_one(
+        {"_id": ObjectId(message_ids[0])},
+        {"$set": {"isDeleted": True, "updatedAt": datetime(2021, 1, 1)}, "$inc": {"version": 1}}
+    )
+    changes = (await controller.sync(user_id, since=first["next_token"]))["data"]["messages"]
+
+    assert changes == [{
+        "messageId": message_ids[0], "chatId": "c1", "isDeleted": True,
+        "updatedAt": datetime(2021, 1, 1), "version": 2
+    }]
+
+
+async def test_recent_changes_are_sent_again_inside_the_window(controller, user_id, db, monkeypatch):
+    monkeypatch.setattr(sync_module, "SYNC_SAFETY_WINDOW_SECONDS", 60)
+    await insert_messages(db, user_id, 1)
+    recent_ids = await insert_messages(db, user_id, 1, updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+
+    token = (await controller.sync(user_id))["data"]["next_token"]
+    position = decode_sync_token(token)["messages"]
+
+    # The token stops at the horizon, so the recent message comes back once more
+    assert position[0] < datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=59)
+    assert position[1] == ObjectId("0" * 24)
+    again = (await controller.sync(user_id, since=token))["data"]["messages"]
+    assert [message["messageId"] for message in again] == recent_ids
+
+
+async def test_persisted_messages_are_stamped_at_write_time(message_controller, db):
+    chat_id = (await db["chats"].insert_one({"userId": "u1", "messageCount": 0})).inserted_id
+    # An imported message keeps its original timestamp
+    imported = {"chatId": str(chat_id), "userId": "u1", "sender": "user", "message": "old", "timestamp": LONG_AGO, "updatedAt": LONG_AGO}
+
+    before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(milliseconds=1)
+    message_id, = await message_controller.persist_messages("u1", chat_id, [imported])
+
+    stored = await db["messages"].find_one({"_id": ObjectId(message_id)})
+    assert stored["timestamp"] == LONG_AGO
+    assert stored["updatedAt"] >= before
+    assert (await db["chats"].find_one({"_id": chat_id}))["updatedAt"] >= before